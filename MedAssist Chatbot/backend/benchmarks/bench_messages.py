@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Benchmark insert and history-query latency of the messages table,
+unpartitioned (before) vs monthly range partitioned (after).
+
+Builds throwaway copies in the bench_plain / bench_partitioned schemas of
+the configured database with the real migrations, through 0005 and through
+0006, and drops them afterwards (unless --keep):
+    python benchmarks/bench_messages.py --rows 10000000
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, text
+from config import settings
+from services.message_storage import ensure_message_partitions
+from services.migrations import run_migrations
+
+# Migration 0006 partitions messages; "before" stops just short of it
+PARTITION_MIGRATION = 6
+
+# Indexes databases set up from database_setup.sql carried before 0006.
+# The baseline migration has none on session_id, which would leave the
+# unpartitioned history query scanning the whole table.
+LEGACY_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS idx_messages_session_id ON messages (session_id)",
+    "CREATE INDEX IF NOT EXISTS idx_messages_created_at ON messages (created_at)",
+]
+
+def schema_engine(url, schema):
+    """Engine whose unqualified table names resolve to the benchmark schema"""
+    return create_engine(url, connect_args={"options": f"-csearch_path={schema}"})
+
+def setup_schema(engine, schema, partitioned, args, start):
+    """Build the schema with the real migrations: through 0005 or through 0006"""
+    with engine.begin() as conn:
+        conn.execute(text(f"DROP SCHEMA IF EXISTS {schema} CASCADE"))
+        conn.execute(text(f"CREATE SCHEMA {schema}"))
+
+    bench_engine = schema_engine(engine.url.render_as_string(hide_password=False), schema)
+    run_migrations(bench_engine, PARTITION_MIGRATION if partitioned else PARTITION_MIGRATION - 1)
+    if partitioned:
+        # Partitions back to the oldest generated row
+        ensure_message_partitions(bench_engine, start=start.date())
+    else:
+        with bench_engine.begin() as conn:
+            for statement in LEGACY_INDEXES:
+                conn.execute(text(statement))
+
+    with bench_engine.begin() as conn:
+        conn.execute(text("""
+            INSERT INTO users (email, password_hash, full_name)
+            SELECT 'bench' || g || '@example.com', 'x', 'Bench user ' || g FROM generate_series(1, 5000) AS g
+        """))
+        conn.execute(text("""
+            INSERT INTO chat_sessions (user_id, created_at)
+            SELECT (g - 1) % 5000 + 1, :start FROM generate_series(1, :sessions) AS g
+        """), {"sessions": args.sessions, "start": start})
+    bench_engine.dispose()
+
+def load_rows(engine, schema, args, start):
+    """Bulk load rows; each session lives in its own short time window"""
+    span = (datetime.utcnow() - start).total_seconds()
+    batch = 1_000_000
+    for offset in range(0, args.rows, batch):
+        upper = min(offset + batch, args.rows)
+        with engine.begin() as conn:
+            conn.execute(text(f"""
+                INSERT INTO {schema}.messages (session_id, user_id, content, sender, created_at)
+                SELECT g % :sessions + 1,
+                       (g % :sessions) % 5000 + 1,
+                       'Message ' || g || ' about fever, headache and blood pressure',
+                       CASE WHEN g % 2 = 0 THEN 'user' ELSE 'bot' END,
+                       :start + make_interval(secs => (g % :sessions)::float8 / :sessions * :span
+                                                       + (g / :sessions) * 60)
+                FROM generate_series(:lo, :hi) AS g
+            """), {"sessions": args.sessions, "start": start, "span": span, "lo": offset + 1, "hi": upper})
+        print(f"  {schema}: loaded {upper:,} rows", flush=True)
+
+    with engine.begin() as conn:
+        conn.execute(text(f"ANALYZE {schema}.messages"))
+
+def percentiles(samples):
+    samples = sorted(samples)
+    return {
+        "p50": statistics.median(samples),
+        "p95": samples[int(len(samples) * 0.95) - 1],
+        "mean": statistics.fmean(samples)
+    }
+
+def bench_inserts(engine, schema, count):
+    samples = []
+    with engine.connect() as conn:
+        for i in range(count):
+            started = time.perf_counter()
+            conn.execute(text(
+                f"INSERT INTO {schema}.messages (session_id, user_id, content, sender, created_at) "
+                f"VALUES (:s, 1, 'benchmark insert', 'user', now() AT TIME ZONE 'utc')"
+            ), {"s": i % 1000 + 1})
+            conn.commit()
+            samples.append((time.perf_counter() - started) * 1000)
+    return percentiles(samples)
+
+def bench_history(engine, schema, args, start, bounded):
+    span = (datetime.utcnow() - start).total_seconds()
+    rng = random.Random(42)
+    samples = []
+    with engine.connect() as conn:
+        for _ in range(args.queries):
+            session_id = rng.randint(1, args.sessions)
+            session_start = start + timedelta(seconds=(session_id - 1) / args.sessions * span)
+            query = f"SELECT id, content, sender, language, created_at FROM {schema}.messages WHERE session_id = :s"
+            if bounded:
+                query += " AND created_at >= :session_start"
+            started = time.perf_counter()
+            conn.execute(text(query + " ORDER BY created_at"), {"s": session_id, "session_start": session_start}).fetchall()
+            samples.append((time.perf_counter() - started) * 1000)
+    return percentiles(samples)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default=settings.database_url)
+    parser.add_argument("--rows", type=int, default=10_000_000)
+    parser.add_argument("--sessions", type=int, default=500_000)
+    parser.add_argument("--months", type=int, default=24)
+    parser.add_argument("--inserts", type=int, default=2000)
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--keep", action="store_true", help="Keep the benchmark schemas")
+    args = parser.parse_args()
+
+    engine = create_engine(args.url)
+    start = (datetime.utcnow() - timedelta(days=30 * args.months)).replace(microsecond=0)
+    layouts = [
+        ("before: unpartitioned", "bench_plain", False),
+        ("after: monthly partitions", "bench_partitioned", True),
+    ]
+
+    results = []
+    try:
+        for label, schema, partitioned in layouts:
+            print(f"Building {schema} ({args.rows:,} rows)...")
+            setup_schema(engine, schema, partitioned, args, start)
+            load_rows(engine, schema, args, start)
+            results.append((label, "insert", bench_inserts(engine, schema, args.inserts)))
+            results.append((label, "history", bench_history(engine, schema, args, start, bounded=partitioned)))
+    finally:
+        if not args.keep:
+            with engine.begin() as conn:
+                for _, schema, _ in layouts:
+                    conn.execute(text(f"DROP SCHEMA IF EXISTS {schema} CASCADE"))
+
+    print()
+    print(f"{'layout':<28}{'operation':<10}{'p50 ms':>10}{'p95 ms':>10}{'mean ms':>10}")
+    for label, operation, stats in results:
+        print(f"{label:<28}{operation:<10}{stats['p50']:>10.3f}{stats['p95']:>10.3f}{stats['mean']:>10.3f}")
+
+if __name__ == "__main__":
+    main()
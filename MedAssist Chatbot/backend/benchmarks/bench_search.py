@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Benchmark GET /api/chat/search queries (services.search_service) over a
+synthetic messages table with millions of rows.
+
+Builds a throwaway copy of the messages table in the bench_search schema of
+the configured database and drops it afterwards (unless --keep):
+    python benchmarks/bench_search.py --rows 5000000 --users 20000
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.orm import Session
+
+from config import settings
+from models import MESSAGE_SEARCH_CONFIG_SQL
+from services.search_service import search_messages
+
+SCHEMA = "bench_search"
+
+ENGLISH_WORDS = (
+    "blood pressure headache fever cough malaria diabetes insulin pain chest stomach "
+    "medicine dose tablet doctor hospital pregnancy vaccine child sleep water infection"
+).split()
+FRENCH_WORDS = (
+    "tension artérielle mal de tête fièvre toux paludisme diabète insuline douleur poitrine "
+    "ventre médicament dose comprimé médecin hôpital grossesse vaccin enfant sommeil eau"
+).split()
+
+QUERIES = ["blood pressure", "fever", "paludisme", "douleur poitrine", "insulin dose", "\"chest pain\""]
+
+def build(engine, args):
+    with engine.begin() as conn:
+        conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+        conn.execute(text(f"CREATE SCHEMA {SCHEMA}"))
+        conn.execute(text(f"""
+            CREATE TABLE {SCHEMA}.chat_sessions (
+                id SERIAL PRIMARY KEY,
+                user_id INTEGER NOT NULL,
+                session_name VARCHAR(255),
+                is_active BOOLEAN DEFAULT true
+            )
+        """))
+        conn.execute(text(f"""
+            CREATE TABLE {SCHEMA}.messages (
+                id BIGSERIAL PRIMARY KEY,
+                session_id INTEGER NOT NULL,
+                user_id INTEGER NOT NULL,
+                content TEXT NOT NULL,
+                sender VARCHAR(10) NOT NULL,
+                language VARCHAR(10),
+                created_at TIMESTAMP NOT NULL DEFAULT now(),
+                search_vector TSVECTOR GENERATED ALWAYS AS (to_tsvector({MESSAGE_SEARCH_CONFIG_SQL}, content)) STORED
+            )
+        """))
+        conn.execute(text(f"""
+            INSERT INTO {SCHEMA}.chat_sessions (user_id, session_name)
+            SELECT g % :users + 1, 'Session ' || g FROM generate_series(1, :sessions) AS g
+        """), {"users": args.users, "sessions": args.users * 10})
+
+    # Random sentences from the word lists, two thirds English, one third French
+    batch = 500_000
+    for offset in range(0, args.rows, batch):
+        upper = min(offset + batch, args.rows)
+        with engine.begin() as conn:
+            conn.execute(text(f"""
+                INSERT INTO {SCHEMA}.messages (session_id, user_id, content, sender, language, created_at)
+                SELECT s, (s - 1) % :users + 1,
+                       array_to_string(ARRAY(
+                           SELECT (CASE WHEN g % 3 = 0 THEN :fr ELSE :en END)[1 + floor(random() * 20)::int]
+                           FROM generate_series(1, 12 + g % 20)
+                       ), ' '),
+                       CASE WHEN g % 2 = 0 THEN 'user' ELSE 'bot' END,
+                       CASE WHEN g % 3 = 0 THEN 'french' WHEN g % 11 = 0 THEN 'ewondo' ELSE 'english' END,
+                       now() - make_interval(secs => g)
+                FROM (SELECT g, g % :sessions + 1 AS s FROM generate_series(:lo, :hi) AS g) AS rows
+            """), {
+                "users": args.users, "sessions": args.users * 10, "lo": offset + 1, "hi": upper,
+                "en": ENGLISH_WORDS, "fr": FRENCH_WORDS
+            })
+        print(f"  loaded {upper:,} rows", flush=True)
+
+    with engine.begin() as conn:
+        conn.execute(text(f"CREATE INDEX ON {SCHEMA}.messages USING GIN (search_vector)"))
+        conn.execute(text(f"CREATE INDEX ON {SCHEMA}.messages (user_id)"))
+        conn.execute(text(f"ANALYZE {SCHEMA}.messages"))
+        conn.execute(text(f"ANALYZE {SCHEMA}.chat_sessions"))
+
+def timed(samples, fn):
+    started = time.perf_counter()
+    result = fn()
+    samples.append((time.perf_counter() - started) * 1000)
+    return result
+
+def report(label, samples):
+    samples = sorted(samples)
+    print(f"{label:<18}{statistics.median(samples):>10.2f}{samples[int(len(samples) * 0.95) - 1]:>10.2f}{statistics.fmean(samples):>10.2f}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default=settings.database_url)
+    parser.add_argument("--rows", type=int, default=5_000_000)
+    parser.add_argument("--users", type=int, default=20_000)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--skip-build", action="store_true", help="Reuse an existing bench_search schema")
+    parser.add_argument("--keep", action="store_true", help="Keep the benchmark schema")
+    args = parser.parse_args()
+
+    engine = create_engine(args.url)
+
+    @event.listens_for(engine, "connect")
+    def use_bench_schema(dbapi_connection, connection_record):
+        # The ORM models are unqualified, so point them at the benchmark tables
+        with dbapi_connection.cursor() as cursor:
+            cursor.execute(f"SET search_path TO {SCHEMA}, public")
+
+    try:
+        if not args.skip_build:
+            print(f"Building {SCHEMA} ({args.rows:,} rows)...")
+            build(engine, args)
+
+        rng = random.Random(7)
+        first_page, next_page = [], []
+        with Session(engine) as db:
+            for _ in range(args.queries):
+                user_id = rng.randint(1, args.users)
+                q = rng.choice(QUERIES)
+                results, cursor = timed(first_page, lambda: search_messages(db, user_id, q, limit=20))
+                if cursor:
+                    timed(next_page, lambda: search_messages(db, user_id, q, limit=20, cursor=cursor))
+
+        print()
+        print(f"{'page':<18}{'p50 ms':>10}{'p95 ms':>10}{'mean ms':>10}")
+        report("first page", first_page)
+        if next_page:
+            report("next page (cursor)", next_page)
+    finally:
+        if not args.keep:
+            with engine.begin() as conn:
+                conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+
+if __name__ == "__main__":
+    main()
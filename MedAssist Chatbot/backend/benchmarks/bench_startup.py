@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Benchmark worker cold start: time to import main, and time from launching
+uvicorn until GET /api/health first returns 200.
+
+Every sample runs in a fresh interpreter so nothing is warm in sys.modules:
+    python benchmarks/bench_startup.py --runs 10
+    python benchmarks/bench_startup.py --importtime   # slowest imports too
+"""
+import argparse
+import os
+import re
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMPORT_SNIPPET = "import time; t = time.perf_counter(); import main; print(time.perf_counter() - t)"
+
+def import_time() -> float:
+    output = subprocess.run(
+        [sys.executable, "-c", IMPORT_SNIPPET],
+        cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+    ).stdout
+    return float(output.strip().splitlines()[-1]) * 1000
+
+def slowest_imports(count: int):
+    """Self time per top-level package from python -X importtime"""
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+    ).stderr
+    totals = {}
+    for line in stderr.splitlines():
+        match = re.match(r"import time:\s+(\d+) \|\s+\d+ \|\s*(\S+)", line)
+        if match:
+            package = match.group(2).split(".")[0]
+            totals[package] = totals.get(package, 0) + int(match.group(1))
+    return sorted(totals.items(), key=lambda item: item[1], reverse=True)[:count]
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def time_to_first_200(timeout: float) -> float:
+    port = free_port()
+    url = f"http://127.0.0.1:{port}/api/health"
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        while time.perf_counter() - started < timeout:
+            if server.poll() is not None:
+                raise RuntimeError(f"uvicorn exited with code {server.returncode}")
+            try:
+                with urllib.request.urlopen(url, timeout=1) as response:
+                    if response.status == 200:
+                        return (time.perf_counter() - started) * 1000
+            except (urllib.error.URLError, ConnectionError):
+                pass
+            time.sleep(0.005)
+        raise RuntimeError(f"/api/health did not return 200 within {timeout}s")
+    finally:
+        server.terminate()
+        server.wait()
+
+def report(label, samples):
+    samples = sorted(samples)
+    print(f"{label:<22}{statistics.median(samples):>10.1f}{samples[-1]:>10.1f}{statistics.fmean(samples):>10.1f}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--timeout", type=float, default=60.0, help="Seconds to wait for the first 200")
+    parser.add_argument("--importtime", action="store_true", help="Also list the slowest top-level imports")
+    args = parser.parse_args()
+    
+    imports = [import_time() for _ in range(args.runs)]
+    first_200 = [time_to_first_200(args.timeout) for _ in range(args.runs)]
+    
+    print(f"{'':<22}{'p50 ms':>10}{'max ms':>10}{'mean ms':>10}")
+    report("import main", imports)
+    report("first 200 /api/health", first_200)
+    
+    if args.importtime:
+        print()
+        print(f"{'package':<22}{'ms':>10}")
+        for package, micros in slowest_imports(10):
+            print(f"{package:<22}{micros / 1000:>10.1f}")
+
+if __name__ == "__main__":
+    main()
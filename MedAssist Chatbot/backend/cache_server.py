@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Minimal Redis-protocol server for development and tests, so
+CACHE_BACKEND=redis can be exercised without a Redis install:
+    python cache_server.py --port 6380
+    CACHE_BACKEND=redis CACHE_URL=redis://localhost:6380/0 uvicorn main:app --workers 4
+
+Supports the commands the cache uses (GET, SET with EX/PX/NX, DEL, EXISTS,
+PUBLISH, SUBSCRIBE) plus PING, SELECT, CLIENT, FLUSHDB and QUIT. Data lives
+in memory and is not persisted.
+"""
+import argparse
+import asyncio
+import time
+from typing import Dict, List, Optional, Set, Tuple
+
+class CacheServer:
+    def __init__(self):
+        self.data: Dict[bytes, Tuple[Optional[float], bytes]] = {}
+        self.channels: Dict[bytes, Set[asyncio.StreamWriter]] = {}
+    
+    def _get(self, key: bytes) -> Optional[bytes]:
+        entry = self.data.get(key)
+        if entry is None:
+            return None
+        expires, value = entry
+        if expires is not None and expires <= time.monotonic():
+            del self.data[key]
+            return None
+        return value
+    
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        subscribed: Set[bytes] = set()
+        try:
+            while True:
+                command = await read_command(reader)
+                if command is None:
+                    break
+                name = command[0].upper()
+                if name == b"QUIT":
+                    writer.write(b"+OK\r\n")
+                    break
+                writer.write(self.execute(name, command[1:], writer, subscribed))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            for channel in subscribed:
+                self.channels.get(channel, set()).discard(writer)
+            writer.close()
+    
+    def execute(self, name: bytes, args: List[bytes], writer, subscribed: Set[bytes]) -> bytes:
+        if name == b"PING":
+            return bulk(args[0]) if args else b"+PONG\r\n"
+        if name in (b"SELECT", b"CLIENT"):
+            return b"+OK\r\n"
+        if name == b"GET":
+            return bulk(self._get(args[0]))
+        if name == b"SET":
+            key, value, options = args[0], args[1], [arg.upper() for arg in args[2:]]
+            ttl = None
+            if b"EX" in options:
+                ttl = float(args[2 + options.index(b"EX") + 1])
+            if b"PX" in options:
+                ttl = float(args[2 + options.index(b"PX") + 1]) / 1000
+            if b"NX" in options and self._get(key) is not None:
+                return bulk(None)
+            self.data[key] = (time.monotonic() + ttl if ttl else None, value)
+            return b"+OK\r\n"
+        if name == b"DEL":
+            return integer(sum(self.data.pop(key, None) is not None for key in args))
+        if name == b"EXISTS":
+            return integer(sum(self._get(key) is not None for key in args))
+        if name == b"FLUSHDB":
+            self.data.clear()
+            return b"+OK\r\n"
+        if name == b"PUBLISH":
+            channel, message = args
+            receivers = list(self.channels.get(channel, ()))
+            for receiver in receivers:
+                receiver.write(array([b"message", channel, message]))
+            return integer(len(receivers))
+        if name == b"SUBSCRIBE":
+            replies = []
+            for channel in args:
+                self.channels.setdefault(channel, set()).add(writer)
+                subscribed.add(channel)
+                replies.append(b"*3\r\n" + bulk(b"subscribe") + bulk(channel) + integer(len(subscribed)))
+            return b"".join(replies)
+        if name == b"UNSUBSCRIBE":
+            replies = []
+            for channel in args or list(subscribed):
+                self.channels.get(channel, set()).discard(writer)
+                subscribed.discard(channel)
+                replies.append(b"*3\r\n" + bulk(b"unsubscribe") + bulk(channel) + integer(len(subscribed)))
+            return b"".join(replies)
+        return b"-ERR unknown command '" + name + b"'\r\n"
+
+async def read_command(reader: asyncio.StreamReader) -> Optional[List[bytes]]:
+    line = await reader.readline()
+    if not line:
+        return None
+    if not line.startswith(b"*"):
+        # Inline command, e.g. from telnet
+        return line.strip().split() or [b"PING"]
+    parts = []
+    for _ in range(int(line[1:])):
+        length = int((await reader.readline())[1:])
+        parts.append((await reader.readexactly(length + 2))[:-2])
+    return parts
+
+def bulk(value: Optional[bytes]) -> bytes:
+    if value is None:
+        return b"$-1\r\n"
+    return b"$%d\r\n%s\r\n" % (len(value), value)
+
+def integer(value: int) -> bytes:
+    return b":%d\r\n" % value
+
+def array(items: List[bytes]) -> bytes:
+    return b"*%d\r\n" % len(items) + b"".join(bulk(item) for item in items)
+
+async def serve(host: str, port: int):
+    server = await asyncio.start_server(CacheServer().handle, host, port)
+    print(f"Cache server listening on {host}:{port}")
+    async with server:
+        await server.serve_forever()
+
+def main():
+    parser = argparse.ArgumentParser(description="Minimal Redis-protocol cache server for development")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6379)
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Chat generation worker: drains the chat_jobs queue filled by POST /api/chat/jobs.
+
+Run as many as the CPU nodes allow, separately from the API workers:
+    python chat_worker.py --concurrency 1
+
+Jobs are claimed with FOR UPDATE SKIP LOCKED, so workers never take the same
+job. Partial output and a heartbeat are written every JOB_FLUSH_SECONDS. If a
+worker dies, its job is reclaimed once the heartbeat is older than
+JOB_STALE_SECONDS. Transient database or network errors also put the job
+back on the queue; either way it fails after JOB_MAX_ATTEMPTS. SIGTERM
+stops claiming and lets running jobs finish; a second signal interrupts
+them and puts them back on the queue.
+"""
+import argparse
+import asyncio
+import os
+import signal
+import socket
+from typing import List, Optional
+
+from sqlalchemy.exc import InterfaceError, OperationalError, TimeoutError as SQLAlchemyTimeoutError
+
+from config import settings
+from database import SessionLocal
+from models import ChatJob, ChatSession, Message, User
+from routers.chat import load_chat_history, save_message
+from services.audit_service import audit_pipeline
+from services.job_queue import claim_job, fail_job, finish_job, flush_progress, requeue_job, retry_job
+from services.llm_service import get_llm_service
+from services.memory_service import update_session_summary
+from services.model_registry import start_model_sync
+
+# Transient failures (database or network trouble) put the job back on the
+# queue, up to JOB_MAX_ATTEMPTS; anything else fails it
+RETRYABLE_ERRORS = (OperationalError, InterfaceError, SQLAlchemyTimeoutError, ConnectionError, TimeoutError)
+
+class JobLost(Exception):
+    """The job was reclaimed by another worker"""
+
+class ChatWorker:
+    def __init__(self, concurrency: int):
+        self.concurrency = concurrency
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self.stopping = asyncio.Event()
+        self.llm_service = get_llm_service()
+    
+    def _run_in_session(self, fn, *args):
+        db = SessionLocal()
+        try:
+            return fn(db, *args)
+        finally:
+            db.close()
+    
+    async def run(self):
+        await audit_pipeline.start()
+        await start_model_sync(self.llm_service.registry)
+        await asyncio.to_thread(self.llm_service.load_model)
+        print(f"Chat worker {self.worker_id} ready with {self.concurrency} slot(s)")
+        try:
+            await asyncio.gather(*(self.consume() for _ in range(self.concurrency)))
+        finally:
+            await audit_pipeline.stop()
+    
+    async def consume(self):
+        while not self.stopping.is_set():
+            try:
+                job_id = await asyncio.to_thread(self._run_in_session, claim_job, self.worker_id)
+            except Exception as e:
+                print(f"Error claiming chat job: {e}")
+                job_id = None
+            if job_id is None:
+                try:
+                    await asyncio.wait_for(self.stopping.wait(), settings.job_poll_seconds)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self.process(job_id)
+    
+    async def flush_loop(self, job_id: int, pieces: List[str], lost: asyncio.Event):
+        """Publish partial output and keep the claim alive while generating"""
+        while True:
+            await asyncio.sleep(settings.job_flush_seconds)
+            try:
+                owned = await asyncio.to_thread(
+                    self._run_in_session, flush_progress, job_id, self.worker_id, "".join(pieces)
+                )
+            except Exception as e:
+                print(f"Error flushing chat job {job_id}: {e}")
+                continue
+            if not owned:
+                lost.set()
+                return
+    
+    async def process(self, job_id: int):
+        db = SessionLocal()
+        flusher: Optional[asyncio.Task] = None
+        try:
+            job = db.query(ChatJob).filter(ChatJob.id == job_id).first()
+            session = db.query(ChatSession).filter(ChatSession.id == job.session_id).first()
+            user = db.query(User).filter(User.id == job.user_id).first()
+            user_message = db.query(Message).filter(
+                Message.id == job.user_message_id,
+                Message.session_id == job.session_id
+            ).first()
+            if not session or not user or not user_message:
+                raise ValueError("Session or message no longer exists")
+            
+            session_id, user_id, language = session.id, job.user_id, job.language
+            prompt_args = {
+                "message": user_message.content,
+                "language": language,
+                "chat_history": load_chat_history(db, session, user_message.id),
+                "summary": session.summary,
+                "user_tier": user.tier
+            }
+            # Do not sit idle in a transaction for the whole generation
+            db.rollback()
+            
+            pieces: List[str] = []
+            lost = asyncio.Event()
+            flusher = asyncio.create_task(self.flush_loop(job_id, pieces, lost))
+            async for piece in self.llm_service.generate_stream(**prompt_args):
+                if lost.is_set():
+                    raise JobLost()
+                pieces.append(piece)
+            flusher.cancel()
+            
+            ai_response = "".join(pieces).strip()
+            # The bot message and the job's completion commit together
+            bot_message = save_message(db, session_id, user_id, ai_response, "bot", language, commit=False)
+            if not finish_job(db, job_id, self.worker_id, bot_message.id, ai_response):
+                raise JobLost()
+            db.commit()
+            
+            audit_pipeline.record(
+                "chat_message",
+                user_id=user_id,
+                table_name="messages",
+                record_id=bot_message.id,
+                new_values={"session_id": session_id, "language": language, "channel": "job", "job_id": job_id}
+            )
+        except JobLost:
+            db.rollback()
+            print(f"Chat job {job_id} was reclaimed by another worker")
+            return
+        except asyncio.CancelledError:
+            db.rollback()
+            await asyncio.to_thread(self._run_in_session, requeue_job, job_id, self.worker_id)
+            raise
+        except Exception as e:
+            db.rollback()
+            print(f"Error processing chat job {job_id}: {e}")
+            settle = retry_job if isinstance(e, RETRYABLE_ERRORS) else fail_job
+            try:
+                await asyncio.to_thread(self._run_in_session, settle, job_id, self.worker_id, str(e))
+            except Exception as settle_error:
+                # The job is reclaimed once its heartbeat goes stale
+                print(f"Error settling chat job {job_id}: {settle_error}")
+            return
+        finally:
+            if flusher:
+                flusher.cancel()
+            db.close()
+        
+        await update_session_summary(session_id)
+
+async def main(concurrency: int):
+    worker = ChatWorker(concurrency)
+    task = asyncio.create_task(worker.run())
+    loop = asyncio.get_running_loop()
+    
+    def on_signal():
+        if worker.stopping.is_set():
+            # Second signal: interrupt running jobs, which requeue themselves
+            task.cancel()
+        else:
+            print("Finishing running chat jobs; signal again to requeue them")
+            worker.stopping.set()
+    
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, on_signal)
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="MediChat AI chat generation worker")
+    parser.add_argument("--concurrency", type=int, default=settings.job_worker_concurrency)
+    args = parser.parse_args()
+    asyncio.run(main(max(1, args.concurrency)))
@@ -1,7 +1,15 @@
-from sqlalchemy import create_engine
+import asyncio
+import itertools
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import create_engine, text
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
 from config import settings
+from services.cache_service import cache_key, get_cache
 
 # Database connection
 engine = create_engine(settings.database_url)
@@ -14,4 +22,143 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+# Seconds the replica's replay is behind its primary. It counts as 0 only
+# while the WAL receiver is streaming and everything received is replayed (an
+# idle primary would otherwise look lagged); a standby cut off from its
+# primary ages by its last replayed transaction. Reading the receiver status
+# needs pg_read_all_stats (e.g. GRANT pg_monitor); without it the replica is
+# treated as not streaming.
+REPLICA_LAG_SQL = text("""
+    SELECT pg_is_in_recovery() AS in_recovery,
+           streaming,
+           CASE
+               WHEN NOT pg_is_in_recovery() THEN 0
+               WHEN streaming AND pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+               ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+           END AS lag_seconds
+    FROM (
+        SELECT EXISTS (SELECT 1 FROM pg_stat_wal_receiver WHERE status = 'streaming') AS streaming
+    ) receiver
+""")
+
+class Replica:
+    """One read replica and the result of its last health check"""
+
+    def __init__(self, url: str):
+        # A replica that stops answering must fail fast, not hang health checks and reads
+        self.engine = create_engine(
+            url,
+            pool_pre_ping=True,
+            connect_args={"connect_timeout": settings.replica_connect_timeout_seconds}
+        )
+        self.session_factory = sessionmaker(autocommit=False, autoflush=False, bind=self.engine)
+        self.healthy = False  # Until the first check passes
+        self.lag_seconds: Optional[float] = None
+        self.in_recovery: Optional[bool] = None
+        self.streaming: Optional[bool] = None
+        self.error: Optional[str] = None
+        self.checked_at: Optional[datetime] = None
+
+    def check(self, max_lag_seconds: float):
+        try:
+            with self.engine.connect() as conn:
+                row = conn.execute(REPLICA_LAG_SQL).one()
+            self.in_recovery = row.in_recovery
+            self.streaming = row.streaming
+            self.lag_seconds = float(row.lag_seconds) if row.lag_seconds is not None else None
+            self.error = None
+            self.healthy = self.lag_seconds is not None and self.lag_seconds <= max_lag_seconds
+        except Exception as e:
+            self.healthy = False
+            self.error = str(e)
+        self.checked_at = datetime.utcnow()
+
+    def get_status(self) -> Dict[str, Any]:
+        return {
+            "url": self.engine.url.render_as_string(hide_password=True),
+            "healthy": self.healthy,
+            "in_recovery": self.in_recovery,
+            "streaming": self.streaming,
+            "lag_seconds": self.lag_seconds,
+            "error": self.error,
+            "checked_at": self.checked_at.isoformat() if self.checked_at else None
+        }
+
+class ReplicaRouter:
+    """Send read-only sessions to healthy replicas, falling back to the primary.
+
+    A replica is ejected while it is unreachable or its replay lag exceeds
+    replica_max_lag_seconds, and readmitted by a later check. A user who
+    wrote within read_your_writes_seconds reads from the primary so they
+    see their own changes; the window should cover the maximum lag plus
+    one check interval. Recent writes are kept in the shared cache, so a
+    read served by another worker sees them too.
+    """
+
+    def __init__(self, urls: List[str]):
+        self.replicas = [Replica(url) for url in urls]
+        self._next = itertools.count()
+        self.writes = get_cache("writes", settings.read_your_writes_seconds)
+        self._recent_writes: Dict[str, float] = {}  # This worker's writes, checked before the cache
+        self._lock = threading.Lock()
+        self.primary_reads = 0
+        self.replica_reads = 0
+
+    async def record_write(self, subject: Optional[str]):
+        """Pin a user (JWT subject) to the primary for the read-your-writes window"""
+        if not self.replicas or not subject:
+            return
+        now = time.monotonic()
+        with self._lock:
+            self._recent_writes[subject] = now
+            if len(self._recent_writes) > 10000:
+                cutoff = now - settings.read_your_writes_seconds
+                self._recent_writes = {k: t for k, t in self._recent_writes.items() if t > cutoff}
+        try:
+            await self.writes.set(cache_key(subject), 1)
+        except Exception as e:
+            print(f"Error recording write for read routing: {e}")
+
+    async def wrote_recently(self, subject: Optional[str]) -> bool:
+        if not subject:
+            return False
+        written = self._recent_writes.get(subject)
+        if written is not None and time.monotonic() - written < settings.read_your_writes_seconds:
+            return True
+        try:
+            return await self.writes.get(cache_key(subject)) is not None
+        except Exception as e:
+            # Without the marker a replica could serve a stale read; use the primary
+            print(f"Error reading write marker: {e}")
+            return True
+
+    async def choose(self, subject: Optional[str] = None) -> Optional[Replica]:
+        healthy = [replica for replica in self.replicas if replica.healthy]
+        if not healthy or await self.wrote_recently(subject):
+            return None
+        return healthy[next(self._next) % len(healthy)]
+
+    async def read_session(self, subject: Optional[str] = None) -> Session:
+        replica = await self.choose(subject)
+        if replica is None:
+            self.primary_reads += 1
+            return SessionLocal()
+        self.replica_reads += 1
+        return replica.session_factory()
+
+    async def check_all(self):
+        """Check every replica at once, so one that hangs does not delay the others"""
+        await asyncio.gather(*(
+            asyncio.to_thread(replica.check, settings.replica_max_lag_seconds) for replica in self.replicas
+        ))
+
+    def get_status(self) -> Dict[str, Any]:
+        return {
+            "replicas": [replica.get_status() for replica in self.replicas],
+            "primary_reads": self.primary_reads,
+            "replica_reads": self.replica_reads
+        }
+
+replica_router = ReplicaRouter(settings.database_replica_urls)
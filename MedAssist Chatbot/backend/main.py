@@ -1,51 +1,120 @@
-from fastapi import FastAPI, HTTPException, Depends, status
+from fastapi import Depends, FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from sqlalchemy.orm import Session
+from contextlib import asynccontextmanager
 import uvicorn
 import os
+import asyncio
 from datetime import datetime
 
-from database import get_db, engine
-from models import Base
-from routers import auth, chat, translation
+from database import engine, SessionLocal, replica_router
+from routers import admin, auth, chat, chat_jobs, chat_ws, translation
 from config import settings
+from services.message_storage import run_maintenance
+from services.audit_service import audit_pipeline
+from services.cache_service import close_cache, get_cache_stats, start_cache
+from services.idempotency_service import idempotency_service
+from services.job_queue import purge_finished_jobs
+from services.llm_service import get_llm_service
+from services.model_registry import start_model_sync
 
-# Create database tables
-Base.metadata.create_all(bind=engine)
-
-app = FastAPI(
-    title="MediChat AI API",
-    description="Medical Chatbot API with multi-language support",
-    version="1.0.0"
-)
-
-# CORS middleware
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["http://localhost:5173", "http://localhost:8081", "http://localhost:3000"],  # React dev server
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
-
-# Include routers
-app.include_router(auth.router, prefix="/api/auth", tags=["authentication"])
-app.include_router(chat.router, prefix="/api/chat", tags=["chat"])
-app.include_router(translation.router, prefix="/api/translate", tags=["translation"])
-
-@app.get("/")
-async def root():
-    return {"message": "MediChat AI API is running", "status": "healthy"}
-
-@app.get("/api/health")
-async def health_check():
-    return {
-        "status": "healthy",
-        "timestamp": datetime.now().isoformat(),
-        "model_path": os.path.exists("../model"),
-        "database": "connected"
-    }
+# Schema changes are applied by `python migrate.py`, not at import or startup
+
+async def message_maintenance_loop():
+    """Periodically create partitions and archive idle sessions"""
+    interval = settings.message_maintenance_interval_minutes * 60
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            result = await asyncio.to_thread(run_maintenance, engine, SessionLocal)
+            if not result.get("skipped"):
+                print(f"Message maintenance: {result}")
+            await asyncio.to_thread(idempotency_service.purge_expired)
+            await asyncio.to_thread(purge_finished_jobs)
+        except Exception as e:
+            print(f"Message maintenance error: {e}")
+
+async def replica_health_loop():
+    """Eject unreachable or lagging replicas and readmit them once they catch up"""
+    while True:
+        await replica_router.check_all()
+        await asyncio.sleep(settings.replica_check_interval_seconds)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start background services; the worker serves requests while models load"""
+    llm_service = get_llm_service()
+    tasks = [asyncio.create_task(asyncio.to_thread(llm_service.load_model))]
+    await audit_pipeline.start()
+    await start_cache()
+    await start_model_sync(llm_service.registry)
+    if settings.message_maintenance_interval_minutes > 0:
+        tasks.append(asyncio.create_task(message_maintenance_loop()))
+    if replica_router.replicas:
+        tasks.append(asyncio.create_task(replica_health_loop()))
+    app.state.model_loader = tasks[0]
+    
+    yield
+    
+    for task in tasks:
+        task.cancel()
+    # Drain queued audit events before the worker exits
+    await audit_pipeline.stop()
+    await translation.translation_service.close()
+    await close_cache()
+
+def create_app() -> FastAPI:
+    app = FastAPI(
+        title="MediChat AI API",
+        description="Medical Chatbot API with multi-language support",
+        version="1.0.0",
+        lifespan=lifespan
+    )
+    
+    # CORS middleware
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["http://localhost:5173", "http://localhost:8081", "http://localhost:3000"],  # React dev server
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+    
+    # Include routers
+    app.include_router(auth.router, prefix="/api/auth", tags=["authentication"])
+    app.include_router(chat.router, prefix="/api/chat", tags=["chat"])
+    app.include_router(chat_ws.router, prefix="/api/chat", tags=["chat"])
+    app.include_router(chat_jobs.router, prefix="/api/chat", tags=["chat"])
+    app.include_router(translation.router, prefix="/api/translate", tags=["translation"])
+    app.include_router(admin.router, prefix="/api/admin", tags=["admin"])
+    
+    @app.get("/")
+    async def root():
+        return {"message": "MediChat AI API is running", "status": "healthy"}
+    
+    @app.get("/api/health")
+    async def health_check():
+        loader = getattr(app.state, "model_loader", None)
+        return {
+            "status": "healthy",
+            "timestamp": datetime.now().isoformat(),
+            "model_path": os.path.exists("../model"),
+            "models": "loading" if loader and not loader.done() else sorted(get_llm_service().registry.tiers),
+            "database": "connected"
+        }
+    
+    @app.get("/api/metrics", dependencies=[Depends(admin.require_admin)])
+    async def metrics():
+        return {
+            "audit": audit_pipeline.get_metrics(),
+            "models": get_llm_service().registry.get_metrics(),
+            "database": replica_router.get_status(),
+            "cache": get_cache_stats(),
+            "websocket_connections": chat_ws.get_connection_count()
+        }
+    
+    return app
+
+app = create_app()
 
 if __name__ == "__main__":
     uvicorn.run(
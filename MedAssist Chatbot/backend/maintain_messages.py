@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Message storage maintenance: partitions, archival and one-off conversion.
+
+Run from cron (e.g. nightly) when the in-process job is disabled:
+    python maintain_messages.py run
+"""
+import argparse
+
+from database import engine, SessionLocal
+from services.message_storage import (
+    archive_idle_sessions,
+    drop_legacy_messages,
+    ensure_message_partitions,
+    run_maintenance,
+)
+
+def main():
+    parser = argparse.ArgumentParser(description="MediChat AI message storage maintenance")
+    sub = parser.add_subparsers(dest="command", required=True)
+    
+    partitions = sub.add_parser("partitions", help="Create upcoming monthly partitions")
+    partitions.add_argument("--months-ahead", type=int, default=None)
+    
+    archive = sub.add_parser("archive", help="Compact idle sessions into session_archives")
+    archive.add_argument("--idle-days", type=int, default=None)
+    archive.add_argument("--deleted-after-days", type=int, default=None)
+    archive.add_argument("--limit", type=int, default=500)
+    
+    sub.add_parser("run", help="Partitions, archival and dropping emptied partitions")
+    
+    sub.add_parser("drop-legacy", help="Drop messages_legacy once migration 0006 has copied it")
+    
+    args = parser.parse_args()
+    
+    if args.command == "partitions":
+        ensure_message_partitions(engine, args.months_ahead)
+        print("✅ Partitions up to date")
+    elif args.command == "archive":
+        db = SessionLocal()
+        try:
+            count = archive_idle_sessions(db, args.idle_days, args.deleted_after_days, args.limit)
+        finally:
+            db.close()
+        print(f"✅ Archived {count} messages")
+    elif args.command == "run":
+        print(f"✅ {run_maintenance(engine, SessionLocal)}")
+    elif args.command == "drop-legacy":
+        if drop_legacy_messages(engine):
+            print("✅ messages_legacy dropped")
+        else:
+            print("✅ No messages_legacy table")
+
+if __name__ == "__main__":
+    main()
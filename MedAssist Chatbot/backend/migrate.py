@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+"""
+Versioned schema migrations. Run once per deploy, before starting workers:
+    python migrate.py            # apply everything pending
+    python migrate.py status
+    python migrate.py upgrade --to 1
+"""
+import argparse
+
+from database import engine
+from services.migrations import migration_status, run_migrations
+
+def main():
+    parser = argparse.ArgumentParser(description="MediChat AI schema migrations")
+    sub = parser.add_subparsers(dest="command")
+    
+    upgrade = sub.add_parser("upgrade", help="Apply pending migrations (default)")
+    upgrade.add_argument("--to", type=int, default=None, help="Stop after this version")
+    
+    sub.add_parser("status", help="List migrations and when they were applied")
+    
+    args = parser.parse_args()
+    
+    if args.command == "status":
+        for migration in migration_status(engine):
+            applied = migration["applied_at"] or "pending"
+            print(f"{migration['version']:04d}_{migration['name']}: {applied}")
+        return
+    
+    applied = run_migrations(engine, getattr(args, "to", None))
+    if applied:
+        for name in applied:
+            print(f"✅ Applied {name}")
+    else:
+        print("✅ Schema is up to date")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Baseline schema: the tables the app created at import time before versioned
+migrations, frozen as explicit DDL. Never change this file; later schema
+changes are new migrations.
+
+Databases built by the old import-time create_all are adopted as-is, since
+every statement here is IF NOT EXISTS.
+"""
+from sqlalchemy import text
+
+STATEMENTS = [
+    """
+    CREATE TABLE IF NOT EXISTS users (
+        id SERIAL PRIMARY KEY,
+        email VARCHAR(255) NOT NULL,
+        password_hash VARCHAR(255) NOT NULL,
+        full_name VARCHAR(255) NOT NULL,
+        date_of_birth DATE,
+        phone VARCHAR(20),
+        preferred_language VARCHAR(10),
+        created_at TIMESTAMP,
+        updated_at TIMESTAMP,
+        is_active BOOLEAN
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_users_id ON users (id)",
+    "CREATE UNIQUE INDEX IF NOT EXISTS ix_users_email ON users (email)",
+    """
+    CREATE TABLE IF NOT EXISTS chat_sessions (
+        id SERIAL PRIMARY KEY,
+        user_id INTEGER NOT NULL REFERENCES users(id),
+        session_name VARCHAR(255),
+        created_at TIMESTAMP,
+        updated_at TIMESTAMP,
+        is_active BOOLEAN
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_chat_sessions_id ON chat_sessions (id)",
+    """
+    CREATE TABLE IF NOT EXISTS messages (
+        id SERIAL PRIMARY KEY,
+        session_id INTEGER NOT NULL REFERENCES chat_sessions(id),
+        user_id INTEGER NOT NULL REFERENCES users(id),
+        content TEXT NOT NULL,
+        sender VARCHAR(10) NOT NULL,
+        language VARCHAR(10),
+        message_type VARCHAR(20),
+        message_metadata JSONB,
+        created_at TIMESTAMP
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_messages_id ON messages (id)",
+    """
+    CREATE TABLE IF NOT EXISTS translation_cache (
+        id SERIAL PRIMARY KEY,
+        source_text TEXT NOT NULL,
+        source_language VARCHAR(10) NOT NULL,
+        target_language VARCHAR(10) NOT NULL,
+        translated_text TEXT NOT NULL,
+        translation_service VARCHAR(50),
+        created_at TIMESTAMP
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_translation_cache_id ON translation_cache (id)",
+    """
+    CREATE TABLE IF NOT EXISTS medical_knowledge (
+        id SERIAL PRIMARY KEY,
+        title VARCHAR(255) NOT NULL,
+        content TEXT NOT NULL,
+        category VARCHAR(100),
+        language VARCHAR(10),
+        tags VARCHAR[],
+        created_at TIMESTAMP,
+        updated_at TIMESTAMP
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_medical_knowledge_id ON medical_knowledge (id)",
+]
+
+
+def upgrade(conn):
+    for statement in STATEMENTS:
+        conn.execute(text(statement))
@@ -0,0 +1,15 @@
+"""
+chat_sessions.last_message_id, so transcript ETags can be computed without
+reading messages. Backfilled from the live messages of each session.
+"""
+from sqlalchemy import text
+
+
+def upgrade(conn):
+    conn.execute(text("ALTER TABLE chat_sessions ADD COLUMN IF NOT EXISTS last_message_id INTEGER"))
+    conn.execute(text("""
+        UPDATE chat_sessions s
+        SET last_message_id = m.last_id
+        FROM (SELECT session_id, max(id) AS last_id FROM messages GROUP BY session_id) m
+        WHERE m.session_id = s.id AND s.last_message_id IS NULL
+    """))
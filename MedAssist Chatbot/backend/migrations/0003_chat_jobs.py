@@ -0,0 +1,34 @@
+"""
+chat_jobs: durable queue for POST /api/chat/jobs, drained by chat_worker.py.
+"""
+from sqlalchemy import text
+
+
+def upgrade(conn):
+    conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS chat_jobs (
+            id SERIAL PRIMARY KEY,
+            user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+            session_id INTEGER NOT NULL REFERENCES chat_sessions(id) ON DELETE CASCADE,
+            user_message_id INTEGER NOT NULL,
+            bot_message_id INTEGER,
+            language VARCHAR(10) DEFAULT 'english',
+            status VARCHAR(20) NOT NULL DEFAULT 'queued' CHECK (status IN ('queued', 'running', 'completed', 'failed')),
+            partial_output TEXT DEFAULT '',
+            error TEXT,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            worker_id VARCHAR(100),
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            started_at TIMESTAMP,
+            heartbeat_at TIMESTAMP,
+            completed_at TIMESTAMP
+        )
+    """))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_chat_jobs_id ON chat_jobs (id)"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_chat_jobs_created_at ON chat_jobs (created_at)"))
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS idx_chat_jobs_pending ON chat_jobs (id) WHERE status IN ('queued', 'running')"
+    ))
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS idx_chat_jobs_session_pending ON chat_jobs (session_id, id) WHERE status IN ('queued', 'running')"
+    ))
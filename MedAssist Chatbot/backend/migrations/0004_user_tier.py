@@ -0,0 +1,8 @@
+"""
+users.tier, used to route turns to a model tier (MODEL_USER_TIERS).
+"""
+from sqlalchemy import text
+
+
+def upgrade(conn):
+    conn.execute(text("ALTER TABLE users ADD COLUMN IF NOT EXISTS tier VARCHAR(20) DEFAULT 'standard'"))
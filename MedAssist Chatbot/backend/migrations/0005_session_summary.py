@@ -0,0 +1,10 @@
+"""
+chat_sessions.summary and summary_message_id: the rolling summary of older
+turns and the last message folded into it.
+"""
+from sqlalchemy import text
+
+
+def upgrade(conn):
+    conn.execute(text("ALTER TABLE chat_sessions ADD COLUMN IF NOT EXISTS summary TEXT"))
+    conn.execute(text("ALTER TABLE chat_sessions ADD COLUMN IF NOT EXISTS summary_message_id INTEGER"))
@@ -0,0 +1,81 @@
+"""
+Range-partition messages by month on created_at, so old months can be
+archived and dropped cheaply. The primary key becomes (id, created_at).
+
+An unpartitioned messages table is renamed to messages_legacy and copied
+into the new layout. A non-empty legacy table is kept until
+`python maintain_messages.py drop-legacy`. Upcoming monthly partitions are
+created after every migration run (services.message_storage).
+"""
+from datetime import datetime
+
+from sqlalchemy import text
+
+from services.message_storage import create_partitions
+
+HISTORY_INDEX = "ix_messages_session_id_created_at"
+
+
+def upgrade(conn):
+    # to_regclass and current_schema() follow the search_path, so another
+    # schema's messages table in the same database is never mistaken for ours
+    is_partitioned = conn.execute(text(
+        "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass('messages'))"
+    )).scalar()
+    if is_partitioned:
+        # Partitioned by database_setup.sql; only the history index may be missing
+        conn.execute(text(f"CREATE INDEX IF NOT EXISTS {HISTORY_INDEX} ON messages (session_id, created_at)"))
+        return
+
+    # Free up the table, index and sequence names for the new table
+    conn.execute(text("ALTER TABLE messages RENAME TO messages_legacy"))
+    for index in conn.execute(text(
+        "SELECT indexname FROM pg_indexes WHERE tablename = 'messages_legacy' AND schemaname = current_schema()"
+    )).scalars().all():
+        conn.execute(text(f'ALTER INDEX "{index}" RENAME TO "{index}_legacy"'))
+    conn.execute(text("ALTER SEQUENCE IF EXISTS messages_id_seq RENAME TO messages_legacy_id_seq"))
+
+    conn.execute(text("""
+        CREATE TABLE messages (
+            id SERIAL NOT NULL,
+            session_id INTEGER NOT NULL REFERENCES chat_sessions(id),
+            user_id INTEGER NOT NULL REFERENCES users(id),
+            content TEXT NOT NULL,
+            sender VARCHAR(10) NOT NULL,
+            language VARCHAR(10),
+            message_type VARCHAR(20),
+            message_metadata JSONB,
+            created_at TIMESTAMP NOT NULL,
+            PRIMARY KEY (id, created_at)
+        ) PARTITION BY RANGE (created_at)
+    """))
+    conn.execute(text("CREATE INDEX ix_messages_id ON messages (id)"))
+    # Session history reads filter on session_id and a created_at lower bound
+    conn.execute(text(f"CREATE INDEX {HISTORY_INDEX} ON messages (session_id, created_at)"))
+
+    # Monthly partitions must exist before rows land, or they would end up
+    # in the default partition and block creating those months later
+    count, oldest, newest = conn.execute(text(
+        "SELECT count(*), min(created_at), max(created_at) FROM messages_legacy"
+    )).one()
+    if count:
+        # Through the current month, where rows without created_at go
+        today = datetime.utcnow().date()
+        create_partitions(conn, oldest.date() if oldest else today, max(newest.date() if newest else today, today))
+    conn.execute(text("CREATE TABLE IF NOT EXISTS messages_default PARTITION OF messages DEFAULT"))
+
+    # Databases set up from database_setup.sql named the JSON column metadata
+    legacy_columns = set(conn.execute(text(
+        "SELECT column_name FROM information_schema.columns "
+        "WHERE table_name = 'messages_legacy' AND table_schema = current_schema()"
+    )).scalars().all())
+    metadata = "message_metadata" if "message_metadata" in legacy_columns else "metadata"
+    conn.execute(text(f"""
+        INSERT INTO messages (id, session_id, user_id, content, sender, language, message_type, message_metadata, created_at)
+        SELECT id, session_id, user_id, content, sender, language, message_type, {metadata}, COALESCE(created_at, now() AT TIME ZONE 'utc')
+        FROM messages_legacy
+    """))
+    conn.execute(text("SELECT setval('messages_id_seq', COALESCE((SELECT max(id) FROM messages), 1))"))
+
+    if not count:
+        conn.execute(text("DROP TABLE messages_legacy"))
@@ -0,0 +1,20 @@
+"""
+session_archives: gzip-compressed transcripts of idle sessions, written by
+message maintenance.
+"""
+from sqlalchemy import text
+
+
+def upgrade(conn):
+    conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS session_archives (
+            session_id INTEGER PRIMARY KEY REFERENCES chat_sessions(id) ON DELETE CASCADE,
+            user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+            message_count INTEGER NOT NULL,
+            payload BYTEA NOT NULL,
+            first_message_at TIMESTAMP,
+            last_message_at TIMESTAMP,
+            archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_session_archives_user_id ON session_archives (user_id)"))
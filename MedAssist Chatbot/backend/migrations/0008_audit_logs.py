@@ -0,0 +1,23 @@
+"""
+audit_logs, written in batches by the audit pipeline. Databases set up from
+database_setup.sql already have it.
+"""
+from sqlalchemy import text
+
+
+def upgrade(conn):
+    conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS audit_logs (
+            id SERIAL PRIMARY KEY,
+            user_id INTEGER REFERENCES users(id),
+            action VARCHAR(100) NOT NULL,
+            table_name VARCHAR(100),
+            record_id INTEGER,
+            old_values JSONB,
+            new_values JSONB,
+            ip_address INET,
+            user_agent TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_audit_logs_id ON audit_logs (id)"))
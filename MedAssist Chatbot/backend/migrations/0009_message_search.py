@@ -0,0 +1,18 @@
+"""
+messages.search_vector with its GIN index for full-text search over chat
+history. Stemmed per message language; local languages use 'simple'.
+Adding the generated column rewrites every partition of messages.
+"""
+from sqlalchemy import text
+
+
+def upgrade(conn):
+    conn.execute(text("""
+        ALTER TABLE messages ADD COLUMN IF NOT EXISTS search_vector TSVECTOR GENERATED ALWAYS AS (to_tsvector(
+            CASE language WHEN 'english' THEN 'english'::regconfig
+                          WHEN 'french' THEN 'french'::regconfig
+                          ELSE 'simple'::regconfig END,
+            content
+        )) STORED
+    """))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS idx_messages_search_vector ON messages USING GIN (search_vector)"))
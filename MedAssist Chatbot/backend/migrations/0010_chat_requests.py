@@ -0,0 +1,26 @@
+"""
+chat_requests: one row per idempotent chat submission (Idempotency-Key or
+client_message_id). The unique key is what makes claiming it safe across
+workers.
+"""
+from sqlalchemy import text
+
+
+def upgrade(conn):
+    conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS chat_requests (
+            id SERIAL PRIMARY KEY,
+            user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+            idempotency_key VARCHAR(100) NOT NULL,
+            request_hash VARCHAR(64),
+            status VARCHAR(20) NOT NULL DEFAULT 'pending' CHECK (status IN ('pending', 'completed', 'failed')),
+            session_id INTEGER,
+            message_id INTEGER,
+            response JSONB,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            completed_at TIMESTAMP,
+            CONSTRAINT uq_chat_requests_user_key UNIQUE (user_id, idempotency_key)
+        )
+    """))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_chat_requests_id ON chat_requests (id)"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_chat_requests_created_at ON chat_requests (created_at)"))
@@ -0,0 +1,10 @@
+"""
+chat_requests.user_message_id: the user message stored under a claim,
+written in the same transaction as the message so a retried request
+reuses it instead of inserting it twice.
+"""
+from sqlalchemy import text
+
+
+def upgrade(conn):
+    conn.execute(text("ALTER TABLE chat_requests ADD COLUMN IF NOT EXISTS user_message_id INTEGER"))
@@ -1,6 +1,6 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, ForeignKey, Date, ARRAY
+from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, ForeignKey, Date, ARRAY, LargeBinary, Computed, Index, UniqueConstraint
 from sqlalchemy.orm import relationship
-from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.dialects.postgresql import JSONB, INET, TSVECTOR
 from database import Base
 from datetime import datetime
 
@@ -14,6 +14,7 @@ class User(Base):
     date_of_birth = Column(Date)
     phone = Column(String(20))
     preferred_language = Column(String(10), default="english")
+    tier = Column(String(20), default="standard")  # Used for model routing
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     is_active = Column(Boolean, default=True)
@@ -27,6 +28,9 @@ class ChatSession(Base):
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     session_name = Column(String(255))
+    summary = Column(Text)  # Rolling summary of older turns
+    summary_message_id = Column(Integer)  # Last message folded into the summary
+    last_message_id = Column(Integer)  # Newest message; with updated_at it versions the transcript
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     is_active = Column(Boolean, default=True)
@@ -34,10 +38,23 @@ class ChatSession(Base):
     user = relationship("User", back_populates="chat_sessions")
     messages = relationship("Message", back_populates="session")
 
+# Text search configuration matching Message.language; local languages have no
+# stemmer so they use the 'simple' configuration
+MESSAGE_SEARCH_CONFIG_SQL = (
+    "CASE language WHEN 'english' THEN 'english'::regconfig "
+    "WHEN 'french' THEN 'french'::regconfig ELSE 'simple'::regconfig END"
+)
+
 class Message(Base):
     __tablename__ = "messages"
+    # Monthly range partitions are created by services.message_storage
+    __table_args__ = (
+        Index("ix_messages_session_id_created_at", "session_id", "created_at"),
+        Index("idx_messages_search_vector", "search_vector", postgresql_using="gin"),
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
     
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True, autoincrement=True, index=True)
     session_id = Column(Integer, ForeignKey("chat_sessions.id"), nullable=False)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     content = Column(Text, nullable=False)
@@ -45,11 +62,71 @@ class Message(Base):
     language = Column(String(10), default="english")
     message_type = Column(String(20), default="text")
     message_metadata = Column(JSONB)
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, primary_key=True, default=datetime.utcnow)  # Partition key
+    search_vector = Column(
+        TSVECTOR,
+        Computed(f"to_tsvector({MESSAGE_SEARCH_CONFIG_SQL}, content)", persisted=True)
+    )
     
     session = relationship("ChatSession", back_populates="messages")
     user = relationship("User", back_populates="messages")
 
+class ChatJob(Base):
+    """Queued chat generation; claimed by chat_worker.py with FOR UPDATE SKIP LOCKED"""
+    __tablename__ = "chat_jobs"
+    __table_args__ = (
+        Index("idx_chat_jobs_pending", "id", postgresql_where=Column("status").in_(["queued", "running"])),
+        Index("idx_chat_jobs_session_pending", "session_id", "id", postgresql_where=Column("status").in_(["queued", "running"])),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    session_id = Column(Integer, ForeignKey("chat_sessions.id", ondelete="CASCADE"), nullable=False)
+    user_message_id = Column(Integer, nullable=False)
+    bot_message_id = Column(Integer)
+    language = Column(String(10), default="english")
+    status = Column(String(20), nullable=False, default="queued")  # queued, running, completed or failed
+    partial_output = Column(Text, default="")
+    error = Column(Text)
+    attempts = Column(Integer, nullable=False, default=0)
+    worker_id = Column(String(100))
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+    started_at = Column(DateTime)
+    heartbeat_at = Column(DateTime)  # Running jobs with a stale heartbeat are reclaimed
+    completed_at = Column(DateTime)
+
+class ChatRequest(Base):
+    """One idempotent chat submission; the unique key stops retries from
+    storing duplicate messages (messages itself is partitioned, so a unique
+    constraint there would have to include created_at)"""
+    __tablename__ = "chat_requests"
+    __table_args__ = (
+        UniqueConstraint("user_id", "idempotency_key", name="uq_chat_requests_user_key"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    idempotency_key = Column(String(100), nullable=False)
+    request_hash = Column(String(64))
+    status = Column(String(20), nullable=False, default="pending")  # pending, completed or failed
+    session_id = Column(Integer)
+    user_message_id = Column(Integer)  # Stored with the claim, so a retry does not insert it again
+    message_id = Column(Integer)
+    response = Column(JSONB)  # Stored ChatResponse
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+    completed_at = Column(DateTime)
+
+class SessionArchive(Base):
+    __tablename__ = "session_archives"
+    
+    session_id = Column(Integer, ForeignKey("chat_sessions.id"), primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    message_count = Column(Integer, nullable=False)
+    payload = Column(LargeBinary, nullable=False)  # gzip-compressed JSON list of messages
+    first_message_at = Column(DateTime)
+    last_message_at = Column(DateTime)
+    archived_at = Column(DateTime, default=datetime.utcnow)
+
 class TranslationCache(Base):
     __tablename__ = "translation_cache"
     
@@ -71,4 +148,18 @@ class MedicalKnowledge(Base):
     language = Column(String(10), default="english")
     tags = Column(ARRAY(String))
     created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
\ No newline at end of file
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class AuditLog(Base):
+    __tablename__ = "audit_logs"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"))
+    action = Column(String(100), nullable=False)
+    table_name = Column(String(100))
+    record_id = Column(Integer)
+    old_values = Column(JSONB)
+    new_values = Column(JSONB)
+    ip_address = Column(INET)
+    user_agent = Column(Text)
+    created_at = Column(DateTime, default=datetime.utcnow)
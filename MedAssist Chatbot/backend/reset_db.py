@@ -35,9 +35,9 @@ try:
     
     # Now recreate with SQLAlchemy
     from database import engine
-    from models import Base
+    from services.migrations import run_migrations
     
-    Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
     print('✅ Tables recreated with correct schema')
     
 except Exception as e:
@@ -0,0 +1,48 @@
+from fastapi import APIRouter, Depends, Header, HTTPException, status
+from pydantic import BaseModel
+from typing import Optional
+import os
+import secrets
+
+from config import settings
+from services.llm_service import get_llm_service
+from services.model_registry import broadcast_model_command
+
+router = APIRouter()
+llm_service = get_llm_service()
+
+class ModelLoadRequest(BaseModel):
+    tier: str
+    path: str
+
+def require_admin(x_admin_key: Optional[str] = Header(None)):
+    if not settings.admin_api_key:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin API is disabled")
+    if not x_admin_key or not secrets.compare_digest(x_admin_key, settings.admin_api_key):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid admin key")
+
+@router.get("/models", dependencies=[Depends(require_admin)])
+async def list_models():
+    """Models of the worker that served this request (see "worker")"""
+    return llm_service.registry.get_metrics()
+
+@router.post("/models", status_code=status.HTTP_202_ACCEPTED, dependencies=[Depends(require_admin)])
+async def load_model(request: ModelLoadRequest):
+    if not request.path.endswith(".gguf") or not os.path.isfile(request.path):
+        raise HTTPException(status_code=400, detail="Model file not found")
+    if llm_service.registry.is_loading(request.tier):
+        raise HTTPException(status_code=409, detail=f"Tier '{request.tier}' is already loading")
+    
+    # Every worker loads and warms in the background; traffic switches once its model is ready
+    scope = await broadcast_model_command("load", request.tier, request.path)
+    return {"message": f"Loading {request.path} into tier '{request.tier}'", "tier": request.tier, "scope": scope}
+
+@router.delete("/models/{tier}", status_code=status.HTTP_202_ACCEPTED, dependencies=[Depends(require_admin)])
+async def unload_model(tier: str):
+    if tier not in llm_service.registry.tiers:
+        raise HTTPException(status_code=404, detail="Tier not found")
+    if len(llm_service.registry.tiers) == 1:
+        raise HTTPException(status_code=400, detail="Cannot unload the last model")
+    
+    scope = await broadcast_model_command("unload", tier)
+    return {"message": f"Unloading tier '{tier}'", "tier": tier, "scope": scope}
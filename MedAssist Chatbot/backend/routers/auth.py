@@ -1,19 +1,27 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.orm import Session
-from passlib.context import CryptContext
 from jose import JWTError, jwt
 from datetime import datetime, timedelta
 from pydantic import BaseModel, EmailStr
 from typing import Optional
+import asyncio
 
-from database import get_db
+from database import get_db, replica_router
 from models import User
 from config import settings
+from services.audit_service import audit_pipeline
+from services.cache_service import cache_key, get_cache
 
 router = APIRouter()
 security = HTTPBearer()
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+_pwd_context = None
+user_cache = get_cache("user", settings.cache_user_ttl_seconds)
+
+# Columns kept in the user cache; enough for every current_user consumer.
+# Code that changes a users row must call forget_user, or workers keep
+# serving the old values for up to cache_user_ttl_seconds.
+CACHED_USER_FIELDS = ["id", "email", "full_name", "preferred_language", "tier", "is_active"]
 
 class UserCreate(BaseModel):
     email: EmailStr
@@ -32,11 +40,19 @@ class Token(BaseModel):
     token_type: str
     user: dict
 
+def get_pwd_context():
+    """Build the bcrypt context on first use; passlib loads its backends eagerly"""
+    global _pwd_context
+    if _pwd_context is None:
+        from passlib.context import CryptContext
+        _pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+    return _pwd_context
+
 def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+    return get_pwd_context().verify(plain_password, hashed_password)
 
 def get_password_hash(password):
-    return pwd_context.hash(password)
+    return get_pwd_context().hash(password)
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
@@ -48,27 +64,62 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, settings.secret_key, algorithm=settings.algorithm)
     return encoded_jwt
 
-def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security), db: Session = Depends(get_db)):
+def get_token_subject(token: str) -> Optional[str]:
+    """Email in a valid token, or None"""
+    try:
+        payload = jwt.decode(token, settings.secret_key, algorithms=[settings.algorithm])
+    except JWTError:
+        return None
+    return payload.get("sub")
+
+async def forget_user(email: str):
+    """Drop a user's cached row in every worker; call after any change to a users row"""
+    await user_cache.delete(cache_key(email))
+
+async def get_user_from_token(token: str, db: Session) -> User:
+    """Resolve a token to its user, from the shared user cache when possible.
+
+    The returned User is detached: fine for reading attributes, not for
+    loading relationships or writing back.
+    """
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    try:
-        payload = jwt.decode(credentials.credentials, settings.secret_key, algorithms=[settings.algorithm])
-        email: str = payload.get("sub")
-        if email is None:
-            raise credentials_exception
-    except JWTError:
+    email = get_token_subject(token)
+    if email is None:
         raise credentials_exception
     
-    user = db.query(User).filter(User.email == email).first()
-    if user is None:
+    def load_user():
+        user = db.query(User).filter(User.email == email).first()
+        return {field: getattr(user, field) for field in CACHED_USER_FIELDS} if user else None
+    
+    async def load_user_off_loop():
+        return await asyncio.to_thread(load_user)
+    
+    fields = await user_cache.get_or_set(cache_key(email), load_user_off_loop)
+    if fields is None:
         raise credentials_exception
-    return user
+    return User(**fields)
+
+async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security), db: Session = Depends(get_db)):
+    return await get_user_from_token(credentials.credentials, db)
+
+async def get_read_db(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    """Session for read-only endpoints: a healthy replica, or the primary
+    when none is available or the caller wrote recently"""
+    db = await replica_router.read_session(get_token_subject(credentials.credentials))
+    try:
+        yield db
+    finally:
+        db.close()
+
+async def get_current_user_read(credentials: HTTPAuthorizationCredentials = Depends(security), db: Session = Depends(get_read_db)):
+    return await get_user_from_token(credentials.credentials, db)
 
 @router.post("/register", response_model=Token)
-async def register_user(user: UserCreate, db: Session = Depends(get_db)):
+async def register_user(user: UserCreate, request: Request, db: Session = Depends(get_db)):
     # Check if user already exists
     db_user = db.query(User).filter(User.email == user.email).first()
     if db_user:
@@ -96,6 +147,12 @@ async def register_user(user: UserCreate, db: Session = Depends(get_db)):
     db.add(db_user)
     db.commit()
     db.refresh(db_user)
+    # A row under this email may have existed before (e.g. deleted by an operator)
+    await forget_user(db_user.email)
+    
+    audit_pipeline.record("register", user_id=db_user.id, table_name="users", record_id=db_user.id, request=request)
+    # The new user's first /me must not race replication
+    await replica_router.record_write(db_user.email)
     
     # Create access token
     access_token_expires = timedelta(minutes=settings.access_token_expire_minutes)
@@ -115,15 +172,23 @@ async def register_user(user: UserCreate, db: Session = Depends(get_db)):
     }
 
 @router.post("/login", response_model=Token)
-async def login_user(user: UserLogin, db: Session = Depends(get_db)):
+async def login_user(user: UserLogin, request: Request, db: Session = Depends(get_db)):
     db_user = db.query(User).filter(User.email == user.email).first()
     if not db_user or not verify_password(user.password, db_user.password_hash):
+        audit_pipeline.record(
+            "login_failed",
+            user_id=db_user.id if db_user else None,
+            new_values={"email": user.email},
+            request=request
+        )
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
     
+    audit_pipeline.record("login", user_id=db_user.id, table_name="users", record_id=db_user.id, request=request)
+    
     access_token_expires = timedelta(minutes=settings.access_token_expire_minutes)
     access_token = create_access_token(
         data={"sub": db_user.email}, expires_delta=access_token_expires
@@ -141,7 +206,7 @@ async def login_user(user: UserLogin, db: Session = Depends(get_db)):
     }
 
 @router.get("/me")
-async def get_current_user_info(current_user: User = Depends(get_current_user)):
+async def get_current_user_info(current_user: User = Depends(get_current_user_read)):
     return {
         "id": current_user.id,
         "email": current_user.email,
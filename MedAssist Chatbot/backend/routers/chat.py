@@ -1,21 +1,30 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, BackgroundTasks, Depends, Header, HTTPException, Query, Request
+from sqlalchemy import func
 from sqlalchemy.orm import Session
-from pydantic import BaseModel
-from typing import List, Optional
+from pydantic import BaseModel, Field
+from typing import Dict, List, Optional
+from datetime import datetime
 import os
 
-from database import get_db
+from database import get_db, replica_router
 from models import User, ChatSession, Message
-from routers.auth import get_current_user
-from services.llm_service import LLMService
+from routers.auth import get_current_user, get_current_user_read, get_read_db
+from services.audit_service import audit_pipeline
+from services.idempotency_service import idempotency_service
+from services.llm_service import get_llm_service
+from services.memory_service import update_session_summary
+from services.message_storage import archived_message_counts, load_archived_messages, session_message_filter
+from services.response_encoding import etag_matches, json_response, make_etag, not_modified
+from services.search_service import search_messages
 
 router = APIRouter()
-llm_service = LLMService()
+llm_service = get_llm_service()
 
 class ChatMessage(BaseModel):
     message: str
     language: str = "english"
     session_id: Optional[int] = None
+    client_message_id: Optional[str] = Field(None, max_length=100)  # Retries with the same id return the first response
 
 class ChatResponse(BaseModel):
     response: str
@@ -28,106 +37,218 @@ class ChatHistoryResponse(BaseModel):
     created_at: str
     message_count: int
 
+class SearchResult(BaseModel):
+    message_id: int
+    session_id: int
+    session_name: str
+    sender: str
+    language: Optional[str] = None
+    snippet: str  # HTML-escaped, matches wrapped in <mark>
+    rank: float
+    created_at: str
+
+class SearchResponse(BaseModel):
+    results: List[SearchResult]
+    next_cursor: Optional[str] = None
+
+def get_or_create_session(db: Session, user_id: int, session_id: Optional[int], first_message: str) -> ChatSession:
+    """Load one of the user's sessions, or start a new one named after the first message"""
+    if session_id:
+        session = db.query(ChatSession).filter(
+            ChatSession.id == session_id,
+            ChatSession.user_id == user_id
+        ).first()
+        if not session:
+            raise HTTPException(status_code=404, detail="Session not found")
+        return session
+    
+    # Create new session with truncated message as name
+    session_name = first_message[:50] + "..." if len(first_message) > 50 else first_message
+    session = ChatSession(
+        user_id=user_id,
+        session_name=session_name
+    )
+    db.add(session)
+    db.commit()
+    db.refresh(session)
+    return session
+
+def save_message(db: Session, session_id: int, user_id: int, content: str, sender: str, language: str, commit: bool = True) -> Message:
+    """Insert a message; with commit=False it joins the caller's transaction"""
+    message = Message(
+        session_id=session_id,
+        user_id=user_id,
+        content=content,
+        sender=sender,
+        language=language
+    )
+    db.add(message)
+    db.flush()
+    # Versions the transcript for ETags without reading messages
+    db.query(ChatSession).filter(ChatSession.id == session_id).update({
+        "last_message_id": func.greatest(func.coalesce(ChatSession.last_message_id, 0), message.id),
+        "updated_at": datetime.utcnow()
+    }, synchronize_session=False)
+    if commit:
+        db.commit()
+        db.refresh(message)
+    return message
+
+def load_chat_history(db: Session, session, before_message_id: int) -> List[Dict[str, str]]:
+    """Turns before the given message not yet folded into the session summary, oldest first.
+
+    The prompt builder keeps as many of the newest ones as fit the token budget.
+    """
+    recent_messages = db.query(Message).filter(
+        *session_message_filter(session),
+        Message.id > (session.summary_message_id or 0),
+        Message.id < before_message_id  # The current message and anything queued after it
+    ).order_by(Message.id.desc()).limit(50).all()
+    
+    return [{
+        "role": "assistant" if msg.sender == "bot" else "user",
+        "content": msg.content
+    } for msg in reversed(recent_messages)]
+
 @router.post("/", response_model=ChatResponse)
 async def send_message(
     chat_message: ChatMessage,
+    background_tasks: BackgroundTasks,
+    request: Request,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key", max_length=100),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    try:
-        # Get or create chat session
-        if chat_message.session_id:
-            session = db.query(ChatSession).filter(
-                ChatSession.id == chat_message.session_id,
-                ChatSession.user_id == current_user.id
-            ).first()
-            if not session:
-                raise HTTPException(status_code=404, detail="Session not found")
+    key = idempotency_key or chat_message.client_message_id
+    
+    async def process(resume: Optional[Dict[str, int]] = None) -> Dict:
+        if resume:
+            # An earlier attempt under this key already stored the user message
+            session = get_or_create_session(db, current_user.id, resume["session_id"], chat_message.message)
+            user_message_id = resume["user_message_id"]
         else:
-            # Create new session with truncated message as name
-            session_name = chat_message.message[:50] + "..." if len(chat_message.message) > 50 else chat_message.message
-            session = ChatSession(
-                user_id=current_user.id,
-                session_name=session_name
+            # Get or create chat session
+            session = get_or_create_session(db, current_user.id, chat_message.session_id, chat_message.message)
+            
+            # Save user message, committed together with the idempotency claim
+            user_message = save_message(
+                db, session.id, current_user.id, chat_message.message, "user", chat_message.language, commit=False
             )
-            db.add(session)
+            user_message_id = user_message.id
+            if key is not None:
+                idempotency_service.mark_user_message(db, current_user.id, key, session.id, user_message_id)
             db.commit()
-            db.refresh(session)
-        
-        # Save user message
-        user_message = Message(
-            session_id=session.id,
-            user_id=current_user.id,
-            content=chat_message.message,
-            sender="user",
-            language=chat_message.language
-        )
-        db.add(user_message)
-        db.commit()
-        
-        # Get chat history for context
-        recent_messages = db.query(Message).filter(
-            Message.session_id == session.id
-        ).order_by(Message.created_at.desc()).limit(10).all()
         
         # Generate AI response
         ai_response = await llm_service.generate_response(
             message=chat_message.message,
             language=chat_message.language,
-            chat_history=[{
-                "role": "assistant" if msg.sender == "bot" else "user",
-                "content": msg.content
-            } for msg in reversed(recent_messages[:-1])]  # Exclude the current message
+            chat_history=load_chat_history(db, session, user_message_id),
+            summary=session.summary,
+            user_tier=current_user.tier
         )
         
         # Save AI response
-        bot_message = Message(
-            session_id=session.id,
-            user_id=current_user.id,
-            content=ai_response,
-            sender="bot",
-            language=chat_message.language
+        bot_message = save_message(
+            db, session.id, current_user.id, ai_response, "bot", chat_message.language
         )
-        db.add(bot_message)
-        db.commit()
-        db.refresh(bot_message)
         
-        return ChatResponse(
-            response=ai_response,
-            session_id=session.id,
-            message_id=bot_message.id
+        await replica_router.record_write(current_user.email)
+        
+        # Condense older turns off the request path
+        background_tasks.add_task(update_session_summary, session.id)
+        audit_pipeline.record(
+            "chat_message",
+            user_id=current_user.id,
+            table_name="messages",
+            record_id=bot_message.id,
+            new_values={"session_id": session.id, "language": chat_message.language},
+            request=request
         )
         
+        return {
+            "response": ai_response,
+            "session_id": session.id,
+            "message_id": bot_message.id
+        }
+    
+    try:
+        if key is None:
+            return ChatResponse(**await process())
+        
+        # Retried or double-submitted requests share one generation and one stored answer
+        payload = {
+            "message": chat_message.message,
+            "language": chat_message.language,
+            "session_id": chat_message.session_id
+        }
+        return ChatResponse(**await idempotency_service.run(current_user.id, key, payload, process))
+        
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing chat: {str(e)}")
 
+@router.get("/search", response_model=SearchResponse)
+async def search_chat_history(
+    q: str = Query(..., min_length=1, max_length=200),
+    language: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=50),
+    cursor: Optional[str] = None,
+    current_user: User = Depends(get_current_user_read),
+    db: Session = Depends(get_read_db)
+):
+    try:
+        results, next_cursor = search_messages(db, current_user.id, q, language, limit, cursor)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    
+    return SearchResponse(results=results, next_cursor=next_cursor)
+
 @router.get("/history", response_model=List[ChatHistoryResponse])
 async def get_chat_history(
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    request: Request,
+    current_user: User = Depends(get_current_user_read),
+    db: Session = Depends(get_read_db)
 ):
+    # Any new, deleted or updated session changes one of these
+    version = db.query(
+        func.count(ChatSession.id),
+        func.max(ChatSession.updated_at),
+        func.max(ChatSession.last_message_id)
+    ).filter(
+        ChatSession.user_id == current_user.id,
+        ChatSession.is_active == True
+    ).one()
+    etag = make_etag("history", current_user.id, *version)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    
     sessions = db.query(ChatSession).filter(
         ChatSession.user_id == current_user.id,
         ChatSession.is_active == True
     ).order_by(ChatSession.updated_at.desc()).all()
     
+    archived_counts = archived_message_counts(db, [session.id for session in sessions])
+    
     history = []
     for session in sessions:
-        message_count = db.query(Message).filter(Message.session_id == session.id).count()
-        history.append(ChatHistoryResponse(
-            id=session.id,
-            session_name=session.session_name or f"Chat {session.id}",
-            created_at=session.created_at.isoformat(),
-            message_count=message_count
-        ))
+        message_count = db.query(Message).filter(*session_message_filter(session)).count()
+        history.append({
+            "id": session.id,
+            "session_name": session.session_name or f"Chat {session.id}",
+            "created_at": session.created_at.isoformat(),
+            "message_count": message_count + archived_counts.get(session.id, 0)
+        })
     
-    return history
+    return json_response(request, history, etag)
 
 @router.get("/history/{session_id}")
 async def get_session_messages(
     session_id: int,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    request: Request,
+    current_user: User = Depends(get_current_user_read),
+    db: Session = Depends(get_read_db)
 ):
     session = db.query(ChatSession).filter(
         ChatSession.id == session_id,
@@ -137,28 +258,42 @@ async def get_session_messages(
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
     
-    messages = db.query(Message).filter(
-        Message.session_id == session_id
-    ).order_by(Message.created_at.asc()).all()
+    # Unchanged transcripts are answered from chat_sessions alone
+    etag = make_etag("messages", session.id, session.updated_at, session.last_message_id)
+    if etag_matches(request, etag):
+        return not_modified(etag)
     
-    return {
+    # Compacted older messages come first, then the live rows
+    messages = load_archived_messages(db, session_id)
+    messages += [{
+        "id": msg.id,
+        "content": msg.content,
+        "sender": msg.sender,
+        "language": msg.language,
+        "created_at": msg.created_at
+    } for msg in db.query(Message).filter(
+        *session_message_filter(session)
+    ).order_by(Message.created_at.asc()).all()]
+    
+    return json_response(request, {
         "session": {
             "id": session.id,
             "name": session.session_name,
             "created_at": session.created_at.isoformat()
         },
         "messages": [{
-            "id": msg.id,
-            "content": msg.content,
-            "sender": msg.sender,
-            "language": msg.language,
-            "created_at": msg.created_at.isoformat()
+            "id": msg["id"],
+            "content": msg["content"],
+            "sender": msg["sender"],
+            "language": msg["language"],
+            "created_at": msg["created_at"].isoformat()
         } for msg in messages]
-    }
+    }, etag)
 
 @router.delete("/history/{session_id}")
 async def delete_session(
     session_id: int,
+    request: Request,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
@@ -173,5 +308,16 @@ async def delete_session(
     # Soft delete
     session.is_active = False
     db.commit()
+    await replica_router.record_write(current_user.email)
+    
+    audit_pipeline.record(
+        "delete_session",
+        user_id=current_user.id,
+        table_name="chat_sessions",
+        record_id=session.id,
+        old_values={"is_active": True},
+        new_values={"is_active": False},
+        request=request
+    )
     
     return {"message": "Session deleted successfully"}
\ No newline at end of file
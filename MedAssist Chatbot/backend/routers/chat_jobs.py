@@ -0,0 +1,108 @@
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, status
+from sqlalchemy.orm import Session
+from pydantic import BaseModel
+from typing import Any, Dict, Optional
+import asyncio
+import time
+
+from config import settings
+from database import get_db, replica_router
+from models import User, ChatJob, Message
+from routers.auth import get_current_user
+from routers.chat import ChatMessage, get_or_create_session, save_message
+from services.idempotency_service import idempotency_service
+from services.job_queue import FINISHED_STATUSES, enqueue_job, serialize_job
+
+router = APIRouter()
+
+class ChatJobResponse(BaseModel):
+    job_id: int
+    status: str  # queued, running, completed or failed
+    session_id: int
+    user_message_id: int
+    partial_output: str = ""
+    error: Optional[str] = None
+    created_at: Optional[str] = None
+    started_at: Optional[str] = None
+    completed_at: Optional[str] = None
+    message: Optional[Dict[str, Any]] = None  # The bot message once completed
+
+@router.post("/jobs", response_model=ChatJobResponse, status_code=status.HTTP_202_ACCEPTED)
+async def create_chat_job(
+    chat_message: ChatMessage,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key", max_length=100),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Store the user turn and queue its generation for chat_worker.py"""
+    key = idempotency_key or chat_message.client_message_id
+    
+    async def process(resume: Optional[Dict[str, int]] = None) -> Dict:
+        if resume:
+            # The message, its job and the claim were committed together by an earlier attempt
+            job = db.query(ChatJob).filter(
+                ChatJob.user_id == current_user.id,
+                ChatJob.user_message_id == resume["user_message_id"]
+            ).first()
+            if job:
+                return serialize_job(job)
+        
+        session = get_or_create_session(db, current_user.id, chat_message.session_id, chat_message.message)
+        # The user message, its job and the idempotency claim commit together
+        user_message = save_message(
+            db, session.id, current_user.id, chat_message.message, "user", chat_message.language, commit=False
+        )
+        if key is not None:
+            idempotency_service.mark_user_message(db, current_user.id, key, session.id, user_message.id)
+        job = enqueue_job(db, current_user.id, session.id, user_message.id, chat_message.language)
+        await replica_router.record_write(current_user.email)
+        return serialize_job(job)
+    
+    try:
+        if key is None:
+            return await process()
+        
+        payload = {
+            "mode": "job",
+            "message": chat_message.message,
+            "language": chat_message.language,
+            "session_id": chat_message.session_id
+        }
+        return await idempotency_service.run(current_user.id, key, payload, process)
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(status_code=500, detail=f"Error queueing chat: {str(e)}")
+
+@router.get("/jobs/{job_id}", response_model=ChatJobResponse)
+async def get_chat_job(
+    job_id: int,
+    wait: float = Query(0, ge=0, description="Long-poll: seconds to wait for new output or completion"),
+    since: int = Query(0, ge=0, description="Characters of partial_output the client already has"),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    deadline = time.monotonic() + min(wait, settings.job_long_poll_max_seconds)
+    while True:
+        job = db.query(ChatJob).filter(
+            ChatJob.id == job_id,
+            ChatJob.user_id == current_user.id
+        ).populate_existing().first()
+        if not job:
+            raise HTTPException(status_code=404, detail="Job not found")
+        
+        if job.status in FINISHED_STATUSES or len(job.partial_output or "") > since or time.monotonic() >= deadline:
+            break
+        # End the transaction so the pooled connection is free while waiting
+        db.rollback()
+        await asyncio.sleep(settings.job_poll_seconds)
+    
+    message = None
+    if job.bot_message_id:
+        message = db.query(Message).filter(
+            Message.id == job.bot_message_id,
+            Message.session_id == job.session_id
+        ).first()
+    return serialize_job(job, message)
@@ -0,0 +1,311 @@
+from fastapi import APIRouter, HTTPException, WebSocket, WebSocketDisconnect
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+import asyncio
+import json
+import time
+
+from config import settings
+from database import SessionLocal, replica_router
+from models import ChatSession
+from routers.auth import get_user_from_token
+from routers.chat import get_or_create_session, load_chat_history, save_message, llm_service
+from services.audit_service import audit_pipeline
+from services.memory_service import update_session_summary
+
+router = APIRouter()
+
+# Open sockets in this worker, capped by settings.ws_max_connections
+_active_connections = 0
+
+# Close codes
+WS_UNAUTHORIZED = 4401
+WS_HEARTBEAT_TIMEOUT = 4408
+WS_SEND_TIMEOUT = 4409
+WS_TRY_AGAIN_LATER = 1013
+
+class SessionState:
+    """What a connection remembers about one of its chat sessions"""
+
+    def __init__(self, session: ChatSession):
+        self.id = session.id
+        self.created_at = session.created_at
+        self.summary = session.summary
+        self.summary_message_id = session.summary_message_id
+        self.lock = asyncio.Lock()  # One turn at a time per session
+
+    def refresh(self, session: ChatSession):
+        self.summary = session.summary
+        self.summary_message_id = session.summary_message_id
+
+class ChatConnection:
+    """One authenticated socket multiplexing several chat sessions.
+
+    Client frames:
+        {"type": "auth", "token": "..."}  (unless ?token= was given)
+        {"type": "message", "request_id": "...", "session_id": 1, "message": "...", "language": "english"}
+        {"type": "ping"} / {"type": "pong"}
+    Server frames: ready, session, token, done, error, ping, pong.
+
+    All outgoing frames go through a bounded queue drained by one writer.
+    A client that reads slowly only holds up its own turns; one that stops
+    reading is dropped once a write takes longer than ws_send_timeout_seconds.
+    At most ws_max_turns_in_flight turns run at once per connection.
+    """
+
+    def __init__(self, websocket: WebSocket):
+        self.websocket = websocket
+        self.user: Optional[Dict[str, Any]] = None
+        self.sessions: Dict[int, SessionState] = {}
+        self.outbox: asyncio.Queue = asyncio.Queue(maxsize=settings.ws_send_queue_size)
+        self.tasks = set()
+        self.last_seen = time.monotonic()
+        self.turns_in_flight = 0
+        self.receiver: Optional[asyncio.Task] = None
+        self.close_code: Optional[int] = None
+
+    async def send(self, frame: Dict[str, Any]):
+        await self.outbox.put(frame)
+
+    def abort(self, code: int):
+        """Drop the connection without waiting on the client"""
+        if self.close_code is None:
+            self.close_code = code
+            if self.receiver is not None:
+                self.receiver.cancel()
+
+    async def writer(self):
+        while True:
+            frame = await self.outbox.get()
+            try:
+                await asyncio.wait_for(self.websocket.send_json(frame), settings.ws_send_timeout_seconds)
+            except asyncio.TimeoutError:
+                self.abort(WS_SEND_TIMEOUT)
+                return
+
+    async def heartbeat(self):
+        interval = settings.ws_heartbeat_seconds
+        while True:
+            await asyncio.sleep(interval)
+            if time.monotonic() - self.last_seen > interval * 2:
+                self.abort(WS_HEARTBEAT_TIMEOUT)
+                return
+            try:
+                # A full outbox means the client stopped reading
+                self.outbox.put_nowait({"type": "ping", "timestamp": datetime.utcnow().isoformat()})
+            except asyncio.QueueFull:
+                self.abort(WS_SEND_TIMEOUT)
+                return
+
+    async def authenticate(self, token: Optional[str]) -> bool:
+        """Decode the JWT and load the user once for the whole connection"""
+        if not token:
+            try:
+                frame = await asyncio.wait_for(self.websocket.receive_json(), settings.ws_auth_timeout_seconds)
+            except (asyncio.TimeoutError, ValueError):
+                return False
+            if not isinstance(frame, dict) or frame.get("type") != "auth":
+                return False
+            token = frame.get("token")
+
+        db = SessionLocal()
+        try:
+            user = await get_user_from_token(token or "", db)
+        except HTTPException:
+            return False
+        finally:
+            db.close()
+
+        self.user = {
+            "id": user.id,
+            "email": user.email,
+            "full_name": user.full_name,
+            "preferred_language": user.preferred_language,
+            "tier": user.tier
+        }
+        return True
+
+    def _load_session(self, session_id: Optional[int], text: str) -> SessionState:
+        """Fetch the frame's session, creating it if needed (blocking)"""
+        db = SessionLocal()
+        try:
+            return SessionState(get_or_create_session(db, self.user["id"], session_id, text))
+        finally:
+            db.close()
+
+    async def _session_state(self, session_id: Optional[int], text: str) -> Tuple[SessionState, bool]:
+        """State for the frame's session and whether it was just loaded"""
+        state = self.sessions.get(session_id)
+        if state is not None:
+            return state, False
+        state = await asyncio.to_thread(self._load_session, session_id, text)
+        return self.sessions.setdefault(state.id, state), True
+
+    def _save_user_turn(self, state: SessionState, text: str, language: str) -> Tuple[int, List[Dict[str, str]]]:
+        db = SessionLocal()
+        try:
+            user_message = save_message(db, state.id, self.user["id"], text, "user", language)
+            return user_message.id, load_chat_history(db, state, user_message.id)
+        finally:
+            db.close()
+
+    def _save_bot_turn(self, state: SessionState, text: str, language: str) -> int:
+        db = SessionLocal()
+        try:
+            return save_message(db, state.id, self.user["id"], text, "bot", language).id
+        finally:
+            db.close()
+
+    async def handle_message(self, frame: Dict[str, Any]):
+        try:
+            state = await self._handle_message(frame)
+        finally:
+            self.turns_in_flight -= 1
+        # The reply is out; summarizing must not hold up the next turn
+        if state is not None:
+            await self.refresh_summary(state)
+
+    def _load_summary(self, state: SessionState):
+        db = SessionLocal()
+        try:
+            session = db.query(ChatSession).filter(ChatSession.id == state.id).first()
+            if session:
+                state.refresh(session)
+        finally:
+            db.close()
+
+    async def refresh_summary(self, state: SessionState):
+        """Condense older turns, then pick up the new summary for the next turn"""
+        if await update_session_summary(state.id):
+            await asyncio.to_thread(self._load_summary, state)
+
+    async def _handle_message(self, frame: Dict[str, Any]) -> Optional[SessionState]:
+        """Run one turn; returns its session once the reply has been sent"""
+        request_id = frame.get("request_id")
+        text = (frame.get("message") or "").strip()
+        language = frame.get("language") or self.user["preferred_language"] or "english"
+        if not text:
+            await self.send({"type": "error", "request_id": request_id, "detail": "Empty message"})
+            return None
+
+        # No database connection is held while a turn waits for or streams from the model
+        try:
+            state, created = await self._session_state(frame.get("session_id"), text)
+            if created:
+                await self.send({"type": "session", "request_id": request_id, "session_id": state.id})
+
+            async with state.lock:
+                _, chat_history = await asyncio.to_thread(self._save_user_turn, state, text, language)
+
+                pieces = []
+                async for piece in llm_service.generate_stream(
+                    message=text,
+                    language=language,
+                    chat_history=chat_history,
+                    summary=state.summary,
+                    user_tier=self.user["tier"]
+                ):
+                    pieces.append(piece)
+                    await self.send({"type": "token", "request_id": request_id, "session_id": state.id, "text": piece})
+
+                ai_response = "".join(pieces).strip()
+                bot_message_id = await asyncio.to_thread(self._save_bot_turn, state, ai_response, language)
+                await replica_router.record_write(self.user["email"])
+
+            await self.send({
+                "type": "done",
+                "request_id": request_id,
+                "session_id": state.id,
+                "message_id": bot_message_id,
+                "response": ai_response
+            })
+            audit_pipeline.record(
+                "chat_message",
+                user_id=self.user["id"],
+                table_name="messages",
+                record_id=bot_message_id,
+                new_values={"session_id": state.id, "language": language, "channel": "websocket"},
+                request=self.websocket
+            )
+        except HTTPException as e:
+            await self.send({"type": "error", "request_id": request_id, "detail": e.detail})
+            return None
+        except Exception as e:
+            await self.send({"type": "error", "request_id": request_id, "detail": f"Error processing chat: {str(e)}"})
+            return None
+        return state
+
+    def spawn(self, coroutine):
+        task = asyncio.create_task(coroutine)
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def receive_loop(self):
+        while True:
+            raw = await self.websocket.receive_text()
+            self.last_seen = time.monotonic()
+            try:
+                frame = json.loads(raw)
+                kind = frame.get("type")
+            except (ValueError, AttributeError):
+                await self.send({"type": "error", "detail": "Frames must be JSON objects"})
+                continue
+            if kind == "message":
+                if self.turns_in_flight >= settings.ws_max_turns_in_flight:
+                    await self.send({
+                        "type": "error",
+                        "request_id": frame.get("request_id"),
+                        "detail": "Too many messages in flight; wait for a reply first"
+                    })
+                    continue
+                self.turns_in_flight += 1
+                self.spawn(self.handle_message(frame))
+            elif kind == "ping":
+                await self.send({"type": "pong"})
+            elif kind != "pong":
+                await self.send({"type": "error", "detail": f"Unknown frame type: {kind}"})
+
+@router.websocket("/ws")
+async def chat_websocket(websocket: WebSocket, token: Optional[str] = None):
+    global _active_connections
+
+    await websocket.accept()
+    if _active_connections >= settings.ws_max_connections:
+        await websocket.close(code=WS_TRY_AGAIN_LATER)
+        return
+
+    _active_connections += 1
+    connection = ChatConnection(websocket)
+    try:
+        if not await connection.authenticate(token):
+            await websocket.close(code=WS_UNAUTHORIZED)
+            return
+
+        await websocket.send_json({"type": "ready", "user": connection.user})
+        connection.spawn(connection.writer())
+        connection.spawn(connection.heartbeat())
+        connection.receiver = asyncio.create_task(connection.receive_loop())
+        try:
+            await connection.receiver
+        except asyncio.CancelledError:
+            if connection.close_code is None:
+                raise
+    except (WebSocketDisconnect, RuntimeError):
+        # Client went away
+        pass
+    finally:
+        _active_connections -= 1
+        for task in list(connection.tasks):
+            task.cancel()
+        if connection.receiver is not None:
+            connection.receiver.cancel()
+    
+    if connection.close_code is not None:
+        # Heartbeat or send timeout; the client may not be reading, so do not wait on it
+        try:
+            await asyncio.wait_for(websocket.close(code=connection.close_code), 1.0)
+        except (asyncio.TimeoutError, RuntimeError):
+            pass
+
+def get_connection_count() -> int:
+    return _active_connections
@@ -3,12 +3,19 @@ from sqlalchemy.orm import Session
 from pydantic import BaseModel
 from typing import Optional
 
+from config import settings
 from database import get_db
 from models import TranslationCache
+from services.cache_service import cache_key, get_cache
+from services.llm_service import get_llm_service
 from services.translation_service import TranslationService
 
 router = APIRouter()
-translation_service = TranslationService()
+translation_service = TranslationService(llm_service=get_llm_service())
+translation_cache = get_cache("translation", settings.cache_translation_ttl_seconds)
+
+# Backends whose output may just be the source text
+UNTRANSLATED_BACKENDS = ("fallback", "none")
 
 class TranslationRequest(BaseModel):
     text: str
@@ -20,6 +27,7 @@ class TranslationResponse(BaseModel):
     source_language: str
     target_language: str
     cached: bool = False
+    backend: Optional[str] = None
 
 @router.post("/", response_model=TranslationResponse)
 async def translate_text(
@@ -27,44 +35,63 @@ async def translate_text(
     db: Session = Depends(get_db)
 ):
     try:
-        # Check cache first
-        cached_translation = db.query(TranslationCache).filter(
-            TranslationCache.source_text == request.text,
-            TranslationCache.source_language == request.source_language,
-            TranslationCache.target_language == request.target_language
-        ).first()
+        hit = True
         
-        if cached_translation:
-            return TranslationResponse(
-                translated_text=cached_translation.translated_text,
+        async def load_translation():
+            nonlocal hit
+            # Shared cache missed; try the database cache
+            cached_translation = db.query(TranslationCache).filter(
+                TranslationCache.source_text == request.text,
+                TranslationCache.source_language == request.source_language,
+                TranslationCache.target_language == request.target_language
+            ).first()
+            
+            if cached_translation:
+                return {
+                    "translated_text": cached_translation.translated_text,
+                    "backend": cached_translation.translation_service
+                }
+            
+            # Translate text
+            hit = False
+            translated_text, backend = await translation_service.translate_with_backend(
+                text=request.text,
+                source_lang=request.source_language,
+                target_lang=request.target_language
+            )
+            
+            if backend in UNTRANSLATED_BACKENDS:
+                # Not a real translation; keep it out of the database cache
+                return {"translated_text": translated_text, "backend": backend}
+            
+            # Cache the translation
+            cache_entry = TranslationCache(
+                source_text=request.text,
                 source_language=request.source_language,
                 target_language=request.target_language,
-                cached=True
+                translated_text=translated_text,
+                translation_service=backend
             )
+            db.add(cache_entry)
+            db.commit()
+            return {"translated_text": translated_text, "backend": backend}
         
-        # Translate text
-        translated_text = await translation_service.translate(
-            text=request.text,
-            source_lang=request.source_language,
-            target_lang=request.target_language
-        )
+        def ttl_for(result):
+            # Only hold a fallback result briefly so the real backends are retried
+            if result["backend"] in UNTRANSLATED_BACKENDS:
+                return settings.translation_fallback_ttl_seconds
+            return None  # The namespace TTL
         
-        # Cache the translation
-        cache_entry = TranslationCache(
-            source_text=request.text,
-            source_language=request.source_language,
-            target_language=request.target_language,
-            translated_text=translated_text,
-            translation_service="google_translate"
-        )
-        db.add(cache_entry)
-        db.commit()
+        # Identical concurrent requests share one translation across workers
+        key = cache_key(request.source_language, request.target_language, request.text)
+        result = await translation_cache.get_or_set(key, load_translation, ttl=ttl_for)
         
         return TranslationResponse(
-            translated_text=translated_text,
+            translated_text=result["translated_text"],
             source_language=request.source_language,
             target_language=request.target_language,
-            cached=False
+            cached=hit,
+            backend=result["backend"]
         )
         
     except Exception as e:
@@ -80,4 +107,8 @@ async def get_supported_languages():
             {"code": "douala", "name": "Douala"},
             {"code": "bassa", "name": "Bassa"}
         ]
-    }
\ No newline at end of file
+    }
+
+@router.get("/stats")
+async def get_translation_stats():
+    return {"backends": translation_service.get_stats()}
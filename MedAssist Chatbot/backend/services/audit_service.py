@@ -0,0 +1,218 @@
+import asyncio
+import ipaddress
+import time
+from datetime import datetime
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
+
+from fastapi import Request
+from sqlalchemy import insert
+
+from config import settings
+from database import SessionLocal
+from models import AuditLog
+
+
+def _parse_ip(value: Optional[str]):
+    try:
+        return ipaddress.ip_address(value.strip())
+    except (AttributeError, ValueError):
+        return None
+
+
+def _is_trusted_proxy(address) -> bool:
+    return any(address in network for network in _trusted_networks())
+
+
+@lru_cache(maxsize=1)
+def _trusted_networks():
+    return [ipaddress.ip_network(proxy, strict=False) for proxy in settings.trusted_proxies]
+
+
+def client_ip(request: Optional[Request]) -> Optional[str]:
+    """Client address; X-Forwarded-For is only honoured from trusted proxies.
+
+    Returns None rather than a value the INET column would reject.
+    """
+    if request is None or request.client is None:
+        return None
+    address = _parse_ip(request.client.host)
+    if address is None:
+        return None
+
+    forwarded = request.headers.get("x-forwarded-for")
+    if forwarded and _is_trusted_proxy(address):
+        # Walk back from the nearest hop past our own proxies
+        for hop in reversed(forwarded.split(",")):
+            address = _parse_ip(hop)
+            if address is None:
+                return None
+            if not _is_trusted_proxy(address):
+                break
+    return str(address)
+
+
+class AuditPipeline:
+    """Buffered audit logging.
+
+    Routers enqueue events without touching the database. A background task
+    writes them to audit_logs in multi-row INSERTs, flushing when a batch is
+    full or the flush interval elapses, and backs off when the database is
+    failing or slow. When the queue is full new events are dropped and
+    counted rather than slowing down requests.
+    """
+
+    def __init__(
+        self,
+        session_factory=SessionLocal,
+        max_queue: int = None,
+        batch_size: int = None,
+        flush_interval: float = None
+    ):
+        self.session_factory = session_factory
+        self.batch_size = batch_size or settings.audit_batch_size
+        self.flush_interval = flush_interval or settings.audit_flush_interval_seconds
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue or settings.audit_queue_size)
+        self._task: Optional[asyncio.Task] = None
+        self._pending: List[Dict[str, Any]] = []  # Batch taken off the queue, not yet written
+        self._backoff = 0.0
+        self.metrics = {
+            "enqueued": 0,
+            "dropped": 0,
+            "flushed": 0,
+            "flushes": 0,
+            "failed_flushes": 0,
+            "last_flush_ms": 0.0,
+            "max_flush_ms": 0.0,
+            "last_batch_size": 0
+        }
+
+    def record(
+        self,
+        action: str,
+        user_id: Optional[int] = None,
+        table_name: Optional[str] = None,
+        record_id: Optional[int] = None,
+        old_values: Optional[Dict[str, Any]] = None,
+        new_values: Optional[Dict[str, Any]] = None,
+        request: Optional[Request] = None
+    ):
+        """Enqueue an audit event; never blocks the caller"""
+        event = {
+            "user_id": user_id,
+            "action": action,
+            "table_name": table_name,
+            "record_id": record_id,
+            "old_values": old_values,
+            "new_values": new_values,
+            "ip_address": client_ip(request),
+            "user_agent": request.headers.get("user-agent") if request else None,
+            "created_at": datetime.utcnow()
+        }
+        try:
+            self.queue.put_nowait(event)
+            self.metrics["enqueued"] += 1
+        except asyncio.QueueFull:
+            self.metrics["dropped"] += 1
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self, timeout: float = 10.0):
+        """Stop the flusher and write out whatever is still queued"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+        deadline = time.monotonic() + timeout
+        while (self._pending or not self.queue.empty()) and time.monotonic() < deadline:
+            self._pending.extend(self._take(self.batch_size - len(self._pending)))
+            if not await self._flush(self._pending):
+                break
+            self._pending = []
+
+    def _take(self, limit: int) -> List[Dict[str, Any]]:
+        batch = []
+        while len(batch) < limit and not self.queue.empty():
+            batch.append(self.queue.get_nowait())
+        return batch
+
+    async def _collect(self):
+        """Wait for the first event, then fill the batch until it is full or the interval ends"""
+        self._pending.append(await self.queue.get())
+        deadline = time.monotonic() + self.flush_interval
+        while len(self._pending) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                self._pending.append(await asyncio.wait_for(self.queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+
+    async def _run(self):
+        while True:
+            await self._collect()
+            attempts = 0
+            while not await self._flush(self._pending):
+                attempts += 1
+                if attempts >= settings.audit_max_retries:
+                    print(f"Dropping {len(self._pending)} audit events after {attempts} failed flushes")
+                    self.metrics["dropped"] += len(self._pending)
+                    break
+                await asyncio.sleep(self._backoff)
+            self._pending = []
+
+            # Under DB pressure wait before the next flush so batches grow
+            if self._backoff:
+                await asyncio.sleep(self._backoff)
+
+    async def _flush(self, batch: List[Dict[str, Any]]) -> bool:
+        if not batch:
+            return True
+        started = time.perf_counter()
+        try:
+            await asyncio.to_thread(self._write, batch)
+        except Exception as e:
+            print(f"Audit flush error: {e}")
+            self.metrics["failed_flushes"] += 1
+            self._backoff = min(max(self._backoff * 2, 0.5), settings.audit_max_backoff_seconds)
+            return False
+
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        self.metrics["flushes"] += 1
+        self.metrics["flushed"] += len(batch)
+        self.metrics["last_flush_ms"] = round(elapsed_ms, 2)
+        self.metrics["max_flush_ms"] = round(max(self.metrics["max_flush_ms"], elapsed_ms), 2)
+        self.metrics["last_batch_size"] = len(batch)
+
+        if elapsed_ms > settings.audit_slow_flush_ms:
+            self._backoff = min(max(self._backoff * 2, 0.5), settings.audit_max_backoff_seconds)
+        else:
+            self._backoff = 0.0
+        return True
+
+    def _write(self, batch: List[Dict[str, Any]]):
+        # executemany of a Core insert is sent as multi-row INSERT ... VALUES
+        db = self.session_factory()
+        try:
+            db.execute(insert(AuditLog), batch)
+            db.commit()
+        finally:
+            db.close()
+
+    def get_metrics(self) -> Dict[str, Any]:
+        return {
+            **self.metrics,
+            "queue_depth": self.queue.qsize(),
+            "queue_capacity": self.queue.maxsize,
+            "backoff_seconds": self._backoff
+        }
+
+
+audit_pipeline = AuditPipeline()
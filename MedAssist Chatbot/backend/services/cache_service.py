@@ -0,0 +1,413 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, Union
+
+from config import settings
+
+INVALIDATION_CHANNEL = "invalidate"
+
+# Seconds, or a function of the value being stored
+TTL = Union[float, Callable[[Any], Optional[float]]]
+
+
+def cache_key(*parts: Any) -> str:
+    """Join key parts, hashing any that are long or contain the separator"""
+    return ":".join(
+        hashlib.sha256(str(part).encode("utf-8")).hexdigest()[:32] if len(str(part)) > 64 or ":" in str(part) else str(part)
+        for part in parts
+    )
+
+
+class MemoryBackend:
+    """Per-process LRU with expiry; also the near cache in front of shared backends"""
+    shared = False
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self.entries: "OrderedDict[str, Tuple[Optional[float], bytes]]" = OrderedDict()
+        self.subscribers: Dict[str, List[Callable[[str], None]]] = {}
+
+    def get_now(self, key: str) -> Optional[bytes]:
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        expires, value = entry
+        if expires is not None and expires <= time.monotonic():
+            del self.entries[key]
+            return None
+        self.entries.move_to_end(key)
+        return value
+
+    def set_now(self, key: str, value: bytes, ttl: Optional[float] = None):
+        self.entries[key] = (time.monotonic() + ttl if ttl else None, value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return self.get_now(key)
+
+    async def set(self, key: str, value: bytes, ttl: Optional[float] = None):
+        self.set_now(key, value, ttl)
+
+    async def add(self, key: str, value: bytes, ttl: Optional[float] = None) -> bool:
+        if self.get_now(key) is not None:
+            return False
+        self.set_now(key, value, ttl)
+        return True
+
+    async def delete(self, key: str):
+        self.entries.pop(key, None)
+
+    async def publish(self, channel: str, message: str):
+        for callback in self.subscribers.get(channel, []):
+            callback(message)
+
+    async def subscribe(self, channel: str, callback: Callable[[str], None]):
+        self.subscribers.setdefault(channel, []).append(callback)
+
+    async def close(self):
+        self.entries.clear()
+
+
+class SharedMemoryBackend:
+    """Cache shared by the workers of one host: a SQLite file on tmpfs.
+
+    Entries expire by wall clock so every process agrees. Pub/sub is an
+    events table that each subscriber polls from its last seen row.
+    """
+    shared = True
+
+    def __init__(self, path: str, max_entries: int, poll_seconds: float = 0.2):
+        self.path = path
+        self.max_entries = max_entries
+        self.poll_seconds = poll_seconds
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._listeners: List[asyncio.Task] = []
+        self.conn = sqlite3.connect(path, timeout=5, isolation_level=None, check_same_thread=False)
+        with self._lock:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=OFF")
+            self.conn.execute("CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_entries_expires ON entries(expires)")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS events (id INTEGER PRIMARY KEY AUTOINCREMENT, channel TEXT NOT NULL, message TEXT NOT NULL, created REAL NOT NULL)"
+            )
+
+    def _execute(self, sql: str, params: tuple = ()) -> int:
+        with self._lock:
+            return self.conn.execute(sql, params).rowcount
+
+    def _query(self, sql: str, params: tuple = ()) -> List[tuple]:
+        with self._lock:
+            return self.conn.execute(sql, params).fetchall()
+
+    def _get(self, key: str) -> Optional[bytes]:
+        rows = self._query(
+            "SELECT value FROM entries WHERE key = ? AND (expires IS NULL OR expires > ?)", (key, time.time())
+        )
+        return rows[0][0] if rows else None
+
+    def _set(self, key: str, value: bytes, ttl: Optional[float], only_if_absent: bool = False) -> bool:
+        now = time.time()
+        expires = now + ttl if ttl else None
+        if only_if_absent:
+            # Replace an expired holder, never a live one
+            stored = self._execute(
+                "INSERT INTO entries (key, value, expires) VALUES (?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = excluded.value, expires = excluded.expires "
+                "WHERE entries.expires IS NOT NULL AND entries.expires <= ?",
+                (key, value, expires, now)
+            ) > 0
+        else:
+            self._execute("INSERT OR REPLACE INTO entries (key, value, expires) VALUES (?, ?, ?)", (key, value, expires))
+            stored = True
+        self._writes += 1
+        if self._writes % 500 == 0:
+            self._prune(now)
+        return stored
+
+    def _prune(self, now: float):
+        self._execute("DELETE FROM entries WHERE expires IS NOT NULL AND expires <= ?", (now,))
+        self._execute("DELETE FROM events WHERE created < ?", (now - 60,))
+        overflow = self._query("SELECT count(*) FROM entries")[0][0] - self.max_entries
+        if overflow > 0:
+            # Evict the entries closest to expiry
+            self._execute(
+                "DELETE FROM entries WHERE key IN (SELECT key FROM entries ORDER BY expires IS NULL, expires LIMIT ?)",
+                (overflow,)
+            )
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await asyncio.to_thread(self._get, key)
+
+    async def set(self, key: str, value: bytes, ttl: Optional[float] = None):
+        await asyncio.to_thread(self._set, key, value, ttl)
+
+    async def add(self, key: str, value: bytes, ttl: Optional[float] = None) -> bool:
+        return await asyncio.to_thread(self._set, key, value, ttl, True)
+
+    async def delete(self, key: str):
+        await asyncio.to_thread(self._execute, "DELETE FROM entries WHERE key = ?", (key,))
+
+    async def publish(self, channel: str, message: str):
+        await asyncio.to_thread(
+            self._execute, "INSERT INTO events (channel, message, created) VALUES (?, ?, ?)", (channel, message, time.time())
+        )
+
+    async def subscribe(self, channel: str, callback: Callable[[str], None]):
+        last_id = self._query("SELECT COALESCE(max(id), 0) FROM events")[0][0]
+        self._listeners.append(asyncio.create_task(self._poll(channel, callback, last_id)))
+
+    async def _poll(self, channel: str, callback: Callable[[str], None], last_id: int):
+        while True:
+            await asyncio.sleep(self.poll_seconds)
+            try:
+                rows = await asyncio.to_thread(
+                    self._query, "SELECT id, message FROM events WHERE id > ? AND channel = ? ORDER BY id", (last_id, channel)
+                )
+            except sqlite3.Error as e:
+                print(f"Cache event poll error: {e}")
+                continue
+            for event_id, message in rows:
+                last_id = event_id
+                callback(message)
+
+    async def close(self):
+        for task in self._listeners:
+            task.cancel()
+        self.conn.close()
+
+
+class RedisBackend:
+    """Any server speaking the Redis protocol (Redis, Valkey, cache_server.py)"""
+    shared = True
+
+    def __init__(self, url: str):
+        import redis.asyncio as redis  # Optional dependency, only needed for this backend
+        self.client = redis.from_url(url)
+        self._listeners: List[asyncio.Task] = []
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await self.client.get(key)
+
+    async def set(self, key: str, value: bytes, ttl: Optional[float] = None):
+        await self.client.set(key, value, px=int(ttl * 1000) if ttl else None)
+
+    async def add(self, key: str, value: bytes, ttl: Optional[float] = None) -> bool:
+        return bool(await self.client.set(key, value, px=int(ttl * 1000) if ttl else None, nx=True))
+
+    async def delete(self, key: str):
+        await self.client.delete(key)
+
+    async def publish(self, channel: str, message: str):
+        await self.client.publish(channel, message)
+
+    async def subscribe(self, channel: str, callback: Callable[[str], None]):
+        self._listeners.append(asyncio.create_task(self._listen(channel, callback)))
+
+    async def _listen(self, channel: str, callback: Callable[[str], None]):
+        backoff = 1.0
+        while True:
+            try:
+                pubsub = self.client.pubsub()
+                await pubsub.subscribe(channel)
+                backoff = 1.0
+                async for message in pubsub.listen():
+                    if message.get("type") == "message":
+                        data = message["data"]
+                        callback(data.decode("utf-8") if isinstance(data, bytes) else data)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Cache subscription error, retrying in {backoff:.0f}s: {e}")
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 30.0)
+
+    async def close(self):
+        for task in self._listeners:
+            task.cancel()
+        await self.client.aclose()
+
+
+class Cache:
+    """JSON values under one namespace of the shared backend.
+
+    Shared backends get a short-lived near cache in each worker; deletes
+    publish the key so other workers drop their near copy. get_or_set
+    runs the loader once per key: concurrent misses in a worker share one
+    future, and across workers a lock key lets one worker load while the
+    others wait for its result.
+    """
+
+    def __init__(self, namespace: str, ttl: Optional[float] = None):
+        self.namespace = namespace
+        self.ttl = ttl
+        self._flights: Dict[str, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _full_key(self, key: str) -> str:
+        return f"{settings.cache_prefix}:{self.namespace}:{key}"
+
+    def _near_ttl(self, ttl: Optional[float]) -> float:
+        return min(settings.cache_local_ttl_seconds, ttl or settings.cache_local_ttl_seconds)
+
+    async def get(self, key: str) -> Any:
+        full_key = self._full_key(key)
+        backend = get_cache_backend()
+        raw = _near.get_now(full_key) if backend.shared else None
+        if raw is None:
+            raw = await backend.get(full_key)
+            if raw is not None and backend.shared and settings.cache_local_ttl_seconds > 0:
+                _near.set_now(full_key, raw, self._near_ttl(self.ttl))
+        if raw is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(raw)
+
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        full_key = self._full_key(key)
+        raw = json.dumps(value, default=str).encode("utf-8")
+        backend = get_cache_backend()
+        await backend.set(full_key, raw, ttl or self.ttl)
+        if backend.shared and settings.cache_local_ttl_seconds > 0:
+            _near.set_now(full_key, raw, self._near_ttl(ttl or self.ttl))
+
+    async def delete(self, key: str):
+        full_key = self._full_key(key)
+        backend = get_cache_backend()
+        await backend.delete(full_key)
+        _near.entries.pop(full_key, None)
+        if backend.shared:
+            await backend.publish(_channel(), full_key)
+
+    async def get_or_set(self, key: str, loader: Callable[[], Awaitable[Any]], ttl: Optional[TTL] = None) -> Any:
+        """Cached value, or the loader's result stored under key (None is not cached).
+
+        ttl may be a function of the loaded value, for values that deserve a
+        shorter life than the namespace default.
+        """
+        value = await self.get(key)
+        if value is not None:
+            return value
+
+        full_key = self._full_key(key)
+        running = self._flights.get(full_key)
+        if running is not None:
+            return await asyncio.shield(running)
+
+        future = asyncio.get_running_loop().create_future()
+        self._flights[full_key] = future
+        try:
+            value = await self._load(key, full_key, loader, ttl)
+            future.set_result(value)
+            return value
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            self._flights.pop(full_key, None)
+            if future.done() and not future.cancelled():
+                future.exception()
+
+    async def _load(self, key: str, full_key: str, loader: Callable[[], Awaitable[Any]], ttl: Optional[TTL]) -> Any:
+        backend = get_cache_backend()
+        lock_key = f"{full_key}:lock"
+        locked = not backend.shared or await backend.add(lock_key, b"1", settings.cache_lock_seconds)
+        if not locked:
+            # Another worker is loading; wait for its value, then give up and load here
+            deadline = time.monotonic() + settings.cache_lock_seconds
+            while time.monotonic() < deadline:
+                await asyncio.sleep(0.05)
+                raw = await backend.get(full_key)
+                if raw is not None:
+                    self.hits += 1
+                    return json.loads(raw)
+        try:
+            value = await loader()
+            if value is not None:
+                await self.set(key, value, ttl(value) if callable(ttl) else ttl)
+            return value
+        finally:
+            if locked and backend.shared:
+                await backend.delete(lock_key)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {"namespace": self.namespace, "hits": self.hits, "misses": self.misses}
+
+
+_backend = None
+_near = MemoryBackend(max_entries=1000)
+_caches: Dict[str, Cache] = {}
+
+
+def _channel() -> str:
+    return f"{settings.cache_prefix}:{INVALIDATION_CHANNEL}"
+
+
+def default_shared_path() -> str:
+    directory = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+    return os.path.join(directory, f"{settings.cache_prefix}-cache.sqlite3")
+
+
+def get_cache_backend():
+    """Process-wide backend chosen by settings.cache_backend"""
+    global _backend
+    if _backend is None:
+        if settings.cache_backend == "redis":
+            _backend = RedisBackend(settings.cache_url)
+        elif settings.cache_backend == "shared":
+            _backend = SharedMemoryBackend(settings.cache_shared_path or default_shared_path(), settings.cache_max_entries)
+        else:
+            _backend = MemoryBackend(settings.cache_max_entries)
+    return _backend
+
+
+def get_cache(namespace: str, ttl: Optional[float] = None) -> Cache:
+    if namespace not in _caches:
+        _caches[namespace] = Cache(namespace, ttl)
+    return _caches[namespace]
+
+
+async def start_cache():
+    """Drop near-cache entries that other workers invalidate"""
+    backend = get_cache_backend()
+    if backend.shared:
+        await backend.subscribe(_channel(), lambda key: _near.entries.pop(key, None))
+
+
+async def publish(channel: str, message: str):
+    """Send a message to every worker subscribed to channel on the cache backend"""
+    await get_cache_backend().publish(f"{settings.cache_prefix}:{channel}", message)
+
+
+async def subscribe(channel: str, callback: Callable[[str], None]):
+    """Call callback in this worker for each message published on channel"""
+    await get_cache_backend().subscribe(f"{settings.cache_prefix}:{channel}", callback)
+
+
+async def close_cache():
+    global _backend
+    if _backend is not None:
+        await _backend.close()
+        _backend = None
+
+
+def get_cache_stats() -> Dict[str, Any]:
+    return {
+        "backend": settings.cache_backend,
+        "namespaces": [cache.get_stats() for cache in _caches.values()]
+    }
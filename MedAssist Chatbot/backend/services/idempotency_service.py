@@ -0,0 +1,240 @@
+import asyncio
+import hashlib
+import json
+import time
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from config import settings
+from database import SessionLocal
+from models import ChatRequest
+from services.cache_service import cache_key, get_cache
+
+Key = Tuple[int, str]
+
+
+def request_fingerprint(payload: Dict[str, Any]) -> str:
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+class IdempotencyService:
+    """Run each (user, idempotency key) chat submission at most once.
+
+    Duplicates that arrive while the first request is still generating await
+    the same future in this worker, or poll the chat_requests row when the
+    original runs in another worker. Duplicates that arrive after it finished
+    get the stored response for idempotency_ttl_seconds without touching the
+    model, from the shared response cache or else the database. The unique
+    (user_id, idempotency_key) constraint on chat_requests is what makes the
+    claim safe across workers.
+    """
+
+    def __init__(self, session_factory=SessionLocal):
+        self.session_factory = session_factory
+        self.in_flight: Dict[Key, Tuple[str, asyncio.Future]] = {}  # key -> (fingerprint, future)
+        self.responses = get_cache("response", settings.idempotency_ttl_seconds)
+
+    async def _remember(self, key: Key, fingerprint: str, response: Dict[str, Any]):
+        await self.responses.set(cache_key(*key), {"fingerprint": fingerprint, "response": response})
+
+    async def _cached(self, key: Key, fingerprint: str) -> Optional[Dict[str, Any]]:
+        entry = await self.responses.get(cache_key(*key))
+        if entry is None:
+            return None
+        self._check_fingerprint(entry["fingerprint"], fingerprint)
+        return entry["response"]
+
+    def _check_fingerprint(self, stored: Optional[str], fingerprint: str):
+        if stored and stored != fingerprint:
+            raise HTTPException(status_code=422, detail="Idempotency key was already used for a different request")
+
+    def _takeover_reason(self, existing: ChatRequest, now: datetime) -> Optional[str]:
+        """Why this request may take over a key someone already claimed, or None"""
+        if existing.created_at < now - timedelta(seconds=settings.idempotency_ttl_seconds):
+            return "expired"
+        if existing.status == "failed":
+            return "failed"
+        if (
+            existing.status == "pending"
+            and existing.created_at < now - timedelta(seconds=settings.idempotency_pending_timeout_seconds)
+        ):
+            return "abandoned"
+        return None
+
+    def _claim(self, key: Key, fingerprint: str) -> Tuple[Optional[ChatRequest], Optional[Dict[str, int]]]:
+        """Insert the pending row or take over a dead one.
+
+        Returns (existing row, None) when someone else holds the key, and
+        (None, resume) when this request owns it. resume carries the user
+        message a failed or abandoned attempt already stored, so the retry
+        does not insert it again.
+        """
+        user_id, idempotency_key = key
+        now = datetime.utcnow()
+        db = self.session_factory()
+        try:
+            claimed = db.execute(
+                insert(ChatRequest).values(
+                    user_id=user_id,
+                    idempotency_key=idempotency_key,
+                    request_hash=fingerprint,
+                    status="pending",
+                    created_at=now
+                ).on_conflict_do_nothing(index_elements=["user_id", "idempotency_key"]).returning(ChatRequest.id)
+            ).scalar()
+            if claimed is not None:
+                db.commit()
+                return None, None
+
+            existing = db.query(ChatRequest).filter(
+                ChatRequest.user_id == user_id,
+                ChatRequest.idempotency_key == idempotency_key
+            ).with_for_update().first()
+
+            reason = self._takeover_reason(existing, now)
+            if reason is None:
+                db.expunge(existing)
+                db.commit()
+                return existing, None
+
+            resume = None
+            if reason != "expired" and existing.user_message_id is not None:
+                # Same request retried after a crash or error: keep its user message
+                self._check_fingerprint(existing.request_hash, fingerprint)
+                resume = {"session_id": existing.session_id, "user_message_id": existing.user_message_id}
+            else:
+                existing.session_id = None
+                existing.user_message_id = None
+
+            # Take the key over for this request
+            existing.request_hash = fingerprint
+            existing.status = "pending"
+            existing.response = None
+            existing.message_id = None
+            existing.created_at = now
+            existing.completed_at = None
+            db.commit()
+            return None, resume
+        finally:
+            db.close()
+
+    def mark_user_message(self, db: Session, user_id: int, idempotency_key: str, session_id: int, message_id: int):
+        """Record the stored user message on the claim, in the caller's transaction.
+
+        Commit it together with the message insert: a retry after a crash
+        then finds the message instead of storing it twice.
+        """
+        db.query(ChatRequest).filter(
+            ChatRequest.user_id == user_id,
+            ChatRequest.idempotency_key == idempotency_key
+        ).update({"session_id": session_id, "user_message_id": message_id}, synchronize_session=False)
+
+    def _finish(self, key: Key, status: str, response: Optional[Dict[str, Any]] = None):
+        user_id, idempotency_key = key
+        values = {"status": status, "response": response, "completed_at": datetime.utcnow()}
+        if response:
+            values.update(session_id=response.get("session_id"), message_id=response.get("message_id"))
+        # A failed attempt keeps the session and user message it stored, for the retry
+        db = self.session_factory()
+        try:
+            db.query(ChatRequest).filter(
+                ChatRequest.user_id == user_id,
+                ChatRequest.idempotency_key == idempotency_key
+            ).update(values, synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+
+    async def _wait_for_other_worker(self, key: Key) -> Dict[str, Any]:
+        """Poll the row claimed by another worker until it completes"""
+        user_id, idempotency_key = key
+        deadline = time.monotonic() + settings.idempotency_pending_timeout_seconds
+        while time.monotonic() < deadline:
+            await asyncio.sleep(settings.idempotency_poll_seconds)
+            db = self.session_factory()
+            try:
+                row = db.query(ChatRequest.status, ChatRequest.response).filter(
+                    ChatRequest.user_id == user_id,
+                    ChatRequest.idempotency_key == idempotency_key
+                ).first()
+            finally:
+                db.close()
+            if row is None or row.status == "failed":
+                break
+            if row.status == "completed":
+                return row.response
+        raise HTTPException(status_code=409, detail="A request with this idempotency key is still being processed")
+
+    async def run(
+        self,
+        user_id: int,
+        idempotency_key: str,
+        payload: Dict[str, Any],
+        process: Callable[[Optional[Dict[str, int]]], Awaitable[Dict[str, Any]]]
+    ) -> Dict[str, Any]:
+        """Run process once per key and return its response to every duplicate.
+
+        process receives the resume info from _claim, or None, and should
+        store the user message with mark_user_message in the same transaction.
+        """
+        key = (user_id, idempotency_key)
+        fingerprint = request_fingerprint(payload)
+
+        cached = await self._cached(key, fingerprint)
+        if cached is not None:
+            return cached
+
+        running = self.in_flight.get(key)
+        if running is not None:
+            running_fingerprint, future = running
+            self._check_fingerprint(running_fingerprint, fingerprint)
+            # Shield so a client disconnect on the duplicate does not cancel the original
+            return await asyncio.shield(future)
+
+        future = asyncio.get_running_loop().create_future()
+        self.in_flight[key] = (fingerprint, future)
+        try:
+            existing, resume = await asyncio.to_thread(self._claim, key, fingerprint)
+            if existing is not None:
+                self._check_fingerprint(existing.request_hash, fingerprint)
+                response = existing.response if existing.status == "completed" else await self._wait_for_other_worker(key)
+            else:
+                try:
+                    response = await process(resume)
+                except (Exception, asyncio.CancelledError):
+                    await asyncio.to_thread(self._finish, key, "failed")
+                    raise
+                await asyncio.to_thread(self._finish, key, "completed", response)
+
+            await self._remember(key, fingerprint, response)
+            future.set_result(response)
+            return response
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            self.in_flight.pop(key, None)
+            # Avoid "exception was never retrieved" when there were no duplicates
+            if future.done() and not future.cancelled():
+                future.exception()
+
+    def purge_expired(self) -> int:
+        """Delete chat_requests rows past the TTL"""
+        cutoff = datetime.utcnow() - timedelta(seconds=settings.idempotency_ttl_seconds)
+        db = self.session_factory()
+        try:
+            deleted = db.query(ChatRequest).filter(ChatRequest.created_at < cutoff).delete(synchronize_session=False)
+            db.commit()
+            return deleted
+        finally:
+            db.close()
+
+
+idempotency_service = IdempotencyService()
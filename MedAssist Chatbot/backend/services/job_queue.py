@@ -0,0 +1,178 @@
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from config import settings
+from database import SessionLocal
+from models import ChatJob, Message
+
+FINISHED_STATUSES = ("completed", "failed")
+
+# Oldest claimable job whose session has no earlier unfinished job, so turns
+# of one conversation are generated in order. Running jobs whose worker
+# stopped heartbeating are claimable again.
+CLAIM_SQL = text("""
+    UPDATE chat_jobs
+    SET status = 'running',
+        worker_id = :worker_id,
+        attempts = attempts + 1,
+        partial_output = '',
+        error = NULL,
+        started_at = :now,
+        heartbeat_at = :now
+    WHERE id = (
+        SELECT j.id FROM chat_jobs j
+        WHERE (j.status = 'queued' OR (j.status = 'running' AND j.heartbeat_at < :stale_before))
+          AND NOT EXISTS (
+              SELECT 1 FROM chat_jobs p
+              WHERE p.session_id = j.session_id
+                AND p.id < j.id
+                AND p.status IN ('queued', 'running')
+          )
+        ORDER BY j.id
+        LIMIT 1
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING id, attempts
+""")
+
+
+def enqueue_job(db: Session, user_id: int, session_id: int, user_message_id: int, language: str) -> ChatJob:
+    """Queue generation for a user turn; commits together with any pending message insert"""
+    job = ChatJob(
+        user_id=user_id,
+        session_id=session_id,
+        user_message_id=user_message_id,
+        language=language,
+        status="queued",
+        partial_output=""
+    )
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    return job
+
+
+def claim_job(db: Session, worker_id: str) -> Optional[int]:
+    """Take the next job for this worker, failing any that ran out of attempts"""
+    while True:
+        now = datetime.utcnow()
+        row = db.execute(CLAIM_SQL, {
+            "worker_id": worker_id,
+            "now": now,
+            "stale_before": now - timedelta(seconds=settings.job_stale_seconds)
+        }).first()
+        if row is None:
+            db.commit()
+            return None
+        if row.attempts <= settings.job_max_attempts:
+            db.commit()
+            return row.id
+        _set_failed(db, row.id, f"Gave up after {settings.job_max_attempts} attempts")
+        db.commit()
+
+
+def flush_progress(db: Session, job_id: int, worker_id: str, partial_output: str) -> bool:
+    """Store partial output and heartbeat; False when the job is no longer ours"""
+    updated = db.query(ChatJob).filter(
+        ChatJob.id == job_id,
+        ChatJob.worker_id == worker_id,
+        ChatJob.status == "running"
+    ).update({"partial_output": partial_output, "heartbeat_at": datetime.utcnow()}, synchronize_session=False)
+    db.commit()
+    return updated > 0
+
+
+def finish_job(db: Session, job_id: int, worker_id: str, bot_message_id: int, output: str) -> bool:
+    """Mark the job completed in the caller's transaction (with the bot message insert)"""
+    updated = db.query(ChatJob).filter(
+        ChatJob.id == job_id,
+        ChatJob.worker_id == worker_id,
+        ChatJob.status == "running"
+    ).update({
+        "status": "completed",
+        "bot_message_id": bot_message_id,
+        "partial_output": output,
+        "completed_at": datetime.utcnow()
+    }, synchronize_session=False)
+    return updated > 0
+
+
+def _set_failed(db: Session, job_id: int, error: str, worker_id: Optional[str] = None):
+    query = db.query(ChatJob).filter(ChatJob.id == job_id, ChatJob.status.notin_(FINISHED_STATUSES))
+    if worker_id is not None:
+        query = query.filter(ChatJob.worker_id == worker_id)
+    query.update({"status": "failed", "error": error, "completed_at": datetime.utcnow()}, synchronize_session=False)
+
+
+def fail_job(db: Session, job_id: int, worker_id: str, error: str):
+    _set_failed(db, job_id, error, worker_id)
+    db.commit()
+
+
+def retry_job(db: Session, job_id: int, worker_id: str, error: str):
+    """Put a job that hit a transient error back on the queue; the attempt
+    counts, so claim_job fails it after job_max_attempts"""
+    db.query(ChatJob).filter(
+        ChatJob.id == job_id,
+        ChatJob.worker_id == worker_id,
+        ChatJob.status == "running"
+    ).update({
+        "status": "queued",
+        "worker_id": None,
+        "partial_output": "",
+        "error": error
+    }, synchronize_session=False)
+    db.commit()
+
+
+def requeue_job(db: Session, job_id: int, worker_id: str):
+    """Hand a job back on shutdown without counting the interrupted attempt"""
+    db.query(ChatJob).filter(
+        ChatJob.id == job_id,
+        ChatJob.worker_id == worker_id,
+        ChatJob.status == "running"
+    ).update({
+        "status": "queued",
+        "worker_id": None,
+        "attempts": ChatJob.attempts - 1,
+        "partial_output": ""
+    }, synchronize_session=False)
+    db.commit()
+
+
+def purge_finished_jobs(session_factory=SessionLocal) -> int:
+    cutoff = datetime.utcnow() - timedelta(days=settings.job_retention_days)
+    db = session_factory()
+    try:
+        deleted = db.query(ChatJob).filter(
+            ChatJob.status.in_(FINISHED_STATUSES),
+            ChatJob.completed_at < cutoff
+        ).delete(synchronize_session=False)
+        db.commit()
+        return deleted
+    finally:
+        db.close()
+
+
+def serialize_job(job: ChatJob, message: Optional[Message] = None) -> Dict[str, Any]:
+    return {
+        "job_id": job.id,
+        "status": job.status,
+        "session_id": job.session_id,
+        "user_message_id": job.user_message_id,
+        "partial_output": job.partial_output or "",
+        "error": job.error,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "started_at": job.started_at.isoformat() if job.started_at else None,
+        "completed_at": job.completed_at.isoformat() if job.completed_at else None,
+        "message": {
+            "id": message.id,
+            "content": message.content,
+            "sender": message.sender,
+            "language": message.language,
+            "created_at": message.created_at.isoformat()
+        } if message else None
+    }
@@ -1,36 +1,92 @@
-import os
-from typing import List, Dict, Any
-from llama_cpp import Llama
+import asyncio
+import threading
+from typing import AsyncIterator, Callable, List, Dict, Any, Optional
 from config import settings
+from services.model_registry import ModelRegistry
 
 class LLMService:
     def __init__(self):
-        self.model = None
-        self.load_model()
+        # Models are loaded by the app lifespan (or an explicit load_model call)
+        self.registry = ModelRegistry()
     
     def load_model(self):
-        """Load the local LLaMA model"""
-        try:
-            if os.path.exists(settings.model_path):
-                self.model = Llama(
-                    model_path=settings.model_path,
-                    n_ctx=2048,  # Context window
-                    n_threads=4,  # Number of CPU threads
-                    verbose=False
-                )
-                print(f"Model loaded successfully from {settings.model_path}")
-            else:
-                print(f"Model file not found at {settings.model_path}")
-                self.model = None
-        except Exception as e:
-            print(f"Error loading model: {e}")
-            self.model = None
+        """Load the configured local LLaMA models, one per tier"""
+        tiers = settings.model_tiers or {settings.model_default_tier: settings.model_path}
+        for tier, path in tiers.items():
+            try:
+                self.registry.register(self.registry.load_model(tier, path, warm_up=False))
+            except FileNotFoundError:
+                print(f"Model file not found at {path}")
+            except Exception as e:
+                print(f"Error loading model: {e}")
+    
+    @property
+    def model(self):
+        """Default model, or None when no model is loaded"""
+        handle = self.registry.resolve()
+        return handle.model if handle else None
+    
+    def choose_tier(self, message: str, user_tier: Optional[str] = None, history_turns: int = 0) -> str:
+        """Route a turn to a model tier by user tier, then by a cheap triage.
+
+        Long messages, several questions at once and deep conversations go
+        to the large tier; short follow-ups stay on the small one.
+        """
+        tier = settings.model_user_tiers.get(user_tier or "")
+        if tier in self.registry.tiers:
+            return tier
+        
+        complex_turn = (
+            len(message) > settings.model_short_message_chars
+            or message.count("?") > 1
+            or history_turns >= settings.model_deep_history_turns
+        )
+        tier = settings.model_large_tier if complex_turn else settings.model_small_tier
+        return tier if tier in self.registry.tiers else settings.model_default_tier
+    
+    def complete(self, prompt: str, tier: Optional[str] = None, **kwargs) -> Dict[str, Any]:
+        """Run a raw completion on a loaded model (blocking, serialized per model)"""
+        with self.registry.acquire(tier) as handle:
+            return handle.complete(prompt, **kwargs)
+    
+    def stream_completion(self, prompt: str, tier: Optional[str], emit: Callable[[str], bool], **kwargs):
+        """Run a streaming completion, passing each piece of text to emit (blocking).
+
+        The model stays pinned and locked for the whole stream; generation
+        stops early when emit returns False.
+        """
+        with self.registry.acquire(tier) as handle:
+            with handle.lock:
+                for chunk in handle.model(prompt, stream=True, **kwargs):
+                    handle.completion_tokens += 1  # One token per streamed chunk
+                    if not emit(chunk['choices'][0]['text']):
+                        break
+    
+    def count_tokens(self, text: str, tier: Optional[str] = None) -> int:
+        """Count prompt tokens, estimating when no model is loaded"""
+        handle = self.registry.resolve(tier)
+        if handle is not None and handle.model is not None:
+            try:
+                return len(handle.tokenize(text))
+            except Exception:
+                pass
+        return len(text) // 4 + 1
+    
+    def _truncate_to_tokens(self, text: str, max_tokens: int, tier: Optional[str] = None) -> str:
+        """Cut text down until it fits in max_tokens"""
+        tokens = self.count_tokens(text, tier)
+        while tokens > max_tokens and text:
+            text = text[:int(len(text) * max_tokens / tokens * 0.95)]
+            tokens = self.count_tokens(text, tier)
+        return text
     
     async def generate_response(
         self,
         message: str,
         language: str = "english",
-        chat_history: List[Dict[str, str]] = None
+        chat_history: List[Dict[str, str]] = None,
+        summary: Optional[str] = None,
+        user_tier: Optional[str] = None
     ) -> str:
         """Generate AI response using the local model"""
         
@@ -38,16 +94,20 @@ class LLMService:
             return self._get_fallback_response(message, language)
         
         try:
+            tier = self.choose_tier(message, user_tier, len(chat_history or []))
+            
             # Build conversation context
             system_prompt = self._get_system_prompt(language)
             
             # Format the prompt with context
-            prompt = self._format_prompt(system_prompt, message, chat_history or [])
+            prompt = self._format_prompt(system_prompt, message, chat_history or [], summary, tier)
             
-            # Generate response
-            response = self.model(
+            # Generate response off the event loop
+            response = await asyncio.to_thread(
+                self.complete,
                 prompt,
-                max_tokens=512,
+                tier,
+                max_tokens=settings.max_response_tokens,
                 temperature=0.7,
                 top_p=0.9,
                 stop=["Human:", "Assistant:", "\n\n"],
@@ -68,6 +128,85 @@ class LLMService:
             print(f"Error generating response: {e}")
             return self._get_fallback_response(message, language)
     
+    async def generate_stream(
+        self,
+        message: str,
+        language: str = "english",
+        chat_history: List[Dict[str, str]] = None,
+        summary: Optional[str] = None,
+        user_tier: Optional[str] = None
+    ) -> AsyncIterator[str]:
+        """Yield the AI response piece by piece as tokens are generated.
+
+        The generation thread holds the model lock, so it never waits on the
+        consumer: tokens are buffered per turn, which max_response_tokens
+        bounds. A consumer that stops early makes generation stop at the
+        next token.
+        """
+        if self.model is None:
+            yield self._get_fallback_response(message, language)
+            return
+        
+        tier = self.choose_tier(message, user_tier, len(chat_history or []))
+        prompt = self._format_prompt(
+            self._get_system_prompt(language), message, chat_history or [], summary, tier
+        )
+        
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        cancelled = threading.Event()
+        done = object()
+        
+        def emit(item) -> bool:
+            if cancelled.is_set():
+                return False
+            loop.call_soon_threadsafe(queue.put_nowait, item)
+            return True
+        
+        def produce():
+            try:
+                self.stream_completion(
+                    prompt,
+                    tier,
+                    emit,
+                    max_tokens=settings.max_response_tokens,
+                    temperature=0.7,
+                    top_p=0.9,
+                    stop=["Human:", "Assistant:", "\n\n"],
+                    echo=False
+                )
+            except Exception as e:
+                emit(e)
+            finally:
+                emit(done)
+        
+        loop.run_in_executor(None, produce)
+        started = False
+        try:
+            while True:
+                item = await queue.get()
+                if item is done:
+                    break
+                if isinstance(item, Exception):
+                    print(f"Error generating response: {item}")
+                    if not started:
+                        yield self._get_fallback_response(message, language)
+                        return
+                    raise item
+                if not started:
+                    item = item.lstrip()
+                    if not item:
+                        continue
+                    started = True
+                yield item
+            
+            # Add medical disclaimer if needed
+            if self._needs_medical_disclaimer(message):
+                yield f"\n\n{self._get_medical_disclaimer(language)}"
+        finally:
+            # Stop the producer at its next token
+            cancelled.set()
+    
     def _get_system_prompt(self, language: str) -> str:
         """Get system prompt based on language"""
         prompts = {
@@ -88,19 +227,90 @@ Gardez les réponses concises et faciles à comprendre.""",
         
         return prompts.get(language, prompts["english"])
     
-    def _format_prompt(self, system_prompt: str, message: str, chat_history: List[Dict[str, str]]) -> str:
-        """Format the conversation prompt"""
-        prompt = f"System: {system_prompt}\n\n"
+    def _format_prompt(
+        self,
+        system_prompt: str,
+        message: str,
+        chat_history: List[Dict[str, str]],
+        summary: Optional[str] = None,
+        tier: Optional[str] = None
+    ) -> str:
+        """Format the conversation prompt within the context token ceiling"""
+        ceiling = settings.model_context_window - settings.max_response_tokens
+        header = f"System: {system_prompt}\n\n"
+        if summary:
+            header += f"Summary of the earlier conversation: {summary}\n\n"
+        footer = f"Human: {message}\nAssistant:"
+        
+        budget = ceiling - self.count_tokens(header, tier) - self.count_tokens(footer, tier)
+        if budget < 0:
+            # Oversized message: drop the summary and cut the message down
+            header = f"System: {system_prompt}\n\n"
+            room = ceiling - self.count_tokens(header, tier) - self.count_tokens("Human: \nAssistant:", tier)
+            footer = f"Human: {self._truncate_to_tokens(message, max(room, 0), tier)}\nAssistant:"
+            budget = 0
         
-        # Add chat history
-        for msg in chat_history[-5:]:  # Last 5 messages for context
+        # Add the most recent turns that still fit
+        turns = []
+        for msg in reversed(chat_history):
             role = "Human" if msg["role"] == "user" else "Assistant"
-            prompt += f"{role}: {msg['content']}\n"
+            line = f"{role}: {msg['content']}\n"
+            cost = self.count_tokens(line, tier)
+            if cost > budget:
+                break
+            budget -= cost
+            turns.insert(0, line)
+        
+        return header + "".join(turns) + footer
+    
+    async def summarize(
+        self,
+        previous_summary: Optional[str],
+        turns: List[Dict[str, str]],
+        language: str = "english"
+    ) -> str:
+        """Fold conversation turns into a running summary"""
+        tier = settings.model_small_tier  # Summaries do not need the large model
+        instructions = (
+            "System: Summarize this conversation between a patient and MediChat AI. "
+            "Keep symptoms, durations, medications, allergies and the advice already given. "
+            f"Write at most a few sentences in {language}.\n\n"
+        )
+        if previous_summary:
+            instructions += f"Summary so far: {previous_summary}\n\n"
         
-        # Add current message
-        prompt += f"Human: {message}\nAssistant:"
+        # Leave room for the instructions and the summary itself
+        budget = (
+            settings.model_context_window
+            - settings.summary_max_tokens
+            - self.count_tokens(instructions, tier)
+            - self.count_tokens("Conversation:\n\nSummary:", tier)
+        )
+        lines = []
+        for msg in turns:
+            role = "Human" if msg["role"] == "user" else "Assistant"
+            line = f"{role}: {msg['content']}\n"
+            cost = self.count_tokens(line, tier)
+            if cost > budget:
+                line = self._truncate_to_tokens(line, max(budget, 0), tier)
+                cost = budget
+            budget -= cost
+            lines.append(line)
+            if budget <= 0:
+                break
         
-        return prompt
+        prompt = f"{instructions}Conversation:\n{''.join(lines)}\nSummary:"
+        response = await asyncio.to_thread(
+            self.complete,
+            prompt,
+            tier,
+            max_tokens=settings.summary_max_tokens,
+            temperature=0.2,
+            top_p=0.9,
+            stop=["Human:", "Assistant:", "System:"],
+            echo=False
+        )
+        return response['choices'][0]['text'].strip()
     
     def _needs_medical_disclaimer(self, message: str) -> bool:
         """Check if message needs medical disclaimer"""
@@ -136,4 +346,14 @@ Gardez les réponses concises et faciles à comprendre.""",
             "bassa": "Je suis désolé, j'ai des problèmes techniques. Réessayez plus tard."
         }
         
-        return responses.get(language, responses["english"])
\ No newline at end of file
+        return responses.get(language, responses["english"])
+
+
+_llm_service: Optional[LLMService] = None
+
+def get_llm_service() -> LLMService:
+    """Return the process-wide LLM service; cheap, models are loaded separately"""
+    global _llm_service
+    if _llm_service is None:
+        _llm_service = LLMService()
+    return _llm_service
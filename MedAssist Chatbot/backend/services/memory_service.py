@@ -0,0 +1,130 @@
+import asyncio
+from typing import Dict, List, Optional, Set, Tuple
+
+from config import settings
+from database import SessionLocal
+from models import ChatSession, Message
+from services.llm_service import get_llm_service
+from services.message_storage import session_message_filter
+
+# Sessions with a summarization already running in this worker
+_in_progress: Set[int] = set()
+
+# The latest user/bot exchange is never folded into the summary
+RECENT_MESSAGES_KEPT = 2
+
+
+def _as_turn(msg: Message) -> Dict[str, str]:
+    return {
+        "role": "assistant" if msg.sender == "bot" else "user",
+        "content": msg.content
+    }
+
+
+def _batch_turns(messages: List[Message], max_tokens: int) -> List[List[Message]]:
+    """Group messages into batches that each fit in one summarization prompt"""
+    llm_service = get_llm_service()
+    batches, current, used = [], [], 0
+    for msg in messages:
+        cost = llm_service.count_tokens(msg.content) + 4
+        if current and used + cost > max_tokens:
+            batches.append(current)
+            current, used = [], 0
+        current.append(msg)
+        used += cost
+    if current:
+        batches.append(current)
+    return batches
+
+
+def _fold_point(costs: List[int]) -> int:
+    """Index of the first message kept verbatim; everything before it is folded.
+
+    The newest turns are kept within summary_recent_tokens. The last
+    exchange always stays, even when one long reply exceeds the budget.
+    """
+    split = max(0, len(costs) - RECENT_MESSAGES_KEPT)
+    kept = sum(costs[split:])
+    while split > 0 and kept + costs[split - 1] <= settings.summary_recent_tokens:
+        split -= 1
+        kept += costs[split]
+    return split
+
+
+def _unsummarized_turns(session_id: int) -> Optional[Tuple[Optional[str], int, List[List[Dict[str, str]]], str, int]]:
+    """Load the turns due for folding: (summary, summarized up to, batches, language, fold up to).
+
+    Returns None while the unsummarized history is still within budget.
+    """
+    llm_service = get_llm_service()
+    db = SessionLocal()
+    try:
+        session = db.query(ChatSession).filter(ChatSession.id == session_id).first()
+        if not session:
+            return None
+
+        messages = db.query(Message).filter(
+            *session_message_filter(session),
+            Message.id > (session.summary_message_id or 0)
+        ).order_by(Message.id.asc()).all()
+
+        costs = [llm_service.count_tokens(msg.content) + 4 for msg in messages]
+        if sum(costs) <= settings.summary_trigger_tokens:
+            return None
+
+        older = messages[:_fold_point(costs)]
+        if not older:
+            return None
+
+        batch_tokens = settings.model_context_window - settings.summary_max_tokens * 2 - 256
+        batches = [[_as_turn(msg) for msg in batch] for batch in _batch_turns(older, max(batch_tokens, 256))]
+        return session.summary, session.summary_message_id, batches, older[-1].language or "english", older[-1].id
+    finally:
+        db.close()
+
+
+def _store_summary(session_id: int, summarized_up_to: Optional[int], summary: str, message_id: int) -> bool:
+    """Save the new summary unless another worker moved the session on meanwhile"""
+    db = SessionLocal()
+    try:
+        updated = db.query(ChatSession).filter(
+            ChatSession.id == session_id,
+            ChatSession.summary_message_id.is_(None) if summarized_up_to is None
+            else ChatSession.summary_message_id == summarized_up_to
+        ).update({"summary": summary, "summary_message_id": message_id}, synchronize_session=False)
+        db.commit()
+        return updated > 0
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+async def update_session_summary(session_id: int) -> bool:
+    """Condense older turns of a session into its rolling summary.
+
+    Runs after a chat turn has been answered. Nothing happens until the
+    unsummarized history exceeds the token budget; then everything but the
+    most recent turns is folded into the summary. Database work runs in a
+    thread so the event loop stays free. Returns True when the summary changed.
+    """
+    llm_service = get_llm_service()
+    if llm_service.model is None or session_id in _in_progress:
+        return False
+
+    _in_progress.add(session_id)
+    try:
+        pending = await asyncio.to_thread(_unsummarized_turns, session_id)
+        if pending is None:
+            return False
+
+        summary, summarized_up_to, batches, language, message_id = pending
+        for turns in batches:
+            summary = await llm_service.summarize(summary, turns, language)
+        return await asyncio.to_thread(_store_summary, session_id, summarized_up_to, summary, message_id)
+    except Exception as e:
+        print(f"Error summarizing session {session_id}: {e}")
+        return False
+    finally:
+        _in_progress.discard(session_id)
@@ -0,0 +1,220 @@
+import gzip
+import json
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from config import settings
+from models import ChatSession, Message, SessionArchive
+
+# Arbitrary key for pg_try_advisory_lock so only one worker runs maintenance
+MAINTENANCE_LOCK_ID = 702801
+
+_MESSAGE_FIELDS = ["id", "user_id", "content", "sender", "language", "message_type", "message_metadata", "created_at"]
+
+
+def _month_start(day: date) -> date:
+    return day.replace(day=1)
+
+
+def _next_month(day: date) -> date:
+    return (day.replace(day=1) + timedelta(days=32)).replace(day=1)
+
+
+def partition_name(month: date) -> str:
+    return f"messages_y{month.year}m{month.month:02d}"
+
+
+def ensure_message_partitions(engine, months_ahead: Optional[int] = None, start: Optional[date] = None):
+    """Create monthly partitions of messages up to months_ahead from now.
+
+    A default partition catches rows outside the created ranges so inserts
+    never fail, but it should stay empty: a month cannot be attached while
+    the default partition holds rows for it.
+    """
+    if months_ahead is None:
+        months_ahead = settings.message_partition_months_ahead
+
+    month = _month_start(start or datetime.utcnow().date())
+    last = _month_start(datetime.utcnow().date())
+    for _ in range(months_ahead):
+        last = _next_month(last)
+
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE IF NOT EXISTS messages_default PARTITION OF messages DEFAULT"))
+
+    while month <= last:
+        try:
+            with engine.begin() as conn:
+                create_partitions(conn, month, month)
+        except Exception as e:
+            print(f"Error creating partition {partition_name(month)}: {e}")
+        month = _next_month(month)
+
+
+def create_partitions(conn, first: date, last: date):
+    """Create the monthly partitions from first's month through last's month"""
+    month = _month_start(first)
+    while month <= last:
+        upper = _next_month(month)
+        conn.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {partition_name(month)} PARTITION OF messages "
+            f"FOR VALUES FROM ('{month.isoformat()}') TO ('{upper.isoformat()}')"
+        ))
+        month = upper
+
+
+def drop_empty_partitions(engine, before: date) -> List[str]:
+    """Drop monthly partitions that ended before the given date and hold no rows"""
+    dropped = []
+    with engine.begin() as conn:
+        names = conn.execute(text("""
+            SELECT c.relname FROM pg_inherits i
+            JOIN pg_class c ON c.oid = i.inhrelid
+            JOIN pg_class p ON p.oid = i.inhparent
+            WHERE p.oid = to_regclass('messages') AND c.relname LIKE 'messages_y%'
+        """)).scalars().all()
+
+    for name in sorted(names):
+        month = date(int(name[10:14]), int(name[15:17]), 1)
+        if _next_month(month) > before:
+            continue
+        with engine.begin() as conn:
+            if conn.execute(text(f"SELECT EXISTS (SELECT 1 FROM {name})")).scalar():
+                continue
+            conn.execute(text(f"DROP TABLE {name}"))
+            dropped.append(name)
+    return dropped
+
+
+def _serialize(msg: Message) -> Dict:
+    data = {field: getattr(msg, field) for field in _MESSAGE_FIELDS}
+    data["created_at"] = msg.created_at.isoformat()
+    return data
+
+
+def _decompress(archive: SessionArchive) -> List[Dict]:
+    return json.loads(gzip.decompress(archive.payload).decode("utf-8"))
+
+
+def session_message_filter(session: ChatSession) -> list:
+    """Criteria selecting a session's live messages.
+
+    Bounding created_at by the session start lets Postgres prune partitions
+    older than the session instead of probing every month's index.
+    """
+    criteria = [Message.session_id == session.id]
+    if session.created_at is not None:
+        criteria.append(Message.created_at >= session.created_at)
+    return criteria
+
+
+def archive_session(db: Session, session: ChatSession) -> int:
+    """Compact a session's messages into its archive row and delete them"""
+    messages = db.query(Message).filter(
+        *session_message_filter(session)
+    ).order_by(Message.created_at.asc(), Message.id.asc()).all()
+    if not messages:
+        return 0
+
+    archive = db.query(SessionArchive).filter(SessionArchive.session_id == session.id).first()
+    archived = _decompress(archive) if archive else []
+    archived.extend(_serialize(msg) for msg in messages)
+    payload = gzip.compress(json.dumps(archived, ensure_ascii=False).encode("utf-8"))
+
+    if archive is None:
+        archive = SessionArchive(session_id=session.id, user_id=session.user_id)
+        db.add(archive)
+    archive.payload = payload
+    archive.message_count = len(archived)
+    archive.first_message_at = datetime.fromisoformat(archived[0]["created_at"])
+    archive.last_message_at = messages[-1].created_at
+    archive.archived_at = datetime.utcnow()
+
+    db.query(Message).filter(
+        Message.id.in_([msg.id for msg in messages]),
+        Message.created_at >= messages[0].created_at
+    ).delete(synchronize_session=False)
+    return len(messages)
+
+
+def archive_idle_sessions(db: Session, idle_days: Optional[int] = None, deleted_after_days: Optional[int] = None, limit: int = 500) -> int:
+    """Archive sessions idle past the retention window, one transaction per session"""
+    now = datetime.utcnow()
+    idle_cutoff = now - timedelta(days=idle_days if idle_days is not None else settings.archive_idle_days)
+    deleted_cutoff = now - timedelta(
+        days=deleted_after_days if deleted_after_days is not None else settings.archive_deleted_after_days
+    )
+
+    # Only sessions that still have live rows are candidates
+    has_messages = db.query(Message.id).filter(Message.session_id == ChatSession.id).exists()
+    sessions = db.query(ChatSession).filter(
+        ((ChatSession.updated_at < idle_cutoff) |
+         ((ChatSession.is_active == False) & (ChatSession.updated_at < deleted_cutoff))),
+        has_messages
+    ).order_by(ChatSession.updated_at.asc()).limit(limit).all()
+
+    total = 0
+    for session in sessions:
+        try:
+            total += archive_session(db, session)
+            db.commit()
+        except Exception as e:
+            print(f"Error archiving session {session.id}: {e}")
+            db.rollback()
+    return total
+
+
+def load_archived_messages(db: Session, session_id: int) -> List[Dict]:
+    """Messages of a session that were moved to the archive, oldest first"""
+    archive = db.query(SessionArchive).filter(SessionArchive.session_id == session_id).first()
+    if archive is None:
+        return []
+    messages = _decompress(archive)
+    for msg in messages:
+        msg["created_at"] = datetime.fromisoformat(msg["created_at"])
+    return messages
+
+
+def archived_message_counts(db: Session, session_ids: List[int]) -> Dict[int, int]:
+    """Number of archived messages per session"""
+    if not session_ids:
+        return {}
+    rows = db.query(SessionArchive.session_id, SessionArchive.message_count).filter(
+        SessionArchive.session_id.in_(session_ids)
+    ).all()
+    return {session_id: count for session_id, count in rows}
+
+
+def run_maintenance(engine, session_factory) -> Dict:
+    """Create upcoming partitions, archive idle sessions and drop emptied partitions.
+
+    Guarded by an advisory lock so concurrent workers do not repeat the work.
+    """
+    with engine.connect() as lock_conn:
+        if not lock_conn.execute(text("SELECT pg_try_advisory_lock(:id)"), {"id": MAINTENANCE_LOCK_ID}).scalar():
+            return {"skipped": True}
+        try:
+            ensure_message_partitions(engine)
+            db = session_factory()
+            try:
+                archived = archive_idle_sessions(db)
+            finally:
+                db.close()
+            cutoff = datetime.utcnow().date() - timedelta(days=settings.archive_deleted_after_days)
+            dropped = drop_empty_partitions(engine, _month_start(cutoff))
+            return {"skipped": False, "archived_messages": archived, "dropped_partitions": dropped}
+        finally:
+            lock_conn.execute(text("SELECT pg_advisory_unlock(:id)"), {"id": MAINTENANCE_LOCK_ID})
+            lock_conn.commit()
+
+
+def drop_legacy_messages(engine) -> bool:
+    """Drop the unpartitioned messages_legacy table left by migration 0006"""
+    with engine.begin() as conn:
+        exists = conn.execute(text("SELECT to_regclass('messages_legacy') IS NOT NULL")).scalar()
+        if exists:
+            conn.execute(text("DROP TABLE messages_legacy"))
+    return exists
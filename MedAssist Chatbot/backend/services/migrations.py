@@ -0,0 +1,120 @@
+import importlib.util
+import os
+import re
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from sqlalchemy import text
+
+from services.message_storage import ensure_message_partitions
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "migrations")
+
+# Arbitrary key for pg_advisory_lock so concurrent deploys migrate one at a time
+MIGRATION_LOCK_ID = 702802
+
+_MIGRATION_FILE = re.compile(r"^(\d{4})_(\w+)\.py$")
+
+
+class Migration:
+    """One numbered file in migrations/ exposing upgrade(conn)"""
+
+    def __init__(self, version: int, name: str, path: str):
+        self.version = version
+        self.name = name
+        self.path = path
+
+    def load(self):
+        spec = importlib.util.spec_from_file_location(f"migrations.m{self.version:04d}_{self.name}", self.path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        return module
+
+
+def discover_migrations(directory: str = MIGRATIONS_DIR) -> List[Migration]:
+    migrations = []
+    for filename in sorted(os.listdir(directory)):
+        match = _MIGRATION_FILE.match(filename)
+        if match:
+            migrations.append(Migration(int(match.group(1)), match.group(2), os.path.join(directory, filename)))
+    versions = [migration.version for migration in migrations]
+    if len(versions) != len(set(versions)):
+        raise RuntimeError("Duplicate migration version in migrations/")
+    return migrations
+
+
+def _ensure_version_table(conn):
+    conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            name VARCHAR(100) NOT NULL,
+            applied_at TIMESTAMP NOT NULL
+        )
+    """))
+
+
+def applied_versions(conn) -> Dict[int, datetime]:
+    _ensure_version_table(conn)
+    return dict(conn.execute(text("SELECT version, applied_at FROM schema_migrations")).all())
+
+
+def migration_status(engine) -> List[Dict]:
+    with engine.begin() as conn:
+        applied = applied_versions(conn)
+    return [{
+        "version": migration.version,
+        "name": migration.name,
+        "applied_at": applied[migration.version].isoformat() if migration.version in applied else None
+    } for migration in discover_migrations()]
+
+
+def messages_partitioned(engine) -> bool:
+    """Whether messages exists and is partitioned (0006 applied or database_setup.sql)"""
+    if engine.dialect.name != "postgresql":
+        return False
+    with engine.connect() as conn:
+        return conn.execute(text(
+            "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass('messages'))"
+        )).scalar()
+
+
+def _advisory_lock(conn, function: str):
+    # Other dialects (SQLite in tests) have a single writer anyway
+    if conn.dialect.name == "postgresql":
+        conn.execute(text(f"SELECT {function}(:id)"), {"id": MIGRATION_LOCK_ID})
+        conn.commit()
+
+
+def run_migrations(engine, target: Optional[int] = None, directory: str = MIGRATIONS_DIR) -> List[str]:
+    """Apply pending migrations in order, each in its own transaction.
+
+    Meant to run as a deploy step (python migrate.py), never at import or
+    app startup. Returns the names of the migrations applied.
+    """
+    applied_now = []
+    with engine.connect() as lock_conn:
+        _advisory_lock(lock_conn, "pg_advisory_lock")
+        try:
+            with engine.begin() as conn:
+                applied = applied_versions(conn)
+
+            for migration in discover_migrations(directory):
+                if migration.version in applied or (target is not None and migration.version > target):
+                    continue
+                module = migration.load()
+                # Postgres DDL is transactional: a failing migration leaves no trace
+                with engine.begin() as conn:
+                    module.upgrade(conn)
+                    conn.execute(
+                        text("INSERT INTO schema_migrations (version, name, applied_at) VALUES (:version, :name, :applied_at)"),
+                        {"version": migration.version, "name": migration.name, "applied_at": datetime.utcnow()}
+                    )
+                applied_now.append(f"{migration.version:04d}_{migration.name}")
+        finally:
+            _advisory_lock(lock_conn, "pg_advisory_unlock")
+
+    # Monthly partitions are operational state, not schema versions. Before
+    # 0006 (e.g. upgrade --to 5) messages is a plain table and has none.
+    if messages_partitioned(engine):
+        ensure_message_partitions(engine)
+    return applied_now
@@ -0,0 +1,249 @@
+import asyncio
+import json
+import os
+import socket
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from config import settings
+from services.cache_service import get_cache_backend, publish, subscribe
+
+# Admin model changes are broadcast on this cache channel to every worker
+MODEL_CHANNEL = "models"
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+
+class ModelHandle:
+    """One loaded GGUF model plus its usage counters"""
+
+    def __init__(self, tier: str, path: str, model):
+        self.tier = tier
+        self.path = path
+        self.model = model
+        self.state = "active"  # active, draining or unloaded
+        self.loaded_at = datetime.utcnow()
+        self.in_flight = 0
+        self.drained = threading.Event()
+        # llama.cpp contexts are not thread-safe; every call goes through this lock
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.completion_tokens = 0
+
+    def complete(self, prompt: str, **kwargs) -> Dict[str, Any]:
+        with self.lock:
+            response = self.model(prompt, **kwargs)
+            usage = response.get("usage") if isinstance(response, dict) else None
+            if usage:
+                self.completion_tokens += usage.get("completion_tokens", 0)
+        return response
+
+    def tokenize(self, text: str) -> List[int]:
+        return self.model.tokenize(text.encode("utf-8"), add_bos=False)
+
+    def unload(self):
+        self.state = "unloaded"
+        close = getattr(self.model, "close", None)
+        if close:
+            close()
+        self.model = None
+
+    def get_metrics(self) -> Dict[str, Any]:
+        return {
+            "tier": self.tier,
+            "path": self.path,
+            "state": self.state,
+            "loaded_at": self.loaded_at.isoformat(),
+            "in_flight": self.in_flight,
+            "requests": self.requests,
+            "errors": self.errors,
+            "avg_latency_ms": round(self.total_ms / self.requests, 1) if self.requests else 0.0,
+            "max_latency_ms": round(self.max_ms, 1),
+            "completion_tokens": self.completion_tokens
+        }
+
+
+class ModelRegistry:
+    """Loaded models keyed by tier, with atomic hot swap.
+
+    A swap loads and warms the new model in a worker thread while traffic
+    keeps using the old one, then replaces the tier entry in one step. The
+    old model is marked draining, waits for its in-flight requests and is
+    unloaded.
+    """
+
+    def __init__(self):
+        self.tiers: Dict[str, ModelHandle] = {}
+        self.retired: List[ModelHandle] = []
+        self.swap_status: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def load_model(self, tier: str, path: str, warm_up: bool = True) -> ModelHandle:
+        """Load a GGUF file into a new handle (blocking)"""
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Model file not found at {path}")
+        from llama_cpp import Llama  # Heavy native import, deferred until a model is loaded
+        model = Llama(
+            model_path=path,
+            n_ctx=settings.model_context_window,  # Context window
+            n_threads=settings.model_threads,  # Number of CPU threads
+            verbose=False
+        )
+        if warm_up:
+            model("Hello", max_tokens=1)
+        print(f"Model '{tier}' loaded successfully from {path}")
+        return ModelHandle(tier, path, model)
+
+    def register(self, handle: ModelHandle) -> Optional[ModelHandle]:
+        """Make a handle the active model of its tier, returning the one it replaced"""
+        with self._lock:
+            old = self.tiers.get(handle.tier)
+            self.tiers[handle.tier] = handle
+            if old is not None:
+                self._retire(old)
+        return old
+
+    def _retire(self, handle: ModelHandle):
+        handle.state = "draining"
+        self.retired.append(handle)
+        if handle.in_flight == 0:
+            handle.drained.set()
+
+    async def _drain_and_unload(self, handle: ModelHandle):
+        drained = await asyncio.to_thread(handle.drained.wait, settings.model_drain_timeout_seconds)
+        if not drained:
+            print(f"Model '{handle.tier}' still has {handle.in_flight} requests after drain timeout, unloading")
+        with handle.lock:
+            handle.unload()
+        with self._lock:
+            self.retired.remove(handle)
+
+    def begin_swap(self, tier: str, path: str) -> bool:
+        """Mark a tier as loading; False if a load is already running for it"""
+        with self._lock:
+            if self.is_loading(tier):
+                return False
+            self.swap_status[tier] = {"state": "loading", "path": path, "started_at": datetime.utcnow().isoformat()}
+        return True
+
+    async def swap(self, tier: str, path: str):
+        """Load a model in the background and switch the tier to it once warm.
+
+        Call begin_swap first, in the same event loop step, so two requests
+        cannot both start loading the tier.
+        """
+        try:
+            handle = await asyncio.to_thread(self.load_model, tier, path)
+        except Exception as e:
+            print(f"Error loading model '{tier}' from {path}: {e}")
+            self.swap_status[tier].update(state="failed", error=str(e))
+            return
+
+        old = self.register(handle)
+        self.swap_status[tier].update(state="active", finished_at=datetime.utcnow().isoformat())
+        if old is not None:
+            await self._drain_and_unload(old)
+
+    async def unload(self, tier: str) -> bool:
+        """Remove a tier; its traffic falls back to the default tier"""
+        with self._lock:
+            handle = self.tiers.pop(tier, None)
+            if handle is None:
+                return False
+            self._retire(handle)
+        self.swap_status.pop(tier, None)
+        await self._drain_and_unload(handle)
+        return True
+
+    def is_loading(self, tier: str) -> bool:
+        return self.swap_status.get(tier, {}).get("state") == "loading"
+
+    def resolve(self, tier: Optional[str] = None) -> Optional[ModelHandle]:
+        """Active handle for a tier, falling back to the default tier, then any model"""
+        for name in (tier, settings.model_default_tier):
+            if name in self.tiers:
+                return self.tiers[name]
+        return next(iter(self.tiers.values()), None)
+
+    @contextmanager
+    def acquire(self, tier: Optional[str] = None):
+        """Pin a model for one request so a swap cannot unload it mid-generation"""
+        with self._lock:
+            handle = self.resolve(tier)
+            if handle is None:
+                raise RuntimeError("Model not loaded")
+            handle.in_flight += 1
+
+        started = time.perf_counter()
+        failed = False
+        try:
+            yield handle
+        except Exception:
+            failed = True
+            raise
+        finally:
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            with self._lock:
+                handle.in_flight -= 1
+                handle.requests += 1
+                handle.errors += int(failed)
+                handle.total_ms += elapsed_ms
+                handle.max_ms = max(handle.max_ms, elapsed_ms)
+                if handle.state == "draining" and handle.in_flight == 0:
+                    handle.drained.set()
+
+    def get_metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "worker": WORKER_ID,
+                "models": [handle.get_metrics() for handle in self.tiers.values()],
+                "draining": [handle.get_metrics() for handle in self.retired],
+                "swaps": dict(self.swap_status)
+            }
+
+
+_command_tasks = set()  # Keep references so running swaps are not garbage collected
+
+
+def _run_command(registry: ModelRegistry, command: Dict[str, Any]):
+    tier = command["tier"]
+    if command["action"] == "load":
+        if not registry.begin_swap(tier, command["path"]):
+            print(f"Model tier '{tier}' is already loading, ignoring load of {command['path']}")
+            return
+        task = asyncio.create_task(registry.swap(tier, command["path"]))
+    elif command["action"] == "unload":
+        if tier not in registry.tiers or len(registry.tiers) == 1:
+            return
+        task = asyncio.create_task(registry.unload(tier))
+    else:
+        return
+    _command_tasks.add(task)
+    task.add_done_callback(_command_tasks.discard)
+
+
+async def broadcast_model_command(action: str, tier: str, path: Optional[str] = None) -> str:
+    """Ask every worker to load or unload a tier.
+
+    Returns the scope reached: "all workers" with a shared cache backend,
+    otherwise "this worker" (the memory backend does not cross processes).
+    """
+    await publish(MODEL_CHANNEL, json.dumps({"action": action, "tier": tier, "path": path}))
+    return "all workers" if get_cache_backend().shared else "this worker"
+
+
+async def start_model_sync(registry: ModelRegistry):
+    """Apply model commands broadcast by the admin API in this worker"""
+    def on_command(message: str):
+        try:
+            _run_command(registry, json.loads(message))
+        except Exception as e:
+            print(f"Error applying model command {message}: {e}")
+
+    await subscribe(MODEL_CHANNEL, on_command)
@@ -0,0 +1,85 @@
+import gzip
+import hashlib
+from typing import Any, Dict, Optional
+
+import orjson
+from fastapi import Request, Response
+
+from config import settings
+
+_brotli = None
+
+
+def _get_brotli():
+    """brotli module, or None when it is not installed (gzip is used instead)"""
+    global _brotli
+    if _brotli is None:
+        try:
+            import brotli
+            _brotli = brotli
+        except ImportError:
+            _brotli = False
+    return _brotli or None
+
+
+def make_etag(*parts: Any) -> str:
+    """Weak ETag: the same JSON may be sent gzip, brotli or identity encoded"""
+    digest = hashlib.sha256("|".join(str(part) for part in parts).encode("utf-8")).hexdigest()[:32]
+    return f'W/"{digest}"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == opaque for tag in header.split(","))
+
+
+def _cache_headers(etag: Optional[str]) -> Dict[str, str]:
+    headers = {"Vary": "Accept-Encoding"}
+    if etag:
+        headers["ETag"] = etag
+        # Clients may keep the body but must revalidate before using it
+        headers["Cache-Control"] = "private, no-cache"
+    return headers
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers=_cache_headers(etag))
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """Best of br and gzip the client accepts, by q-value then preference"""
+    accepted = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        quality = 1.0
+        if params.strip().startswith("q="):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+
+    candidates = ["br", "gzip"] if _get_brotli() else ["gzip"]
+    ranked = [(accepted.get(name, accepted.get("*", 0.0)), -index, name) for index, name in enumerate(candidates)]
+    quality, _, name = max(ranked)
+    return name if quality > 0 else None
+
+
+def json_response(request: Request, content: Any, etag: Optional[str] = None) -> Response:
+    """Serialize with orjson and compress above response_compress_min_bytes"""
+    body = orjson.dumps(content)
+    headers = _cache_headers(etag)
+    if len(body) >= settings.response_compress_min_bytes:
+        encoding = choose_encoding(request.headers.get("accept-encoding", ""))
+        if encoding == "br":
+            body = _get_brotli().compress(body, quality=settings.response_brotli_quality)
+        elif encoding == "gzip":
+            body = gzip.compress(body, compresslevel=settings.response_gzip_level)
+        if encoding:
+            headers["Content-Encoding"] = encoding
+    return Response(content=body, media_type="application/json", headers=headers)
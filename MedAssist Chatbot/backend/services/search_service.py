@@ -0,0 +1,139 @@
+import base64
+import html
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import and_, case, cast, func, literal, or_
+from sqlalchemy.dialects.postgresql import REAL, REGCONFIG
+from sqlalchemy.orm import Session
+
+from models import ChatSession, Message
+
+SEARCH_CONFIGS = ["english", "french", "simple"]
+
+# ts_headline marks matches with control characters; the snippet is
+# HTML-escaped afterwards and only then are the markers turned into <mark>
+_START_SEL = "\x01"
+_STOP_SEL = "\x02"
+HEADLINE_OPTIONS = (
+    f'StartSel="{_START_SEL}", StopSel="{_STOP_SEL}", '
+    "MaxFragments=2, MaxWords=20, MinWords=5, FragmentDelimiter= … "
+)
+
+
+def _regconfig(name: str):
+    return cast(literal(name), REGCONFIG)
+
+
+def message_search_config():
+    """Per-row text search configuration, same mapping as Message.search_vector"""
+    return case(
+        (Message.language == "english", _regconfig("english")),
+        (Message.language == "french", _regconfig("french")),
+        else_=_regconfig("simple")
+    )
+
+
+def search_config_for(language: Optional[str]) -> List[str]:
+    """Configurations to parse the query with"""
+    if language in ("english", "french"):
+        return [language]
+    if language:
+        return ["simple"]
+    return SEARCH_CONFIGS
+
+
+def build_tsquery(q: str, language: Optional[str] = None):
+    """OR the query parsed with each configuration so it matches stemmed
+    English, stemmed French and unstemmed local-language messages"""
+    tsquery = None
+    for config in search_config_for(language):
+        parsed = func.websearch_to_tsquery(_regconfig(config), q)
+        tsquery = parsed if tsquery is None else tsquery.op("||")(parsed)
+    return tsquery
+
+
+def render_snippet(headline: Optional[str]) -> str:
+    """Escape message text so only the match highlighting is markup"""
+    return html.escape(headline or "").replace(_START_SEL, "<mark>").replace(_STOP_SEL, "</mark>")
+
+
+def encode_cursor(rank: float, message_id: int) -> str:
+    return base64.urlsafe_b64encode(json.dumps([rank, message_id]).encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[float, int]:
+    rank, message_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    return float(rank), int(message_id)
+
+
+def search_messages(
+    db: Session,
+    user_id: int,
+    q: str,
+    language: Optional[str] = None,
+    limit: int = 20,
+    cursor: Optional[str] = None
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """Ranked full-text search over one user's messages with keyset pagination.
+
+    Results are ordered by (rank, id) descending; the cursor carries the last
+    pair so the next page continues with a range condition instead of OFFSET.
+    Snippets are HTML-escaped with matches wrapped in <mark>.
+    """
+    tsquery = build_tsquery(q, language)
+    rank = func.ts_rank_cd(Message.search_vector, tsquery)
+
+    query = db.query(
+        Message.id,
+        Message.session_id,
+        Message.sender,
+        Message.language,
+        Message.created_at,
+        ChatSession.session_name,
+        rank.label("rank"),
+        func.ts_headline(
+            message_search_config(),
+            # Drop marker characters already in the text so they cannot forge highlighting
+            func.translate(Message.content, _START_SEL + _STOP_SEL, ""),
+            tsquery,
+            HEADLINE_OPTIONS
+        ).label("snippet")
+    ).join(
+        ChatSession, ChatSession.id == Message.session_id
+    ).filter(
+        Message.user_id == user_id,
+        ChatSession.user_id == user_id,
+        ChatSession.is_active == True,
+        Message.search_vector.op("@@")(tsquery)
+    )
+    if language:
+        query = query.filter(Message.language == language)
+
+    if cursor:
+        last_rank, last_id = decode_cursor(cursor)
+        last_rank = cast(literal(last_rank), REAL)
+        query = query.filter(or_(
+            rank < last_rank,
+            and_(rank == last_rank, Message.id < last_id)
+        ))
+
+    # Fetch one extra row to know whether there is a next page
+    rows = query.order_by(rank.desc(), Message.id.desc()).limit(limit + 1).all()
+
+    results = [{
+        "message_id": row.id,
+        "session_id": row.session_id,
+        "session_name": row.session_name or f"Chat {row.session_id}",
+        "sender": row.sender,
+        "language": row.language,
+        "snippet": render_snippet(row.snippet),
+        "rank": row.rank,
+        "created_at": row.created_at.isoformat()
+    } for row in rows[:limit]]
+
+    next_cursor = None
+    if len(rows) > limit:
+        last = rows[limit - 1]
+        next_cursor = encode_cursor(last.rank, last.id)
+    return results, next_cursor
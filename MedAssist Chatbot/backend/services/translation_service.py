@@ -1,127 +1,403 @@
-import aiohttp
 import asyncio
-from typing import Optional
+import json
+import os
+import re
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Dict, List, Tuple
 from urllib.parse import quote
 
+from config import settings
+
+LOCAL_LANGUAGES = ["ewondo", "douala", "bassa"]
+
+LANGUAGE_NAMES = {
+    "english": "English",
+    "french": "French",
+    "ewondo": "Ewondo",
+    "douala": "Douala",
+    "bassa": "Bassa"
+}
+
+# Basic medical glossary, used as a prompt constraint for model translation
+# and as the dictionary fallback
+GLOSSARY = {
+    ("english", "french"): {
+        "hello": "bonjour",
+        "pain": "douleur",
+        "fever": "fièvre",
+        "headache": "mal de tête",
+        "doctor": "docteur",
+        "medicine": "médicament",
+        "hospital": "hôpital",
+        "help": "aide",
+        "thank you": "merci",
+        "symptoms": "symptômes"
+    },
+    ("french", "english"): {
+        "bonjour": "hello",
+        "douleur": "pain",
+        "fièvre": "fever",
+        "mal de tête": "headache",
+        "docteur": "doctor",
+        "médicament": "medicine",
+        "hôpital": "hospital",
+        "aide": "help",
+        "merci": "thank you",
+        "symptômes": "symptoms"
+    }
+}
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+_NUMBERED_LINE = re.compile(r"^\s*(\d+)[.)]\s*(.*)$")
+
+# Context window of the dedicated translation model
+_DEDICATED_N_CTX = 2048
+
+# Latency measurements older than this are forgotten so a backend that was
+# slow or failing gets probed again
+_LATENCY_STALE_SECONDS = 300
+
+
+def load_glossary() -> Dict[Tuple[str, str], Dict[str, str]]:
+    """Built-in glossary merged with the optional JSON glossary file"""
+    glossary = {pair: dict(terms) for pair, terms in GLOSSARY.items()}
+    path = settings.translation_glossary_path
+    if path and os.path.exists(path):
+        try:
+            with open(path, encoding="utf-8") as f:
+                for pair, terms in json.load(f).items():
+                    source_lang, target_lang = pair.split("->")
+                    glossary.setdefault((source_lang, target_lang), {}).update(terms)
+        except Exception as e:
+            print(f"Error loading translation glossary: {e}")
+    return glossary
+
+
+def split_sentences(text: str) -> List[str]:
+    """Split a paragraph into sentences"""
+    return [s.strip() for s in _SENTENCE_END.split(text) if s.strip()]
+
+
+def segment_text(text: str, chunk_size: int) -> List[List[List[str]]]:
+    """Split text into paragraphs, each a list of sentence chunks"""
+    paragraphs = []
+    for paragraph in text.split("\n"):
+        sentences = split_sentences(paragraph)
+        paragraphs.append([sentences[i:i + chunk_size] for i in range(0, len(sentences), chunk_size)])
+    return paragraphs
+
+
+class TranslationBackend(ABC):
+    """Base class for translation backends"""
+    name = "base"
+    quality = 0.0
+
+    def supports(self, source_lang: str, target_lang: str) -> bool:
+        return True
+
+    def is_available(self) -> bool:
+        return True
+
+    @abstractmethod
+    async def translate_chunk(self, sentences: List[str], source_lang: str, target_lang: str) -> str:
+        """Translate one chunk of sentences into a single string"""
+
+
+class LocalModelBackend(TranslationBackend):
+    """Translate with a local GGUF model using batched, numbered prompts"""
+    name = "local"
+
+    def __init__(self, llm_service=None, model_path: str = "", glossary=None):
+        self.llm_service = llm_service
+        self.model_path = model_path
+        self.glossary = glossary or {}
+        self.quality = settings.translation_local_quality
+        self._model = None
+        self._lock = threading.Lock()
+
+    def _load_dedicated_model(self):
+        """Load the dedicated translation model on first use; call with self._lock held"""
+        if self._model is None and self.model_path and os.path.exists(self.model_path):
+            try:
+                from llama_cpp import Llama
+                self._model = Llama(
+                    model_path=self.model_path,
+                    n_ctx=_DEDICATED_N_CTX,
+                    n_threads=4,
+                    verbose=False
+                )
+                print(f"Translation model loaded from {self.model_path}")
+            except Exception as e:
+                print(f"Error loading translation model: {e}")
+        return self._model
+
+    def is_available(self) -> bool:
+        if self.model_path:
+            return os.path.exists(self.model_path)
+        return self.llm_service is not None and self.llm_service.model is not None
+
+    def _complete(self, prompt: str, **kwargs) -> dict:
+        if self.model_path:
+            # Concurrent chunks wait here, so the model is loaded only once
+            with self._lock:
+                model = self._model or self._load_dedicated_model()
+                if model is None:
+                    raise RuntimeError("Translation model not loaded")
+                return model(prompt, **kwargs)
+        return self.llm_service.complete(prompt, **kwargs)
+
+    def _count_tokens(self, text: str) -> int:
+        if self.model_path:
+            with self._lock:
+                model = self._model or self._load_dedicated_model()
+                if model is None:
+                    raise RuntimeError("Translation model not loaded")
+                return len(model.tokenize(text.encode("utf-8"), add_bos=False))
+        return self.llm_service.count_tokens(text)
+
+    def _max_tokens(self, prompt: str, sentences: List[str]) -> int:
+        """Room for the translation: twice the source tokens, clamped to what the context has left"""
+        n_ctx = _DEDICATED_N_CTX if self.model_path else settings.model_context_window
+        room = n_ctx - self._count_tokens(prompt)
+        if room <= 0:
+            raise ValueError("Chunk does not fit in the translation model context")
+        return min(max(64, 2 * self._count_tokens(" ".join(sentences))), room)
+
+    def _translate(self, sentences: List[str], source_lang: str, target_lang: str) -> dict:
+        prompt = self._build_prompt(sentences, source_lang, target_lang)
+        return self._complete(
+            prompt,
+            max_tokens=self._max_tokens(prompt, sentences),
+            temperature=0.1,
+            top_p=0.9,
+            stop=["Human:", "System:", "\n\n"],
+            echo=False
+        )
+
+    def _build_prompt(self, sentences: List[str], source_lang: str, target_lang: str) -> str:
+        source_name = LANGUAGE_NAMES.get(source_lang, source_lang)
+        target_name = LANGUAGE_NAMES.get(target_lang, target_lang)
+        prompt = (
+            f"System: You are a professional medical translator. Translate each numbered line "
+            f"from {source_name} to {target_name}. Keep the numbering and output only the translations."
+        )
+
+        # Glossary constraint for the terms that actually occur in this chunk
+        text_lower = " ".join(sentences).lower()
+        terms = [
+            f"{source} = {target}"
+            for source, target in self.glossary.get((source_lang, target_lang), {}).items()
+            if source in text_lower
+        ]
+        if terms:
+            prompt += f"\nAlways use these term translations: {'; '.join(terms)}."
+
+        numbered = "\n".join(f"{i + 1}. {sentence}" for i, sentence in enumerate(sentences))
+        return f"{prompt}\n\nHuman:\n{numbered}\nAssistant:\n1."
+
+    def _parse_output(self, text: str, expected: int) -> List[str]:
+        lines = {}
+        for line in ("1." + text).splitlines():
+            match = _NUMBERED_LINE.match(line)
+            if match and match.group(2).strip():
+                lines.setdefault(int(match.group(1)), match.group(2).strip())
+        if sorted(lines)[:expected] != list(range(1, expected + 1)):
+            raise ValueError("Model output does not match the numbered input")
+        return [lines[i] for i in range(1, expected + 1)]
+
+    def _apply_glossary(self, source: str, translated: str, source_lang: str, target_lang: str) -> str:
+        """Replace glossary terms the model copied over untranslated"""
+        for term, target in self.glossary.get((source_lang, target_lang), {}).items():
+            if term in source.lower() and term != target.lower():
+                translated = re.sub(rf"\b{re.escape(term)}\b", target, translated, flags=re.IGNORECASE)
+        return translated
+
+    async def translate_chunk(self, sentences: List[str], source_lang: str, target_lang: str) -> str:
+        response = await asyncio.to_thread(self._translate, sentences, source_lang, target_lang)
+        translations = self._parse_output(response['choices'][0]['text'], len(sentences))
+        return " ".join(
+            self._apply_glossary(source, translated, source_lang, target_lang)
+            for source, translated in zip(sentences, translations)
+        )
+
+
+class RemoteBackend(TranslationBackend):
+    """MyMemory free translation API (English <-> French only)"""
+    name = "remote"
+    quality = 0.8
+    lang_map = {
+        "english": "en",
+        "french": "fr"
+    }
+
+    def __init__(self, service: "TranslationService"):
+        self.service = service
+
+    def supports(self, source_lang: str, target_lang: str) -> bool:
+        return source_lang in self.lang_map and target_lang in self.lang_map
+
+    def is_available(self) -> bool:
+        return settings.translation_remote_enabled
+
+    async def translate_chunk(self, sentences: List[str], source_lang: str, target_lang: str) -> str:
+        session = await self.service.get_session()
+        url = "https://api.mymemory.translated.net/get"
+        params = {
+            "q": " ".join(sentences),
+            "langpair": f"{self.lang_map[source_lang]}|{self.lang_map[target_lang]}"
+        }
+
+        async with session.get(url, params=params) as response:
+            if response.status == 200:
+                data = await response.json()
+                if data.get("responseStatus") == 200:
+                    return data["responseData"]["translatedText"]
+                else:
+                    raise Exception("Translation service error")
+            else:
+                raise Exception(f"HTTP error: {response.status}")
+
+
+class FallbackBackend(TranslationBackend):
+    """Simple dictionary replacement for common medical terms"""
+    name = "fallback"
+    quality = 0.1
+
+    def __init__(self, glossary=None):
+        self.glossary = glossary or {}
+
+    async def translate_chunk(self, sentences: List[str], source_lang: str, target_lang: str) -> str:
+        text = " ".join(sentences)
+        translation_dict = self.glossary.get((source_lang, target_lang), {})
+
+        # Simple word replacement
+        result = text.lower()
+        for source_word, target_word in translation_dict.items():
+            result = result.replace(source_word, target_word)
+
+        return result.capitalize() if result != text.lower() else text
+
+
 class TranslationService:
-    def __init__(self):
+    def __init__(self, llm_service=None):
         self.session = None
-    
+        glossary = load_glossary()
+        self.local_backend = LocalModelBackend(llm_service, settings.translation_model_path, glossary)
+        self.remote_backend = RemoteBackend(self)
+        self.fallback_backend = FallbackBackend(glossary)
+        self.backends = {
+            backend.name: backend
+            for backend in (self.local_backend, self.remote_backend, self.fallback_backend)
+        }
+        # (backend, source, target) -> (EWMA latency in ms per chunk, measured at)
+        self.latency: Dict[Tuple[str, str, str], Tuple[float, float]] = {}
+
     async def get_session(self):
         """Get or create aiohttp session"""
         if self.session is None:
-            self.session = aiohttp.ClientSession()
+            import aiohttp  # Only the remote backend needs it
+            self.session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(
+                total=settings.translation_remote_timeout_seconds,
+                connect=settings.translation_remote_connect_timeout_seconds
+            ))
         return self.session
-    
+
     async def translate(self, text: str, source_lang: str, target_lang: str) -> str:
-        """Translate text using free translation services"""
-        
-        # Handle local languages (placeholder for now)
-        if source_lang in ["ewondo", "douala", "bassa"] or target_lang in ["ewondo", "douala", "bassa"]:
-            return await self._translate_local_language(text, source_lang, target_lang)
-        
-        # Handle English <-> French translation
-        if (source_lang == "english" and target_lang == "french") or (source_lang == "french" and target_lang == "english"):
-            return await self._translate_free_service(text, source_lang, target_lang)
-        
+        """Translate text with the best available backend for the language pair"""
+        translated_text, _ = await self.translate_with_backend(text, source_lang, target_lang)
+        return translated_text
+
+    async def translate_with_backend(self, text: str, source_lang: str, target_lang: str) -> Tuple[str, str]:
+        """Translate text and return the name of the backend that produced it"""
+
         # If same language, return original
-        if source_lang == target_lang:
-            return text
-        
-        return text  # Fallback
-    
-    async def _translate_free_service(self, text: str, source_lang: str, target_lang: str) -> str:
-        """Use free translation service (Google Translate API alternative)"""
-        try:
-            # Convert language codes
-            lang_map = {
-                "english": "en",
-                "french": "fr"
-            }
-            
-            source_code = lang_map.get(source_lang, "en")
-            target_code = lang_map.get(target_lang, "fr")
-            
-            # Using MyMemory API (free translation service)
-            session = await self.get_session()
-            url = f"https://api.mymemory.translated.net/get"
-            params = {
-                "q": text,
-                "langpair": f"{source_code}|{target_code}"
-            }
-            
-            async with session.get(url, params=params) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    if data.get("responseStatus") == 200:
-                        return data["responseData"]["translatedText"]
-                    else:
-                        raise Exception("Translation service error")
-                else:
-                    raise Exception(f"HTTP error: {response.status}")
-                    
-        except Exception as e:
-            print(f"Translation error: {e}")
-            # Fallback to simple dictionary translation for common medical terms
-            return self._fallback_translation(text, source_lang, target_lang)
-    
-    async def _translate_local_language(self, text: str, source_lang: str, target_lang: str) -> str:
-        """Placeholder for local language translation"""
-        # This is where you would integrate your local language model
-        # For now, return a placeholder message
-        
-        local_messages = {
-            "ewondo": "Mbok nga ve ayos - Je vous comprends (I understand you)",
-            "douala": "Na se ye - Je vous comprends (I understand you)", 
-            "bassa": "M si i - Je vous comprends (I understand you)"
-        }
-        
-        if target_lang in local_messages:
-            return f"{local_messages[target_lang]}. [Translation to {target_lang} not yet fully implemented]"
-        
-        return self._fallback_translation(text, source_lang, target_lang)
-    
-    def _fallback_translation(self, text: str, source_lang: str, target_lang: str) -> str:
-        """Simple fallback translation for common medical terms"""
-        
-        # Basic medical translation dictionary
-        translations = {
-            ("english", "french"): {
-                "hello": "bonjour",
-                "pain": "douleur",
-                "fever": "fièvre",
-                "headache": "mal de tête",
-                "doctor": "docteur",
-                "medicine": "médicament",
-                "hospital": "hôpital",
-                "help": "aide",
-                "thank you": "merci",
-                "symptoms": "symptômes"
-            },
-            ("french", "english"): {
-                "bonjour": "hello",
-                "douleur": "pain",
-                "fièvre": "fever",
-                "mal de tête": "headache",
-                "docteur": "doctor",
-                "médicament": "medicine",
-                "hôpital": "hospital",
-                "aide": "help",
-                "merci": "thank you",
-                "symptômes": "symptoms"
+        if source_lang == target_lang or not text.strip():
+            return text, "none"
+
+        paragraphs = segment_text(text, max(1, settings.translation_chunk_sentences))
+        chunks = [chunk for paragraph in paragraphs for chunk in paragraph]
+
+        # Caps how many chunks of one request are in flight, so a long text
+        # does not take every executor thread while chunks wait on the model lock
+        limit = asyncio.Semaphore(max(1, settings.translation_max_concurrent_chunks))
+
+        async def translate_chunk(backend, chunk):
+            async with limit:
+                return await backend.translate_chunk(chunk, source_lang, target_lang)
+
+        for backend in self._rank_backends(source_lang, target_lang):
+            start = time.perf_counter()
+            try:
+                results = await asyncio.gather(*(translate_chunk(backend, chunk) for chunk in chunks))
+            except Exception as e:
+                print(f"Translation error ({backend.name}): {e}")
+                self._record_latency(backend.name, source_lang, target_lang, settings.translation_latency_budget_ms * 2)
+                continue
+
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            self._record_latency(backend.name, source_lang, target_lang, elapsed_ms / max(1, len(chunks)))
+            return self._reassemble(paragraphs, iter(results)), backend.name
+
+        return text, "none"
+
+    def _reassemble(self, paragraphs: List[List[List[str]]], results) -> str:
+        return "\n".join(" ".join(next(results) for _ in paragraph) for paragraph in paragraphs)
+
+    def _get_latency(self, backend: str, source_lang: str, target_lang: str) -> float:
+        measured = self.latency.get((backend, source_lang, target_lang))
+        if measured is None or time.time() - measured[1] > _LATENCY_STALE_SECONDS:
+            return 0.0  # Unmeasured backends are tried optimistically
+        return measured[0]
+
+    def _record_latency(self, backend: str, source_lang: str, target_lang: str, latency_ms: float):
+        key = (backend, source_lang, target_lang)
+        previous = self.latency.get(key)
+        if previous is not None and time.time() - previous[1] <= _LATENCY_STALE_SECONDS:
+            latency_ms = 0.7 * previous[0] + 0.3 * latency_ms
+        self.latency[key] = (latency_ms, time.time())
+
+    def _rank_backends(self, source_lang: str, target_lang: str) -> List[TranslationBackend]:
+        """Order candidate backends for a language pair, dictionary fallback last"""
+        mode = settings.translation_backend
+        if mode != "auto" and mode in self.backends:
+            candidates = [self.backends[mode]]
+        else:
+            candidates = [
+                backend for backend in (self.local_backend, self.remote_backend)
+                if backend.supports(source_lang, target_lang) and backend.is_available()
+            ]
+            budget = settings.translation_latency_budget_ms
+
+            def latency(backend):
+                return self._get_latency(backend.name, source_lang, target_lang)
+
+            within_budget = [b for b in candidates if latency(b) <= budget]
+            over_budget = [b for b in candidates if latency(b) > budget]
+            if settings.translation_prefer == "latency":
+                within_budget.sort(key=latency)
+            else:
+                within_budget.sort(key=lambda b: (-b.quality, latency(b)))
+            candidates = within_budget + sorted(over_budget, key=latency)
+
+        if self.fallback_backend not in candidates:
+            candidates.append(self.fallback_backend)
+        return candidates
+
+    def get_stats(self) -> List[Dict]:
+        """Measured per-pair latency for each backend"""
+        return [
+            {
+                "backend": backend,
+                "source_language": source_lang,
+                "target_language": target_lang,
+                "latency_ms": round(latency_ms, 1)
             }
-        }
-        
-        translation_dict = translations.get((source_lang, target_lang), {})
-        
-        # Simple word replacement
-        result = text.lower()
-        for source_word, target_word in translation_dict.items():
-            result = result.replace(source_word, target_word)
-        
-        return result.capitalize() if result != text.lower() else text
-    
+            for (backend, source_lang, target_lang), (latency_ms, _) in self.latency.items()
+        ]
+
     async def close(self):
         """Close the aiohttp session"""
         if self.session:
-            await self.session.close()
\ No newline at end of file
+            await self.session.close()
@@ -2,22 +2,22 @@
 """
 MediChat AI Backend Startup Script
 """
+import importlib.util
 import os
 import sys
 import subprocess
 
 def check_requirements():
-    """Check if all requirements are installed"""
-    try:
-        import fastapi
-        import sqlalchemy
-        import psycopg2
-        import llama_cpp
-        print("✅ All required packages are installed")
-        return True
-    except ImportError as e:
-        print(f"❌ Missing required package: {e}")
+    """Check if all requirements are installed (without importing them)"""
+    missing = [
+        name for name in ("fastapi", "sqlalchemy", "psycopg2", "llama_cpp")
+        if importlib.util.find_spec(name) is None
+    ]
+    if missing:
+        print(f"❌ Missing required package: {', '.join(missing)}")
         return False
+    print("✅ All required packages are installed")
+    return True
 
 def check_model():
     """Check if model file exists"""
@@ -30,18 +30,17 @@ def check_model():
         print("Please ensure your model file is placed in the model/ directory")
         return False
 
-def check_database():
-    """Check database connection"""
+def apply_migrations():
+    """Bring the schema up to date (only with --migrate)"""
     try:
         from database import engine
-        from sqlalchemy import text
+        from services.migrations import run_migrations
         
-        with engine.connect() as conn:
-            conn.execute(text("SELECT 1"))
-        print("✅ Database connection successful")
+        applied = run_migrations(engine)
+        print(f"✅ Database schema up to date ({len(applied)} migrations applied)")
         return True
     except Exception as e:
-        print(f"❌ Database connection failed: {e}")
+        print(f"❌ Database migration failed: {e}")
         print("Please check your DATABASE_URL in config.py or .env file")
         return False
 
@@ -74,7 +73,8 @@ if __name__ == "__main__":
         print("\nEnsure your model file is in the model/ directory")
         sys.exit(1)
     
-    if not check_database():
+    # The server itself never touches the schema; pass --migrate to apply it here
+    if "--migrate" in sys.argv[1:] and not apply_migrations():
         print("\nCheck your database configuration and ensure PostgreSQL is running")
         sys.exit(1)
     
@@ -0,0 +1,120 @@
+"""Audit logging: client address resolution and the batched write pipeline"""
+import asyncio
+
+import pytest
+from starlette.requests import Request
+
+from config import settings
+from services import audit_service
+from services.audit_service import AuditPipeline, client_ip
+
+
+def make_request(host, forwarded=None, user_agent="pytest"):
+    headers = [(b"user-agent", user_agent.encode())]
+    if forwarded is not None:
+        headers.append((b"x-forwarded-for", forwarded.encode()))
+    return Request({"type": "http", "headers": headers, "client": (host, 12345)})
+
+
+@pytest.fixture
+def trusted(monkeypatch):
+    def use(*proxies):
+        monkeypatch.setattr(settings, "trusted_proxies", list(proxies))
+        audit_service._trusted_networks.cache_clear()
+    yield use
+    audit_service._trusted_networks.cache_clear()
+
+
+def test_forwarded_header_ignored_from_untrusted_peer(trusted):
+    trusted("10.0.0.0/8")
+    assert client_ip(make_request("203.0.113.9", "198.51.100.1")) == "203.0.113.9"
+
+
+def test_forwarded_header_walked_back_past_trusted_proxies(trusted):
+    trusted("10.0.0.0/8")
+    request = make_request("10.0.0.2", "198.51.100.1, 192.0.2.7, 10.0.0.5")
+    assert client_ip(request) == "192.0.2.7"
+
+
+def test_invalid_addresses_become_none(trusted):
+    trusted("10.0.0.1")
+    assert client_ip(make_request("testclient")) is None
+    assert client_ip(make_request("10.0.0.1", "not-an-ip")) is None
+    assert client_ip(None) is None
+
+
+class FakeSession:
+    def __init__(self, sink, fail):
+        self.sink = sink
+        self.fail = fail
+
+    def execute(self, statement, rows):
+        if self.fail:
+            raise ConnectionError("database down")
+        self.sink.append(list(rows))
+
+    def commit(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class FakeSessionFactory:
+    def __init__(self, failures=0):
+        self.batches = []
+        self.failures = failures
+
+    def __call__(self):
+        failing = self.failures > 0
+        self.failures -= 1
+        return FakeSession(self.batches, failing)
+
+
+def test_events_written_in_batches():
+    factory = FakeSessionFactory()
+
+    async def scenario():
+        pipeline = AuditPipeline(factory, max_queue=100, batch_size=3, flush_interval=0.05)
+        await pipeline.start()
+        for i in range(7):
+            pipeline.record("login", user_id=i, request=make_request("192.0.2.1"))
+        await asyncio.sleep(0.2)
+        await pipeline.stop()
+        return pipeline
+
+    pipeline = asyncio.run(scenario())
+    assert [len(batch) for batch in factory.batches] == [3, 3, 1]
+    assert [event["user_id"] for batch in factory.batches for event in batch] == list(range(7))
+    assert factory.batches[0][0]["ip_address"] == "192.0.2.1"
+    assert pipeline.metrics["flushed"] == 7
+
+
+def test_full_queue_drops_instead_of_blocking():
+    async def scenario():
+        pipeline = AuditPipeline(FakeSessionFactory(), max_queue=2, batch_size=10)
+        for _ in range(5):
+            pipeline.record("login")
+        return pipeline
+
+    pipeline = asyncio.run(scenario())
+    assert pipeline.metrics["enqueued"] == 2
+    assert pipeline.metrics["dropped"] == 3
+
+
+def test_failed_flush_backs_off_and_retries(monkeypatch):
+    factory = FakeSessionFactory(failures=1)
+
+    async def scenario():
+        pipeline = AuditPipeline(factory, max_queue=10, batch_size=10, flush_interval=0.01)
+        monkeypatch.setattr(settings, "audit_max_backoff_seconds", 0.05)
+        await pipeline.start()
+        pipeline.record("logout", user_id=1)
+        await asyncio.sleep(0.3)
+        await pipeline.stop()
+        return pipeline
+
+    pipeline = asyncio.run(scenario())
+    assert pipeline.metrics["failed_flushes"] == 1
+    assert [[event["user_id"] for event in batch] for batch in factory.batches] == [[1]]
+    assert pipeline.get_metrics()["backoff_seconds"] == 0.0
@@ -0,0 +1,85 @@
+"""Token to user resolution through the shared user cache"""
+import asyncio
+import threading
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+
+from routers import auth
+from routers.auth import create_access_token, forget_user, get_user_from_token
+from services.cache_service import Cache
+
+
+class FakeUsers:
+    """Session stand-in: query(User).filter(...).first() returns the current row"""
+
+    def __init__(self, row):
+        self.row = row
+        self.threads = []
+
+    def query(self, model):
+        return self
+
+    def filter(self, *criteria):
+        return self
+
+    def first(self):
+        self.threads.append(threading.current_thread())
+        return self.row
+
+
+def make_row(**changes):
+    fields = {"id": 1, "email": "patient@example.com", "full_name": "Ada", "preferred_language": "french",
+              "tier": "standard", "is_active": True}
+    return SimpleNamespace(**{**fields, **changes})
+
+
+@pytest.fixture(autouse=True)
+def fresh_user_cache(monkeypatch):
+    monkeypatch.setattr(auth, "user_cache", Cache("user-test", 60))
+
+
+def test_user_loaded_off_the_event_loop_and_cached():
+    db = FakeUsers(make_row())
+    token = create_access_token({"sub": "patient@example.com"})
+
+    async def scenario():
+        first = await get_user_from_token(token, db)
+        second = await get_user_from_token(token, db)
+        return first, second
+
+    first, second = asyncio.run(scenario())
+    assert (first.id, second.preferred_language) == (1, "french")
+    assert len(db.threads) == 1
+    assert db.threads[0] is not threading.main_thread()
+
+
+def test_forget_user_reloads_changed_row():
+    db = FakeUsers(make_row())
+    token = create_access_token({"sub": "patient@example.com"})
+
+    async def scenario():
+        await get_user_from_token(token, db)
+        db.row = make_row(tier="clinician")
+        stale = await get_user_from_token(token, db)
+        await forget_user("patient@example.com")
+        return stale, await get_user_from_token(token, db)
+
+    stale, fresh = asyncio.run(scenario())
+    assert stale.tier == "standard"
+    assert fresh.tier == "clinician"
+
+
+def test_unknown_user_rejected_and_not_cached():
+    db = FakeUsers(None)
+    token = create_access_token({"sub": "nobody@example.com"})
+
+    async def scenario():
+        for _ in range(2):
+            with pytest.raises(HTTPException) as error:
+                await get_user_from_token(token, db)
+            assert error.value.status_code == 401
+
+    asyncio.run(scenario())
+    assert len(db.threads) == 2
@@ -0,0 +1,187 @@
+"""Cache behaviour on each backend: memory, shared (SQLite) and redis,
+the last served by cache_server.py. Run from backend/: python -m pytest tests"""
+import asyncio
+import contextlib
+
+import pytest
+
+from cache_server import CacheServer
+from config import settings
+from services import cache_service
+from services.cache_service import Cache
+
+BACKENDS = ["memory", "shared", "redis"]
+SHARED_BACKENDS = ["shared", "redis"]
+
+
+@pytest.fixture
+def use_backend(monkeypatch, tmp_path):
+    """Returns an async context manager that switches the process to a backend"""
+    monkeypatch.setattr(settings, "cache_prefix", "test")
+
+    @contextlib.asynccontextmanager
+    async def use(kind: str):
+        monkeypatch.setattr(settings, "cache_backend", kind)
+        monkeypatch.setattr(settings, "cache_shared_path", str(tmp_path / "cache.sqlite3"))
+        server = None
+        if kind == "redis":
+            server = await asyncio.start_server(CacheServer().handle, "127.0.0.1", 0)
+            port = server.sockets[0].getsockname()[1]
+            monkeypatch.setattr(settings, "cache_url", f"redis://127.0.0.1:{port}/0")
+        cache_service._near.entries.clear()
+        try:
+            yield cache_service.get_cache_backend()
+        finally:
+            await cache_service.close_cache()
+            cache_service._near.entries.clear()
+            if server is not None:
+                server.close()
+
+    return use
+
+
+@pytest.mark.parametrize("kind", BACKENDS)
+def test_set_get_delete(use_backend, kind):
+    async def run():
+        async with use_backend(kind):
+            cache = Cache("roundtrip")
+            assert await cache.get("k") is None
+            await cache.set("k", {"value": [1, "two"]})
+            assert await cache.get("k") == {"value": [1, "two"]}
+            await cache.delete("k")
+            assert await cache.get("k") is None
+
+    asyncio.run(run())
+
+
+@pytest.mark.parametrize("kind", BACKENDS)
+def test_entries_expire(use_backend, monkeypatch, kind):
+    monkeypatch.setattr(settings, "cache_local_ttl_seconds", 0)
+
+    async def run():
+        async with use_backend(kind):
+            cache = Cache("ttl", ttl=0.2)
+            await cache.set("k", "v")
+            assert await cache.get("k") == "v"
+            await asyncio.sleep(0.3)
+            assert await cache.get("k") is None
+
+    asyncio.run(run())
+
+
+@pytest.mark.parametrize("kind", BACKENDS)
+def test_add_only_if_absent(use_backend, kind):
+    async def run():
+        async with use_backend(kind) as backend:
+            assert await backend.add("test:lock", b"1", 0.2)
+            assert not await backend.add("test:lock", b"2", 0.2)
+            assert await backend.get("test:lock") == b"1"
+            # An expired holder is replaced
+            await asyncio.sleep(0.3)
+            assert await backend.add("test:lock", b"3", 0.2)
+
+    asyncio.run(run())
+
+
+@pytest.mark.parametrize("kind", BACKENDS)
+def test_get_or_set_loads_once_per_worker(use_backend, kind):
+    calls = []
+
+    async def load():
+        calls.append(1)
+        await asyncio.sleep(0.1)
+        return {"loaded": True}
+
+    async def run():
+        async with use_backend(kind):
+            cache = Cache("flight")
+            results = await asyncio.gather(*(cache.get_or_set("k", load) for _ in range(10)))
+            assert results == [{"loaded": True}] * 10
+            assert await cache.get_or_set("k", load) == {"loaded": True}
+
+    asyncio.run(run())
+    assert len(calls) == 1
+
+
+@pytest.mark.parametrize("kind", SHARED_BACKENDS)
+def test_get_or_set_loads_once_across_workers(use_backend, monkeypatch, kind):
+    # Two Cache objects stand in for two workers; only the lock key can
+    # keep the second one from loading
+    monkeypatch.setattr(settings, "cache_local_ttl_seconds", 0)
+    calls = []
+
+    async def load():
+        calls.append(1)
+        await asyncio.sleep(0.2)
+        return "value"
+
+    async def run():
+        async with use_backend(kind) as backend:
+            first, second = Cache("flight"), Cache("flight")
+            assert await asyncio.gather(first.get_or_set("k", load), second.get_or_set("k", load)) == ["value", "value"]
+            # The lock is released once the value is stored
+            assert await backend.get("test:flight:k:lock") is None
+
+    asyncio.run(run())
+    assert len(calls) == 1
+
+
+@pytest.mark.parametrize("kind", BACKENDS)
+def test_get_or_set_does_not_store_none(use_backend, kind):
+    async def run():
+        async with use_backend(kind):
+            cache = Cache("none")
+            assert await cache.get_or_set("k", _return(None)) is None
+            assert await cache.get_or_set("k", _return("later")) == "later"
+
+    asyncio.run(run())
+
+
+@pytest.mark.parametrize("kind", BACKENDS)
+def test_get_or_set_ttl_depends_on_value(use_backend, monkeypatch, kind):
+    monkeypatch.setattr(settings, "cache_local_ttl_seconds", 0)
+
+    def ttl_for(value):
+        return 0.2 if value == "fallback" else None
+
+    async def run():
+        async with use_backend(kind):
+            cache = Cache("value-ttl", ttl=60)
+            await cache.get_or_set("short", _return("fallback"), ttl=ttl_for)
+            await cache.get_or_set("long", _return("translated"), ttl=ttl_for)
+            await asyncio.sleep(0.3)
+            assert await cache.get("short") is None
+            assert await cache.get("long") == "translated"
+
+    asyncio.run(run())
+
+
+@pytest.mark.parametrize("kind", SHARED_BACKENDS)
+def test_invalidation_drops_near_copies(use_backend, monkeypatch, kind):
+    monkeypatch.setattr(settings, "cache_local_ttl_seconds", 60)
+
+    async def run():
+        async with use_backend(kind) as backend:
+            await cache_service.start_cache()
+            await asyncio.sleep(0.1)  # Let the subscription start
+            cache = Cache("near")
+            await cache.set("k", "old")
+            full_key = cache._full_key("k")
+            assert full_key in cache_service._near.entries
+
+            # Another worker changes the value and publishes the key
+            await backend.set(full_key, b'"new"')
+            await backend.publish(cache_service._channel(), full_key)
+            for _ in range(50):
+                if full_key not in cache_service._near.entries:
+                    break
+                await asyncio.sleep(0.05)
+            assert await cache.get("k") == "new"
+
+    asyncio.run(run())
+
+
+def _return(value):
+    async def load():
+        return value
+    return load
@@ -0,0 +1,80 @@
+"""Chat worker error handling: which failures go back on the queue"""
+import asyncio
+
+import pytest
+from sqlalchemy.exc import InterfaceError, OperationalError, TimeoutError as SQLAlchemyTimeoutError
+
+import chat_worker
+from chat_worker import ChatWorker
+
+
+class FailingSession:
+    """A session whose first query raises the given error"""
+
+    def __init__(self, error):
+        self.error = error
+        self.rolled_back = False
+        self.closed = False
+
+    def query(self, *entities):
+        raise self.error
+
+    def rollback(self):
+        self.rolled_back = True
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def settled(monkeypatch):
+    calls = []
+    monkeypatch.setattr(chat_worker, "retry_job", lambda db, *args: calls.append(("retry", *args)))
+    monkeypatch.setattr(chat_worker, "fail_job", lambda db, *args: calls.append(("fail", *args)))
+    return calls
+
+
+def run_job(monkeypatch, error):
+    sessions = []
+
+    def session_factory():
+        sessions.append(FailingSession(error))
+        return sessions[-1]
+    monkeypatch.setattr(chat_worker, "SessionLocal", session_factory)
+
+    worker = ChatWorker.__new__(ChatWorker)
+    worker.worker_id = "host:1"
+    asyncio.run(worker.process(42))
+    return sessions
+
+
+@pytest.mark.parametrize("error", [
+    OperationalError("SELECT 1", {}, Exception("server closed the connection")),
+    InterfaceError("SELECT 1", {}, Exception("connection already closed")),
+    SQLAlchemyTimeoutError("QueuePool limit reached"),
+    ConnectionError("model server unreachable"),
+    TimeoutError("read timed out"),
+])
+def test_transient_errors_retry_the_job(monkeypatch, settled, error):
+    sessions = run_job(monkeypatch, error)
+    assert settled == [("retry", 42, "host:1", str(error))]
+    assert sessions[0].rolled_back and all(db.closed for db in sessions)
+
+
+@pytest.mark.parametrize("error", [
+    ValueError("Session or message no longer exists"),
+    RuntimeError("model crashed"),
+])
+def test_other_errors_fail_the_job(monkeypatch, settled, error):
+    run_job(monkeypatch, error)
+    assert settled == [("fail", 42, "host:1", str(error))]
+
+
+def test_settle_failure_is_swallowed(monkeypatch):
+    def broken(db, *args):
+        raise OperationalError("UPDATE chat_jobs", {}, Exception("database is down"))
+    monkeypatch.setattr(chat_worker, "retry_job", broken)
+
+    # The job is left for the stale-heartbeat reclaim rather than crashing the worker
+    sessions = run_job(monkeypatch, ConnectionError("database is down"))
+    assert all(db.closed for db in sessions)
@@ -0,0 +1,151 @@
+"""WebSocket connection handling: slow clients, turn limits and summaries"""
+import asyncio
+import json
+import time
+
+import pytest
+from fastapi import WebSocketDisconnect
+
+from config import settings
+from routers import chat_ws
+from routers.chat_ws import WS_HEARTBEAT_TIMEOUT, WS_SEND_TIMEOUT, ChatConnection
+
+
+class FakeSocket:
+    def __init__(self, frames=(), stall=False):
+        self.frames = list(frames)
+        self.stall = stall
+        self.sent = []
+
+    async def send_json(self, frame):
+        if self.stall:
+            await asyncio.Event().wait()  # A client that never reads
+        self.sent.append(frame)
+
+    async def receive_text(self):
+        await asyncio.sleep(0)
+        if not self.frames:
+            raise WebSocketDisconnect()
+        return json.dumps(self.frames.pop(0))
+
+
+def drain(queue):
+    frames = []
+    while not queue.empty():
+        frames.append(queue.get_nowait())
+    return frames
+
+
+def test_stalled_client_is_dropped(monkeypatch):
+    monkeypatch.setattr(settings, "ws_send_timeout_seconds", 0.05)
+
+    async def scenario():
+        connection = ChatConnection(FakeSocket(stall=True))
+        connection.receiver = asyncio.create_task(asyncio.sleep(10))
+        await connection.send({"type": "token"})
+        await asyncio.wait_for(connection.writer(), 1.0)
+        await asyncio.sleep(0)
+        return connection
+
+    connection = asyncio.run(scenario())
+    assert connection.close_code == WS_SEND_TIMEOUT
+    assert connection.receiver.cancelled()
+
+
+def test_silent_client_times_out(monkeypatch):
+    monkeypatch.setattr(settings, "ws_heartbeat_seconds", 0.02)
+
+    async def scenario():
+        connection = ChatConnection(FakeSocket())
+        connection.last_seen -= 1
+        await asyncio.wait_for(connection.heartbeat(), 1.0)
+        return connection
+
+    assert asyncio.run(scenario()).close_code == WS_HEARTBEAT_TIMEOUT
+
+
+def test_full_outbox_on_heartbeat_drops_client(monkeypatch):
+    monkeypatch.setattr(settings, "ws_heartbeat_seconds", 0.02)
+    monkeypatch.setattr(settings, "ws_send_queue_size", 1)
+
+    async def scenario():
+        connection = ChatConnection(FakeSocket())
+        connection.outbox.put_nowait({"type": "token"})
+        heartbeat = asyncio.create_task(connection.heartbeat())
+        await asyncio.sleep(0.03)
+        connection.last_seen = time.monotonic()  # Still sending pongs
+        await asyncio.wait_for(heartbeat, 1.0)
+        return connection
+
+    assert asyncio.run(scenario()).close_code == WS_SEND_TIMEOUT
+
+
+def test_turns_beyond_limit_get_an_error_frame(monkeypatch):
+    monkeypatch.setattr(settings, "ws_max_turns_in_flight", 1)
+    frames = [
+        {"type": "message", "request_id": "a", "message": "hello"},
+        {"type": "message", "request_id": "b", "message": "again"},
+        {"type": "ping"},
+    ]
+
+    async def scenario():
+        connection = ChatConnection(FakeSocket(frames))
+        release = asyncio.Event()
+
+        async def slow_turn(frame):
+            await release.wait()
+            return None
+        monkeypatch.setattr(connection, "_handle_message", slow_turn)
+
+        with pytest.raises(WebSocketDisconnect):
+            await connection.receive_loop()
+        in_flight = connection.turns_in_flight
+        release.set()
+        await asyncio.gather(*connection.tasks)
+        return connection, in_flight
+
+    connection, in_flight = asyncio.run(scenario())
+    assert in_flight == 1
+    assert connection.turns_in_flight == 0
+    assert drain(connection.outbox) == [
+        {"type": "error", "request_id": "b", "detail": "Too many messages in flight; wait for a reply first"},
+        {"type": "pong"},
+    ]
+
+
+def test_summary_runs_after_the_turn_is_released(monkeypatch):
+    seen = []
+
+    async def scenario():
+        connection = ChatConnection(FakeSocket())
+
+        async def turn(frame):
+            return "state"
+
+        async def summarize(session_id):
+            seen.append(connection.turns_in_flight)
+            return False
+
+        monkeypatch.setattr(connection, "_handle_message", turn)
+        monkeypatch.setattr(connection, "refresh_summary", lambda state: summarize(state))
+        connection.turns_in_flight = 1
+        await connection.handle_message({"type": "message"})
+
+    asyncio.run(scenario())
+    assert seen == [0]
+
+
+def test_failed_turn_skips_summary(monkeypatch):
+    calls = []
+    monkeypatch.setattr(chat_ws, "update_session_summary", lambda session_id: calls.append(session_id))
+
+    async def scenario():
+        connection = ChatConnection(FakeSocket())
+        connection.user = {"id": 1, "preferred_language": "english"}
+        connection.turns_in_flight = 1
+        await connection.handle_message({"type": "message", "request_id": "x", "message": "  "})
+        return connection
+
+    connection = asyncio.run(scenario())
+    assert calls == []
+    assert drain(connection.outbox) == [{"type": "error", "request_id": "x", "detail": "Empty message"}]
@@ -0,0 +1,142 @@
+"""Idempotent chat submissions: claims, takeovers and fingerprint checks"""
+import asyncio
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import HTTPException
+
+from config import settings
+from models import ChatRequest
+from services.cache_service import Cache
+from services.idempotency_service import IdempotencyService, request_fingerprint
+
+PAYLOAD = {"message": "I have a fever", "language": "english", "session_id": None}
+RESPONSE = {"response": "Rest and drink fluids.", "session_id": 3, "message_id": 11}
+
+
+class StubService(IdempotencyService):
+    """The claim table replaced by canned _claim results"""
+
+    def __init__(self, claims=None):
+        self.session_factory = None
+        self.in_flight = {}
+        self.responses = Cache(f"response-test-{uuid.uuid4().hex}", 60)
+        self.claims = list(claims or [])
+        self.finished = []
+
+    def _claim(self, key, fingerprint):
+        return self.claims.pop(0) if self.claims else (None, None)
+
+    def _finish(self, key, status, response=None):
+        self.finished.append((status, response))
+
+
+def counting_process(calls, response=RESPONSE, delay=0.0):
+    async def process(resume=None):
+        calls.append(resume)
+        await asyncio.sleep(delay)
+        return response
+    return process
+
+
+def test_first_claim_runs_once_then_replays():
+    service = StubService()
+    calls = []
+
+    async def scenario():
+        first = await service.run(1, "k", PAYLOAD, counting_process(calls))
+        again = await service.run(1, "k", PAYLOAD, counting_process(calls))
+        return first, again
+
+    assert asyncio.run(scenario()) == (RESPONSE, RESPONSE)
+    assert calls == [None]
+    assert service.finished == [("completed", RESPONSE)]
+
+
+def test_concurrent_duplicates_share_one_generation():
+    service = StubService()
+    calls = []
+
+    async def scenario():
+        return await asyncio.gather(*(
+            service.run(1, "k", PAYLOAD, counting_process(calls, delay=0.02)) for _ in range(3)
+        ))
+
+    assert asyncio.run(scenario()) == [RESPONSE] * 3
+    assert len(calls) == 1
+
+
+def test_reused_key_with_other_payload_rejected_after_completion():
+    service = StubService()
+
+    async def scenario():
+        await service.run(1, "k", PAYLOAD, counting_process([]))
+        await service.run(1, "k", {**PAYLOAD, "message": "Something else"}, counting_process([]))
+
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(scenario())
+    assert error.value.status_code == 422
+
+
+def test_reused_key_with_other_payload_rejected_while_in_flight():
+    service = StubService()
+
+    async def scenario():
+        first = asyncio.create_task(service.run(1, "k", PAYLOAD, counting_process([], delay=0.05)))
+        await asyncio.sleep(0.01)
+        try:
+            await service.run(1, "k", {**PAYLOAD, "language": "french"}, counting_process([]))
+        finally:
+            await first
+
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(scenario())
+    assert error.value.status_code == 422
+
+
+def test_key_held_by_other_worker():
+    completed = ChatRequest(request_hash=request_fingerprint(PAYLOAD), status="completed", response=RESPONSE)
+    other = ChatRequest(request_hash="0" * 64, status="completed", response=RESPONSE)
+    service = StubService(claims=[(completed, None), (other, None)])
+    calls = []
+
+    assert asyncio.run(service.run(1, "a", PAYLOAD, counting_process(calls))) == RESPONSE
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(service.run(1, "b", PAYLOAD, counting_process(calls)))
+    assert error.value.status_code == 422
+    assert calls == []
+
+
+def test_takeover_resumes_stored_user_message():
+    resume = {"session_id": 3, "user_message_id": 10}
+    service = StubService(claims=[(None, resume)])
+    calls = []
+
+    asyncio.run(service.run(1, "k", PAYLOAD, counting_process(calls)))
+    assert calls == [resume]
+
+
+def test_failed_process_marks_claim_failed():
+    service = StubService()
+
+    async def failing(resume=None):
+        raise RuntimeError("model crashed")
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(service.run(1, "k", PAYLOAD, failing))
+    assert service.finished == [("failed", None)]
+    assert service.in_flight == {}
+
+
+@pytest.mark.parametrize("status, age, reason", [
+    ("pending", timedelta(seconds=5), None),
+    ("completed", timedelta(hours=1), None),
+    ("pending", timedelta(seconds=settings.idempotency_pending_timeout_seconds + 1), "abandoned"),
+    ("failed", timedelta(seconds=5), "failed"),
+    ("completed", timedelta(seconds=settings.idempotency_ttl_seconds + 1), "expired"),
+])
+def test_takeover_reason(status, age, reason):
+    now = datetime.utcnow()
+    existing = ChatRequest(status=status, created_at=now - age)
+    assert StubService()._takeover_reason(existing, now) == reason
@@ -0,0 +1,60 @@
+"""Model tier routing and per-model token accounting"""
+import pytest
+
+from config import settings
+from services.llm_service import LLMService
+from services.model_registry import ModelHandle
+
+
+class FakeModel:
+    def __call__(self, prompt, stream=False, **kwargs):
+        if stream:
+            return iter({"choices": [{"text": piece}]} for piece in ["Rest", " and", " fluids", "."])
+        return {"choices": [{"text": "Rest."}], "usage": {"completion_tokens": 3}}
+
+
+@pytest.fixture
+def llm(monkeypatch):
+    monkeypatch.setattr(settings, "model_short_message_chars", 40)
+    monkeypatch.setattr(settings, "model_deep_history_turns", 4)
+    monkeypatch.setattr(settings, "model_user_tiers", {"premium": "large"})
+    service = LLMService()
+    for tier in ("small", "large"):
+        service.registry.register(ModelHandle(tier, f"{tier}.gguf", FakeModel()))
+    return service
+
+
+def test_short_medical_question_stays_small(llm):
+    # Mentioning a symptom is not by itself a reason for the large model
+    assert llm.choose_tier("I have a fever, what should I do?") == "small"
+
+
+def test_long_or_multi_question_turns_go_large(llm):
+    assert llm.choose_tier("Please explain in detail how blood pressure medication works") == "large"
+    assert llm.choose_tier("Is it viral? Should I see a doctor?") == "large"
+
+
+def test_deep_conversation_goes_large(llm):
+    assert llm.choose_tier("And now?", history_turns=3) == "small"
+    assert llm.choose_tier("And now?", history_turns=4) == "large"
+
+
+def test_user_tier_overrides_triage(llm):
+    assert llm.choose_tier("Hi", user_tier="premium") == "large"
+
+
+def test_missing_tier_falls_back_to_default(llm, monkeypatch):
+    monkeypatch.setattr(settings, "model_default_tier", "small")
+    llm.registry.tiers.pop("large")
+    assert llm.choose_tier("Is it viral? Should I see a doctor?") == "small"
+
+
+def test_completion_tokens_counted_for_plain_and_streamed_calls(llm):
+    llm.complete("Hi", "small")
+    pieces = []
+    llm.stream_completion("Hi", "small", lambda piece: pieces.append(piece) or len(pieces) < 2)
+
+    handle = llm.registry.tiers["small"]
+    assert pieces == ["Rest", " and"]
+    assert handle.completion_tokens == 3 + 2
+    assert handle.get_metrics()["requests"] == 2
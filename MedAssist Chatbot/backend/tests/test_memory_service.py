@@ -0,0 +1,55 @@
+"""Rolling summary: what gets folded, and the prompt it feeds staying in budget"""
+from config import settings
+from services.llm_service import LLMService
+from services.memory_service import RECENT_MESSAGES_KEPT, _fold_point
+
+
+def test_short_history_keeps_recent_turns_within_budget(monkeypatch):
+    monkeypatch.setattr(settings, "summary_recent_tokens", 100)
+    costs = [40] * 10
+    split = _fold_point(costs)
+    assert split == 8
+    assert sum(costs[split:]) <= settings.summary_recent_tokens
+
+
+def test_last_exchange_is_never_folded(monkeypatch):
+    monkeypatch.setattr(settings, "summary_recent_tokens", 100)
+    costs = [10, 10, 500, 700]
+    assert _fold_point(costs) == len(costs) - RECENT_MESSAGES_KEPT
+
+
+def test_fewer_messages_than_kept_folds_nothing():
+    assert _fold_point([5000]) == 0
+
+
+def _history(turns, words):
+    return [
+        {"role": "user" if i % 2 == 0 else "assistant", "content": f"turn {i} " + "word " * words}
+        for i in range(turns)
+    ]
+
+
+def test_summary_and_trimmed_history_fit_the_context():
+    llm = LLMService()
+    ceiling = settings.model_context_window - settings.max_response_tokens
+    summary = "The patient reported fever for three days. " * 20
+    history = _history(60, 80)
+
+    prompt = llm._format_prompt("Be helpful.", "Is it serious?", history, summary)
+    assert llm.count_tokens(prompt) <= ceiling
+    assert summary in prompt
+    # The newest turns are the ones kept
+    assert "turn 59 " in prompt
+    assert "turn 0 " not in prompt
+    assert prompt.endswith("Human: Is it serious?\nAssistant:")
+
+
+def test_oversized_message_drops_summary_and_history():
+    llm = LLMService()
+    ceiling = settings.model_context_window - settings.max_response_tokens
+    message = "word " * (settings.model_context_window * 4)
+
+    prompt = llm._format_prompt("Be helpful.", message, _history(4, 10), "earlier summary")
+    assert llm.count_tokens(prompt) <= ceiling
+    assert "earlier summary" not in prompt
+    assert "turn 3 " not in prompt
@@ -0,0 +1,93 @@
+"""Monthly message partitions and the partition-pruning history filter"""
+import gzip
+import json
+from datetime import date, datetime
+
+from sqlalchemy.dialects import postgresql
+
+from models import ChatSession, Message, SessionArchive
+from services.message_storage import (
+    _serialize, create_partitions, load_archived_messages, partition_name, session_message_filter
+)
+
+
+class RecordingConn:
+    def __init__(self):
+        self.statements = []
+
+    def execute(self, statement, params=None):
+        self.statements.append(str(statement))
+
+
+def test_partition_names_sort_by_month():
+    assert partition_name(date(2024, 3, 17)) == "messages_y2024m03"
+    assert partition_name(date(2024, 11, 1)) < partition_name(date(2025, 1, 1))
+
+
+def test_create_partitions_covers_each_month_across_years():
+    conn = RecordingConn()
+    create_partitions(conn, date(2024, 11, 20), date(2025, 2, 3))
+    assert conn.statements == [
+        f"CREATE TABLE IF NOT EXISTS messages_y{year}m{month:02d} PARTITION OF messages "
+        f"FOR VALUES FROM ('{lower}') TO ('{upper}')"
+        for year, month, lower, upper in [
+            (2024, 11, "2024-11-01", "2024-12-01"),
+            (2024, 12, "2024-12-01", "2025-01-01"),
+            (2025, 1, "2025-01-01", "2025-02-01"),
+            (2025, 2, "2025-02-01", "2025-03-01"),
+        ]
+    ]
+
+
+def test_create_partitions_single_month():
+    conn = RecordingConn()
+    create_partitions(conn, date(2024, 2, 29), date(2024, 2, 1))
+    assert len(conn.statements) == 1
+
+
+def _compiled(criteria):
+    return [str(c.compile(dialect=postgresql.dialect())) for c in criteria]
+
+
+def test_history_filter_bounds_created_at_by_session_start():
+    session = ChatSession(id=7, created_at=datetime(2024, 5, 2, 10, 0))
+    criteria = session_message_filter(session)
+    assert _compiled(criteria) == [
+        "messages.session_id = %(session_id_1)s",
+        "messages.created_at >= %(created_at_1)s",
+    ]
+    assert criteria[1].right.value == datetime(2024, 5, 2, 10, 0)
+
+
+def test_history_filter_without_start_only_matches_session():
+    assert _compiled(session_message_filter(ChatSession(id=7))) == ["messages.session_id = %(session_id_1)s"]
+
+
+class ArchiveQuery:
+    def __init__(self, archive):
+        self.archive = archive
+
+    def filter(self, *criteria):
+        return self
+
+    def first(self):
+        return self.archive
+
+
+class ArchiveDB:
+    def __init__(self, archive):
+        self.archive = archive
+
+    def query(self, model):
+        return ArchiveQuery(self.archive)
+
+
+def test_archived_messages_roundtrip():
+    created = datetime(2024, 5, 2, 10, 0, 5)
+    msg = Message(id=1, user_id=3, content="J'ai de la fièvre", sender="user", language="french",
+                  message_type="text", message_metadata=None, created_at=created)
+    archive = SessionArchive(payload=gzip.compress(json.dumps([_serialize(msg)]).encode("utf-8")))
+
+    [restored] = load_archived_messages(ArchiveDB(archive), 7)
+    assert restored["content"] == "J'ai de la fièvre"
+    assert restored["created_at"] == created
@@ -0,0 +1,78 @@
+"""Migration discovery and ordered, resumable upgrades (on SQLite)"""
+import pytest
+from sqlalchemy import create_engine, inspect, text
+
+from services import migrations
+from services.migrations import applied_versions, discover_migrations, run_migrations
+
+STEPS = {
+    "0001_notes.py": "CREATE TABLE notes (id INTEGER PRIMARY KEY, body TEXT)",
+    "0002_note_author.py": "ALTER TABLE notes ADD COLUMN author TEXT",
+    "0010_note_tags.py": "CREATE TABLE note_tags (note_id INTEGER, tag TEXT)",
+}
+
+
+@pytest.fixture
+def directory(tmp_path):
+    for filename, statement in STEPS.items():
+        (tmp_path / filename).write_text(
+            "from sqlalchemy import text\n\n\n"
+            f"def upgrade(conn):\n    conn.execute(text({statement!r}))\n"
+        )
+    (tmp_path / "README.txt").write_text("not a migration")
+    return str(tmp_path)
+
+
+@pytest.fixture
+def engine(monkeypatch, tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'schema.sqlite3'}")
+    partition_calls = []
+    monkeypatch.setattr(migrations, "ensure_message_partitions", partition_calls.append)
+    engine.partition_calls = partition_calls
+    yield engine
+    engine.dispose()
+
+
+def test_real_migrations_are_numbered_without_gaps():
+    found = discover_migrations()
+    assert [m.version for m in found] == list(range(1, len(found) + 1))
+    assert all(callable(m.load().upgrade) for m in found)
+
+
+def test_duplicate_versions_rejected(directory, tmp_path):
+    (tmp_path / "0002_again.py").write_text("def upgrade(conn):\n    pass\n")
+    with pytest.raises(RuntimeError):
+        discover_migrations(directory)
+
+
+def test_upgrade_to_intermediate_version_then_the_rest(engine, directory):
+    assert run_migrations(engine, target=1, directory=directory) == ["0001_notes"]
+    columns = [c["name"] for c in inspect(engine).get_columns("notes")]
+    assert columns == ["id", "body"]
+    # messages is not partitioned here, so there are no partitions to create
+    assert engine.partition_calls == []
+
+    assert run_migrations(engine, directory=directory) == ["0002_note_author", "0010_note_tags"]
+    assert "author" in [c["name"] for c in inspect(engine).get_columns("notes")]
+    assert run_migrations(engine, directory=directory) == []
+
+    with engine.begin() as conn:
+        assert sorted(applied_versions(conn)) == [1, 2, 10]
+
+
+def test_failed_migration_is_not_recorded(engine, directory, tmp_path):
+    (tmp_path / "0003_broken.py").write_text(
+        "from sqlalchemy import text\n\n\ndef upgrade(conn):\n    conn.execute(text('SELECT * FROM missing'))\n"
+    )
+    with pytest.raises(Exception):
+        run_migrations(engine, directory=directory)
+
+    with engine.connect() as conn:
+        versions = conn.execute(text("SELECT version FROM schema_migrations ORDER BY version")).scalars().all()
+    assert versions == [1, 2]
+
+
+def test_partitions_kept_up_once_messages_is_partitioned(engine, directory, monkeypatch):
+    monkeypatch.setattr(migrations, "messages_partitioned", lambda engine: True)
+    run_migrations(engine, directory=directory)
+    assert engine.partition_calls == [engine]
@@ -0,0 +1,111 @@
+"""Read routing: healthy replicas, read-your-writes across workers, health checks"""
+import asyncio
+import threading
+import time
+
+import pytest
+
+from config import settings
+import database
+from database import ReplicaRouter
+from services import cache_service
+
+
+class FakeReplica:
+    def __init__(self, name, healthy=True, delay=0.0):
+        self.name = name
+        self.healthy = healthy
+        self.delay = delay
+        self.checked_on = None
+
+    def session_factory(self):
+        return self.name
+
+    def check(self, max_lag_seconds):
+        self.checked_on = threading.current_thread().name
+        time.sleep(self.delay)
+
+
+@pytest.fixture
+def shared_cache(monkeypatch, tmp_path):
+    """Workers on one host sharing the SQLite cache backend"""
+    monkeypatch.setattr(settings, "cache_prefix", "test-routing")
+    monkeypatch.setattr(settings, "cache_backend", "shared")
+    monkeypatch.setattr(settings, "cache_shared_path", str(tmp_path / "cache.sqlite3"))
+    cache_service._near.entries.clear()
+    yield
+    asyncio.run(cache_service.close_cache())
+    cache_service._near.entries.clear()
+
+
+def make_router(*replicas):
+    router = ReplicaRouter([])
+    router.replicas = list(replicas)
+    return router
+
+
+def test_reads_rotate_over_healthy_replicas(shared_cache):
+    router = make_router(FakeReplica("a"), FakeReplica("b", healthy=False), FakeReplica("c"))
+
+    async def scenario():
+        return [await router.read_session("reader@example.com") for _ in range(4)]
+
+    assert asyncio.run(scenario()) == ["a", "c", "a", "c"]
+    assert router.replica_reads == 4
+
+
+def test_no_healthy_replica_reads_primary(shared_cache, monkeypatch):
+    monkeypatch.setattr(database, "SessionLocal", lambda: "primary")
+    router = make_router(FakeReplica("a", healthy=False))
+    assert asyncio.run(router.read_session("reader@example.com")) == "primary"
+    assert router.primary_reads == 1
+
+
+def test_write_on_one_worker_pins_reads_on_another(shared_cache):
+    writer = make_router(FakeReplica("a"))
+    reader = make_router(FakeReplica("a"))
+
+    async def scenario():
+        await writer.record_write("patient@example.com")
+        cache_service._near.entries.clear()  # The reader's process has no near copy
+        return (
+            await reader.choose("patient@example.com"),
+            await reader.choose("someone-else@example.com")
+        )
+
+    pinned, other = asyncio.run(scenario())
+    assert pinned is None
+    assert other is reader.replicas[0]
+
+
+def test_write_marker_expires(shared_cache, monkeypatch):
+    monkeypatch.setattr(settings, "read_your_writes_seconds", 0.05)
+    router = make_router(FakeReplica("a"))
+    monkeypatch.setattr(router.writes, "ttl", 0.05)
+
+    async def scenario():
+        await router.record_write("patient@example.com")
+        await asyncio.sleep(0.1)
+        cache_service._near.entries.clear()
+        return await router.choose("patient@example.com")
+
+    assert asyncio.run(scenario()) is router.replicas[0]
+
+
+def test_cache_failure_falls_back_to_primary(shared_cache, monkeypatch):
+    router = make_router(FakeReplica("a"))
+
+    async def broken(key):
+        raise ConnectionError("cache down")
+    monkeypatch.setattr(router.writes, "get", broken)
+    assert asyncio.run(router.choose("patient@example.com")) is None
+
+
+def test_health_checks_run_concurrently():
+    replicas = [FakeReplica(name, delay=0.2) for name in "abc"]
+    router = make_router(*replicas)
+
+    started = time.perf_counter()
+    asyncio.run(router.check_all())
+    assert time.perf_counter() - started < 0.5
+    assert len({replica.checked_on for replica in replicas}) == 3
@@ -0,0 +1,91 @@
+"""ETags, conditional requests and Accept-Encoding negotiation"""
+import gzip
+
+import orjson
+import pytest
+from starlette.requests import Request
+
+from config import settings
+from services import response_encoding
+from services.response_encoding import choose_encoding, etag_matches, json_response, make_etag, not_modified
+
+
+def make_request(**headers):
+    return Request({
+        "type": "http",
+        "headers": [(name.replace("_", "-").encode(), value.encode()) for name, value in headers.items()]
+    })
+
+
+@pytest.fixture
+def without_brotli(monkeypatch):
+    monkeypatch.setattr(response_encoding, "_brotli", False)
+
+
+def test_etag_is_weak_and_stable():
+    etag = make_etag(7, 120, "2024-05-02")
+    assert etag.startswith('W/"') and etag == make_etag(7, 120, "2024-05-02")
+    assert etag != make_etag(7, 121, "2024-05-02")
+
+
+def test_etag_matching_ignores_weakness_and_checks_every_tag():
+    etag = make_etag("transcript", 3)
+    strong = etag.removeprefix("W/")
+    assert etag_matches(make_request(if_none_match=etag), etag)
+    assert etag_matches(make_request(if_none_match=f'"other", {strong}'), etag)
+    assert etag_matches(make_request(if_none_match="*"), etag)
+    assert not etag_matches(make_request(if_none_match='"other"'), etag)
+    assert not etag_matches(make_request(), etag)
+
+
+def test_not_modified_keeps_validators():
+    response = not_modified('W/"abc"')
+    assert response.status_code == 304
+    assert response.headers["etag"] == 'W/"abc"'
+    assert response.headers["vary"] == "Accept-Encoding"
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("gzip, deflate, br", "br"),
+    ("br;q=0.5, gzip", "gzip"),
+    ("gzip;q=0.8, br;q=0.8", "br"),  # Tie goes to the preferred encoding
+    ("*", "br"),
+    ("*;q=0, gzip", "gzip"),
+    ("identity", None),
+    ("gzip;q=0, br;q=0", None),
+    ("br;q=oops, gzip;q=0.1", "gzip"),
+    ("", None),
+])
+def test_choose_encoding(header, expected):
+    pytest.importorskip("brotli")
+    assert choose_encoding(header) == expected
+
+
+def test_gzip_only_without_brotli(without_brotli):
+    assert choose_encoding("br, gzip;q=0.1") == "gzip"
+    assert choose_encoding("br") is None
+
+
+def test_large_body_compressed_small_left_alone(monkeypatch, without_brotli):
+    monkeypatch.setattr(settings, "response_compress_min_bytes", 100)
+    content = {"messages": ["fever " * 20] * 5}
+
+    large = json_response(make_request(accept_encoding="gzip"), content, etag='W/"v1"')
+    assert large.headers["content-encoding"] == "gzip"
+    assert orjson.loads(gzip.decompress(large.body)) == content
+    assert large.headers["etag"] == 'W/"v1"'
+    assert large.headers["cache-control"] == "private, no-cache"
+
+    small = json_response(make_request(accept_encoding="gzip"), {"ok": True})
+    assert "content-encoding" not in small.headers
+    assert orjson.loads(small.body) == {"ok": True}
+    assert small.headers["vary"] == "Accept-Encoding"
+
+
+def test_brotli_body_roundtrips(monkeypatch):
+    brotli = pytest.importorskip("brotli")
+    monkeypatch.setattr(settings, "response_compress_min_bytes", 0)
+    content = {"response": "Buvez beaucoup d'eau et reposez-vous."}
+    response = json_response(make_request(accept_encoding="br"), content)
+    assert response.headers["content-encoding"] == "br"
+    assert orjson.loads(brotli.decompress(response.body)) == content
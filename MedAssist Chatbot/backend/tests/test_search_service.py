@@ -0,0 +1,105 @@
+"""Message search: query configuration, cursors, snippets and keyset paging"""
+import re
+from datetime import datetime
+from types import SimpleNamespace
+
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.orm import Query
+
+from services.search_service import (
+    build_tsquery, decode_cursor, encode_cursor, render_snippet, search_config_for, search_messages
+)
+
+
+def test_search_configs_follow_language():
+    assert search_config_for("french") == ["french"]
+    assert search_config_for("ewondo") == ["simple"]
+    assert search_config_for(None) == ["english", "french", "simple"]
+
+
+def test_tsquery_ors_every_configuration():
+    sql = str(build_tsquery("fièvre").compile(dialect=postgresql.dialect()))
+    assert sql.count("websearch_to_tsquery(") == 3
+    assert sql.count(" || ") == 2
+
+
+def test_cursor_roundtrip():
+    cursor = encode_cursor(0.0607927, 12345)
+    assert decode_cursor(cursor) == (0.0607927, 12345)
+    assert not set(cursor) & set("+/")  # Safe in a query string
+
+
+def test_snippet_escapes_text_but_keeps_highlighting():
+    snippet = render_snippet('<b>fever</b> & \x01chills\x02 "now"')
+    assert snippet == '&lt;b&gt;fever&lt;/b&gt; &amp; <mark>chills</mark> &quot;now&quot;'
+    assert render_snippet(None) == ""
+
+
+class CapturingQuery:
+    """Builds the real SQLAlchemy query, returns canned rows from all()"""
+
+    def __init__(self, db, entities):
+        self.db = db
+        self.query = Query(entities)
+
+    def __getattr__(self, name):
+        method = getattr(self.query, name)
+
+        def chain(*args, **kwargs):
+            self.query = method(*args, **kwargs)
+            return self
+        return chain
+
+    def all(self):
+        sql = str(self.query.statement.compile(dialect=postgresql.dialect()))
+        self.db.where = re.split(r"\sORDER BY\s", re.split(r"\sWHERE\s", sql, 1)[1])[0]
+        self.db.limited = re.search(r"\sLIMIT\s\S+$", sql) is not None
+        return self.db.rows
+
+
+class CapturingDB:
+    def __init__(self, rows):
+        self.rows = rows
+        self.where = None
+        self.limited = False
+
+    def query(self, *entities):
+        return CapturingQuery(self, entities)
+
+
+def make_row(message_id, rank):
+    return SimpleNamespace(
+        id=message_id, session_id=1, session_name=None, sender="user", language="english",
+        created_at=datetime(2024, 5, 2), rank=rank, snippet="\x01fever\x02 <again>"
+    )
+
+
+def test_page_with_more_rows_returns_cursor_of_last_row_shown():
+    db = CapturingDB([make_row(9, 0.5), make_row(7, 0.5), make_row(3, 0.2)])
+    results, cursor = search_messages(db, user_id=4, q="fever", limit=2)
+
+    assert [r["message_id"] for r in results] == [9, 7]
+    assert results[0]["snippet"] == "<mark>fever</mark> &lt;again&gt;"
+    assert results[0]["session_name"] == "Chat 1"
+    assert decode_cursor(cursor) == (0.5, 7)
+    assert db.limited
+    assert "messages.user_id = " in db.where and "chat_sessions.user_id = " in db.where
+    assert "chat_sessions.is_active = true" in db.where
+
+
+def test_last_page_has_no_cursor():
+    db = CapturingDB([make_row(9, 0.5)])
+    results, cursor = search_messages(db, user_id=4, q="fever", limit=2)
+    assert len(results) == 1
+    assert cursor is None
+    assert "messages.language = " not in db.where
+
+
+def test_cursor_and_language_narrow_the_query():
+    db = CapturingDB([])
+    search_messages(db, user_id=4, q="fièvre", language="french", cursor=encode_cursor(0.5, 7))
+    assert "messages.language = " in db.where
+    assert "messages.id < " in db.where
+    assert "AS REAL)" in db.where
+    # Only the French configuration parses the query
+    assert db.where.count("websearch_to_tsquery(") == 3  # match and the two rank comparisons
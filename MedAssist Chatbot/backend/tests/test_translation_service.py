@@ -0,0 +1,74 @@
+"""Chunked translation: token budget and per-request concurrency"""
+import asyncio
+
+import pytest
+
+from config import settings
+from services.translation_service import LocalModelBackend, TranslationBackend, TranslationService
+
+
+class WordCounter:
+    """Stands in for LLMService: one token per word, records completions"""
+
+    def __init__(self):
+        self.calls = []
+
+    def count_tokens(self, text, tier=None):
+        return len(text.split())
+
+    def complete(self, prompt, **kwargs):
+        self.calls.append(kwargs)
+        return {"choices": [{"text": " un\n2. deux"}]}
+
+
+def test_max_tokens_follows_source_tokens():
+    llm = WordCounter()
+    backend = LocalModelBackend(llm)
+    text = asyncio.run(backend.translate_chunk(["one", "two"], "english", "french"))
+    assert text == "un deux"
+    assert llm.calls[0]["max_tokens"] == 64
+
+
+def test_max_tokens_clamped_to_remaining_context(monkeypatch):
+    monkeypatch.setattr(settings, "model_context_window", 300)
+    backend = LocalModelBackend(WordCounter())
+    sentences = ["word " * 100]
+    prompt = backend._build_prompt(sentences, "english", "french")
+    assert backend._max_tokens(prompt, sentences) == 300 - len(prompt.split())
+
+
+def test_chunk_larger_than_context_is_rejected(monkeypatch):
+    monkeypatch.setattr(settings, "model_context_window", 50)
+    backend = LocalModelBackend(WordCounter())
+    sentences = ["word " * 100]
+    with pytest.raises(ValueError):
+        backend._max_tokens(backend._build_prompt(sentences, "english", "french"), sentences)
+
+
+class SlowBackend(TranslationBackend):
+    name = "slow"
+
+    def __init__(self):
+        self.running = 0
+        self.peak = 0
+
+    async def translate_chunk(self, sentences, source_lang, target_lang):
+        self.running += 1
+        self.peak = max(self.peak, self.running)
+        await asyncio.sleep(0.01)
+        self.running -= 1
+        return " ".join(sentences).upper()
+
+
+def test_chunks_in_flight_are_capped(monkeypatch):
+    monkeypatch.setattr(settings, "translation_chunk_sentences", 1)
+    monkeypatch.setattr(settings, "translation_max_concurrent_chunks", 2)
+    service = TranslationService()
+    backend = SlowBackend()
+    monkeypatch.setattr(service, "_rank_backends", lambda source, target: [backend])
+
+    text = "One. Two. Three. Four. Five.\nSix."
+    result, used = asyncio.run(service.translate_with_backend(text, "english", "french"))
+    assert used == "slow"
+    assert result == "ONE. TWO. THREE. FOUR. FIVE.\nSIX."
+    assert backend.peak == 2
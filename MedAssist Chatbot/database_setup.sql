@@ -1,6 +1,9 @@
 -- MediChat AI Database Setup Script
 -- PostgreSQL Database Schema for Medical Chatbot
 
+-- The backend manages this schema with versioned migrations (python migrate.py);
+-- this script documents it and is kept in sync for manual setups.
+
 -- Create database (run this separately)
 -- CREATE DATABASE medichat_ai;
 
@@ -15,6 +18,7 @@ CREATE TABLE users (
     date_of_birth DATE,
     phone VARCHAR(20),
     preferred_language VARCHAR(10) DEFAULT 'english',
+    tier VARCHAR(20) DEFAULT 'standard', -- model routing tier
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     is_active BOOLEAN DEFAULT true
@@ -25,14 +29,17 @@ CREATE TABLE chat_sessions (
     id SERIAL PRIMARY KEY,
     user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
     session_name VARCHAR(255),
+    summary TEXT, -- rolling summary of older turns
+    summary_message_id INTEGER, -- last message folded into the summary
+    last_message_id INTEGER, -- newest message, part of the transcript ETag
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     is_active BOOLEAN DEFAULT true
 );
 
--- Messages table for chat history
+-- Messages table for chat history, range partitioned by month on created_at
 CREATE TABLE messages (
-    id SERIAL PRIMARY KEY,
+    id SERIAL,
     session_id INTEGER REFERENCES chat_sessions(id) ON DELETE CASCADE,
     user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
     content TEXT NOT NULL,
@@ -40,7 +47,65 @@ CREATE TABLE messages (
     language VARCHAR(10) DEFAULT 'english',
     message_type VARCHAR(20) DEFAULT 'text', -- text, voice, image
     metadata JSONB, -- for storing additional message data
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    -- full-text search, stemmed per message language ('simple' for local languages)
+    search_vector TSVECTOR GENERATED ALWAYS AS (to_tsvector(
+        CASE language WHEN 'english' THEN 'english'::regconfig
+                      WHEN 'french' THEN 'french'::regconfig
+                      ELSE 'simple'::regconfig END,
+        content
+    )) STORED,
+    PRIMARY KEY (id, created_at)
+) PARTITION BY RANGE (created_at);
+
+-- Catch-all partition; monthly partitions are created ahead of time by the
+-- backend (services/message_storage.py) or create_messages_partition below
+CREATE TABLE messages_default PARTITION OF messages DEFAULT;
+
+-- Idempotent chat submissions (Idempotency-Key header or client_message_id)
+CREATE TABLE chat_requests (
+    id SERIAL PRIMARY KEY,
+    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    idempotency_key VARCHAR(100) NOT NULL,
+    request_hash VARCHAR(64),
+    status VARCHAR(20) NOT NULL DEFAULT 'pending' CHECK (status IN ('pending', 'completed', 'failed')),
+    session_id INTEGER,
+    user_message_id INTEGER, -- recorded with the user message so a retry reuses it
+    message_id INTEGER,
+    response JSONB, -- stored ChatResponse
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    completed_at TIMESTAMP,
+    CONSTRAINT uq_chat_requests_user_key UNIQUE (user_id, idempotency_key)
+);
+
+-- Chat generation jobs (POST /api/chat/jobs), processed by chat_worker.py
+CREATE TABLE chat_jobs (
+    id SERIAL PRIMARY KEY,
+    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    session_id INTEGER NOT NULL REFERENCES chat_sessions(id) ON DELETE CASCADE,
+    user_message_id INTEGER NOT NULL,
+    bot_message_id INTEGER,
+    language VARCHAR(10) DEFAULT 'english',
+    status VARCHAR(20) NOT NULL DEFAULT 'queued' CHECK (status IN ('queued', 'running', 'completed', 'failed')),
+    partial_output TEXT DEFAULT '',
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    worker_id VARCHAR(100),
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    started_at TIMESTAMP,
+    heartbeat_at TIMESTAMP, -- running jobs with a stale heartbeat are reclaimed
+    completed_at TIMESTAMP
+);
+
+-- Compacted transcripts of idle sessions (gzip-compressed JSON)
+CREATE TABLE session_archives (
+    session_id INTEGER PRIMARY KEY REFERENCES chat_sessions(id) ON DELETE CASCADE,
+    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    message_count INTEGER NOT NULL,
+    payload BYTEA NOT NULL,
+    first_message_at TIMESTAMP,
+    last_message_at TIMESTAMP,
+    archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
 -- Translation cache table for performance
@@ -97,8 +162,15 @@ CREATE INDEX idx_users_created_at ON users(created_at);
 CREATE INDEX idx_chat_sessions_user_id ON chat_sessions(user_id);
 CREATE INDEX idx_chat_sessions_created_at ON chat_sessions(created_at);
 CREATE INDEX idx_messages_session_id ON messages(session_id);
+CREATE INDEX ix_messages_session_id_created_at ON messages(session_id, created_at);
 CREATE INDEX idx_messages_user_id ON messages(user_id);
 CREATE INDEX idx_messages_created_at ON messages(created_at);
+CREATE INDEX idx_messages_search_vector ON messages USING GIN(search_vector);
+CREATE INDEX idx_session_archives_user_id ON session_archives(user_id);
+CREATE INDEX idx_chat_requests_created_at ON chat_requests(created_at);
+CREATE INDEX idx_chat_jobs_created_at ON chat_jobs(created_at);
+CREATE INDEX idx_chat_jobs_pending ON chat_jobs(id) WHERE status IN ('queued', 'running');
+CREATE INDEX idx_chat_jobs_session_pending ON chat_jobs(session_id, id) WHERE status IN ('queued', 'running');
 CREATE INDEX idx_translation_cache_lookup ON translation_cache(source_text, source_language, target_language);
 CREATE INDEX idx_medical_knowledge_category ON medical_knowledge(category);
 CREATE INDEX idx_medical_knowledge_language ON medical_knowledge(language);
@@ -113,6 +185,25 @@ BEGIN
 END;
 $$ language 'plpgsql';
 
+-- Create the monthly messages partition containing the given day
+CREATE OR REPLACE FUNCTION create_messages_partition(day DATE)
+RETURNS VOID AS $$
+DECLARE
+    month_start DATE := date_trunc('month', day)::DATE;
+BEGIN
+    EXECUTE format(
+        'CREATE TABLE IF NOT EXISTS %I PARTITION OF messages FOR VALUES FROM (%L) TO (%L)',
+        'messages_y' || to_char(month_start, 'YYYY') || 'm' || to_char(month_start, 'MM'),
+        month_start,
+        (month_start + INTERVAL '1 month')::DATE
+    );
+END;
+$$ language 'plpgsql';
+
+SELECT create_messages_partition(CURRENT_DATE);
+SELECT create_messages_partition((CURRENT_DATE + INTERVAL '1 month')::DATE);
+SELECT create_messages_partition((CURRENT_DATE + INTERVAL '2 months')::DATE);
+
 -- Triggers to automatically update the updated_at column
 CREATE TRIGGER update_users_updated_at BEFORE UPDATE ON users
     FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();